@@ -55,9 +55,27 @@ def create_app(config_name="development"):
     error_handler_manager = ErrorHandlerManager(app)
     error_handler_manager.register_error_handlers()
 
+    from app.modules.basedataset.archive_cache import archive_cache
+    from app.modules.food_checker.nutrients import nutrient_index
+    from app.modules.fooddataset.chunked_upload import chunked_uploads
+    from app.modules.fooddataset.counters import activity_counters
     from app.modules.fooddataset.events import register_events
+    from app.modules.fooddataset.outbox import search_outbox_worker
+    from app.modules.hubfile.blobs import blob_store
+    from app.modules.recommendations.co_downloads import co_download_index
+    from app.modules.recommendations.related import related_datasets_job
+    from app.modules.recommendations.text_model import tfidf_model
 
     register_events()
+    activity_counters.init_app(app)
+    search_outbox_worker.init_app(app)
+    tfidf_model.init_app(app)
+    related_datasets_job.init_app(app)
+    co_download_index.init_app(app)
+    nutrient_index.init_app(app)
+    archive_cache.init_app(app)
+    chunked_uploads.init_app(app)
+    blob_store.init_app(app)
 
     # Injecting environment variables into jinja context
     @app.context_processor
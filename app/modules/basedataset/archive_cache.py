@@ -0,0 +1,152 @@
+import glob
+import hashlib
+import os
+import threading
+import uuid
+
+from sqlalchemy import select
+
+from app.modules.foodmodel.models import FoodModel
+from app.modules.hubfile.models import Hubfile
+from core.events.session_events import session_events
+
+# Atributos que cambian el contenido del zip; los contadores de visitas y descargas no
+FILE_FIELDS = {FoodModel: ("data_set_id",), Hubfile: ("name", "checksum", "food_model_id")}
+
+# Cambia si cambia el contenido de los zip (estructura, compresión...), para no servir los antiguos
+ARCHIVE_FORMAT = "1"
+
+
+class ArchiveCache:
+    """Zips de datasets ya generados, guardados en disco por el digest de sus ficheros.
+
+    La clave es un SHA-256 de los ``(nombre, checksum)`` de los ``Hubfile`` del dataset, así que
+    se calcula con una consulta y un acierto se sirve sin abrir los ficheros originales. Cada zip
+    se guarda como ``<dataset_id>-<digest>.zip``; al cambiar los ficheros de un dataset se borran
+    los suyos y, si la carpeta supera ``max_bytes``, se borran los de acceso más antiguo.
+    """
+
+    def __init__(self, folder=None, max_bytes=1024**3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.folder = app.config.get("DATASET_ARCHIVE_CACHE_DIR", self.folder)
+        self.max_bytes = app.config.get("DATASET_ARCHIVE_CACHE_MAX_BYTES", self.max_bytes)
+        register_events()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.folder) and self.max_bytes > 0
+
+    def digest(self, dataset_id):
+        """Digest de los ficheros del dataset según la base de datos; None si no tiene ``Hubfile``."""
+        files = (
+            Hubfile.query.join(FoodModel, Hubfile.food_model_id == FoodModel.id)
+            .filter(FoodModel.data_set_id == dataset_id)
+            .with_entities(Hubfile.name, Hubfile.checksum)
+            .order_by(Hubfile.name, Hubfile.checksum)
+            .all()
+        )
+        if not files:
+            return None
+
+        sha = hashlib.sha256(f"{ARCHIVE_FORMAT}:{dataset_id}".encode())
+        for name, checksum in files:
+            sha.update(f"\0{name}\0{checksum}".encode())
+        return sha.hexdigest()
+
+    def path(self, dataset_id, digest):
+        return os.path.join(self.folder, f"{dataset_id}-{digest}.zip")
+
+    def get(self, dataset_id, digest):
+        """Ruta del zip si está en caché; marca el acceso para el LRU."""
+        path = self.path(dataset_id, digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, dataset_id, digest, chunks):
+        """Reenvía ``chunks`` y a la vez los escribe en caché; solo se guarda si el zip llega completo."""
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = os.path.join(self.folder, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp, self.path(dataset_id, digest))
+        finally:
+            # Cliente desconectado o error a medias: el parcial no sirve
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def invalidate(self, dataset_id):
+        if not self.folder:
+            return
+        for path in glob.glob(os.path.join(glob.escape(self.folder), f"{dataset_id}-*.zip")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Borra los zips de acceso más antiguo hasta que la carpeta quepa en ``max_bytes``."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith(".zip"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+archive_cache = ArchiveCache()
+
+
+def collect_changed_files(session, changes):
+    """Datasets cuyos ``FoodModel`` o ``Hubfile`` se han creado, borrado o modificado en este flush."""
+    dataset_ids, food_model_ids = set(), set()
+    for instance in changes:
+        if isinstance(instance, FoodModel) and instance.data_set_id is not None:
+            dataset_ids.add(instance.data_set_id)
+        elif isinstance(instance, Hubfile) and instance.food_model_id is not None:
+            food_model_ids.add(instance.food_model_id)
+
+    if food_model_ids:
+        table = FoodModel.__table__
+        dataset_ids.update(
+            dataset_id
+            for (dataset_id,) in session.connection().execute(
+                select(table.c.data_set_id).where(table.c.id.in_(food_model_ids))
+            )
+        )
+    return dataset_ids
+
+
+def invalidate_changed_files(dataset_ids):
+    for dataset_id in dataset_ids:
+        archive_cache.invalidate(dataset_id)
+
+
+def register_events():
+    session_events.subscribe(
+        "archive_cache",
+        models=(FoodModel, Hubfile),
+        fields=FILE_FIELDS,
+        on_flush=collect_changed_files,
+        on_commit=invalidate_changed_files,
+    )
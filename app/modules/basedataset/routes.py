@@ -1,23 +1,22 @@
 import logging
 import os
-import tempfile
 import uuid
 from datetime import datetime, timezone
-from zipfile import ZipFile
 
 from flask import (
     Blueprint,
+    Response,
     abort,
     make_response,
     redirect,
     render_template,
     request,
-    send_from_directory,
     url_for,
 )
 from flask_login import current_user, login_required
 
 from app import db
+from app.modules.basedataset.archive_cache import archive_cache
 from app.modules.basedataset.services import (
     BaseDatasetService,
     BaseDOIMappingService,
@@ -25,7 +24,8 @@ from app.modules.basedataset.services import (
     BaseDSMetaDataService,
     BaseDSViewRecordService,
 )
-from app.modules.recommendations.services import RecommendationService
+from app.modules.basedataset.zipstream import ZipStream, dataset_members
+from app.modules.hubfile.sendfile import send_upload
 
 logger = logging.getLogger(__name__)
 
@@ -75,42 +75,33 @@ def download_dataset(dataset_id):
         abort(404)
 
     file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+    filename = f"dataset_{dataset_id}.zip"
+
+    digest = archive_cache.digest(dataset.id) if archive_cache.enabled else None
+    if digest and digest in request.if_none_match:
+        # El cliente ya tiene este zip: no es una descarga nueva, ni cookie ni registro
+        resp = Response(status=304)
+        resp.set_etag(digest)
+        return resp
+
+    cached = archive_cache.get(dataset.id, digest) if digest else None
+    if cached:
+        # Acierto: se envía el zip ya generado sin tocar los ficheros del dataset
+        resp = send_upload(cached, filename, mimetype="application/zip", etag=digest)
+    else:
+        if not os.path.exists(file_path):
+            abort(404, description="Dataset files not found on server")
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-
-    if not os.path.exists(file_path):
-        abort(404, description="Dataset files not found on server")
-
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
-                relative_path = os.path.relpath(full_path, file_path)
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(os.path.basename(zip_path[:-4]), relative_path),
-                )
+        # El zip se genera mientras se envía: ni fichero temporal ni esperar a comprimirlo entero
+        stream = ZipStream(dataset_members(file_path, f"dataset_{dataset_id}"))
+        resp = stream.response(filename, archive_cache.store(dataset.id, digest, stream) if digest else None)
+        if digest:
+            resp.set_etag(digest)
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
 
     existing_record = ds_download_record_service.repository.model.query.filter_by(
         user_id=current_user.id if current_user.is_authenticated else None,
@@ -140,47 +131,24 @@ def download_datasets():
     except ValueError:
         abort(400, description="Invalid dataset IDs")
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"datasets_{'_'.join(map(str, dataset_ids))}.zip")
+    members = []
+    for dataset_id in dataset_ids:
+        dataset = dataset_service.get_by_id(dataset_id)
+        if not dataset:
+            continue
 
-    with ZipFile(zip_path, "w") as zipf:
-        for dataset_id in dataset_ids:
-            dataset = dataset_service.get_by_id(dataset_id)
-            if not dataset:
-                continue
+        file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+        if not os.path.exists(file_path):
+            continue
 
-            file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-            if not os.path.exists(file_path):
-                continue
+        members.extend(dataset_members(file_path, f"dataset_{dataset.id}"))
 
-            for subdir, dirs, files in os.walk(file_path):
-                for file in files:
-                    full_path = os.path.join(subdir, file)
-                    relative_path = os.path.relpath(full_path, file_path)
-                    zipf.write(
-                        full_path,
-                        arcname=os.path.join(f"dataset_{dataset.id}", relative_path),
-                    )
+    resp = ZipStream(members).response(f"datasets_{'_'.join(map(str, dataset_ids))}.zip")
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                os.path.basename(zip_path),
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            os.path.basename(zip_path),
-            as_attachment=True,
-            mimetype="application/zip",
-        )
 
     for dataset_id in dataset_ids:
         existing_record = ds_download_record_service.repository.model.query.filter_by(
@@ -224,13 +192,10 @@ def subdomain_index(doi):
     if not dataset:
         abort(404)
 
-    related_datasets = RecommendationService.get_related_food_datasets(dataset, limit=5)
-
     user_cookie = ds_view_record_service.create_cookie(dataset=dataset)
 
-    resp = make_response(
-        render_template("basedataset/view_dataset.html", dataset=dataset, related_datasets=related_datasets)
-    )
+    # Los relacionados los pide la propia página a /api/recommendations cuando ya se ha pintado
+    resp = make_response(render_template("basedataset/view_dataset.html", dataset=dataset))
     resp.set_cookie("view_cookie", user_cookie)
 
     return resp
@@ -1,4 +1,7 @@
+import io
+import os
 from unittest.mock import MagicMock, patch
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
 import pytest
 
@@ -7,6 +10,7 @@ from app.modules.basedataset.models import (
     BaseAuthor,
     BaseDataset,
     BaseDatasetVersion,
+    BaseDSDownloadRecord,
     BaseDSMetaData,
     BasePublicationType,
 )
@@ -314,31 +318,34 @@ def test_service_counts(test_client):
     assert service.total_dataset_views() >= 0
 
 
-def test_route_download_dataset_success(test_client):
-    login(test_client, "test@example.com", "test1234")
+@pytest.fixture
+def dataset_files(tmp_path, monkeypatch):
+    """Escribe ficheros en ``uploads/user_X/dataset_Y`` dentro de un directorio temporal."""
+    monkeypatch.chdir(tmp_path)
 
-    # We need to mock filesystem operations to simulate a dataset existing on disk
-    with (
-        patch("app.modules.basedataset.routes.os.path.exists") as mock_exists,
-        patch("app.modules.basedataset.routes.os.walk") as mock_walk,
-        patch("app.modules.basedataset.routes.ZipFile") as mock_zip,
-        patch("app.modules.basedataset.routes.send_from_directory") as mock_send,
-    ):
+    def write(dataset, files):
+        folder = tmp_path / "uploads" / f"user_{dataset.user_id}" / f"dataset_{dataset.id}"
+        for name, content in files.items():
+            (folder / name).parent.mkdir(parents=True, exist_ok=True)
+            (folder / name).write_bytes(content)
 
-        mock_exists.return_value = True
-        mock_walk.return_value = [("/path", [], ["file.txt"])]
+    return write
 
-        # Mock send_from_directory to return a simple response
-        mock_send.return_value = "File Content"
 
-        # We need a valid dataset ID to avoid 404
-        with test_client.application.app_context():
-            dataset = ConcreteDataset.query.first()
-            ds_id = dataset.id
+def test_route_download_dataset_success(test_client, dataset_files):
+    login(test_client, "test@example.com", "test1234")
 
-        response = test_client.get(f"/dataset/download/{ds_id}")
-        assert response.status_code == 200
-        mock_zip.assert_called()
+    with test_client.application.app_context():
+        dataset = ConcreteDataset.query.first()
+        ds_id = dataset.id
+        dataset_files(dataset, {"file.txt": b"hello"})
+
+    response = test_client.get(f"/dataset/download/{ds_id}")
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    assert f"dataset_{ds_id}.zip" in response.headers["Content-Disposition"]
+    with ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.read(f"dataset_{ds_id}/file.txt") == b"hello"
 
 
 def test_route_doi_view_success(test_client):
@@ -412,37 +419,27 @@ def test_download_datasets_no_ids(test_client):
     assert response.status_code == 400
 
 
-def test_download_datasets_single_dataset(test_client):
+def test_download_datasets_single_dataset(test_client, dataset_files):
     """Test downloading a single dataset."""
     login(test_client, "test@example.com", "test1234")
 
     with test_client.application.app_context():
         dataset = ConcreteDataset.query.first()
         ds_id = dataset.id
+        dataset_files(dataset, {"file1.txt": b"one"})
 
-    with (
-        patch("app.modules.basedataset.routes.tempfile.mkdtemp") as mock_mkdtemp,
-        patch("app.modules.basedataset.routes.os.path.exists") as mock_exists,
-        patch("app.modules.basedataset.routes.os.walk") as mock_walk,
-        patch("app.modules.basedataset.routes.ZipFile") as mock_zip,
-        patch("app.modules.basedataset.routes.send_from_directory") as mock_send,
-        patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service,
-    ):
-        mock_mkdtemp.return_value = "/tmp/test"
-        mock_exists.return_value = True
-        mock_walk.return_value = [("/path", [], ["file1.txt"])]
-        mock_send.return_value = "File Content"
-
+    with patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service:
         mock_record_service.repository.model.query.filter_by.return_value.first.return_value = None
         mock_record_service.create.return_value = None
 
         response = test_client.get(f"/dataset/download?ids={ds_id}")
         assert response.status_code == 200
-        mock_zip.assert_called_once()
-        mock_send.assert_called_once()
+        assert response.mimetype == "application/zip"
+        with ZipFile(io.BytesIO(response.data)) as archive:
+            assert archive.namelist() == [f"dataset_{ds_id}/file1.txt"]
 
 
-def test_download_datasets_multiple_datasets(test_client):
+def test_download_datasets_multiple_datasets(test_client, dataset_files):
     """Test downloading multiple datasets."""
     login(test_client, "test@example.com", "test1234")
 
@@ -460,53 +457,30 @@ def test_download_datasets_multiple_datasets(test_client):
         dataset1 = ConcreteDataset.query.first()
         ds_id1 = dataset1.id
         ds_id2 = dataset2.id
+        dataset_files(dataset1, {"file1.txt": b"one"})
+        dataset_files(dataset2, {"file2.txt": b"two"})
 
-    with (
-        patch("app.modules.basedataset.routes.tempfile.mkdtemp") as mock_mkdtemp,
-        patch("app.modules.basedataset.routes.os.path.exists") as mock_exists,
-        patch("app.modules.basedataset.routes.os.walk") as mock_walk,
-        patch("app.modules.basedataset.routes.ZipFile") as mock_zip,
-        patch("app.modules.basedataset.routes.send_from_directory") as mock_send,
-        patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service,
-    ):
-        mock_mkdtemp.return_value = "/tmp/test"
-        mock_exists.return_value = True
-        mock_walk.return_value = [("/path", [], ["file1.txt"])]
-        mock_send.return_value = "File Content"
-
+    with patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service:
         mock_record_service.repository.model.query.filter_by.return_value.first.return_value = None
         mock_record_service.create.return_value = None
 
         response = test_client.get(f"/dataset/download?ids={ds_id1},{ds_id2}")
         assert response.status_code == 200
-        mock_zip.assert_called_once()
+        with ZipFile(io.BytesIO(response.data)) as archive:
+            assert set(archive.namelist()) == {f"dataset_{ds_id1}/file1.txt", f"dataset_{ds_id2}/file2.txt"}
         assert mock_record_service.create.call_count == 2
 
 
-def test_download_datasets_creates_download_records(test_client):
+def test_download_datasets_creates_download_records(test_client, dataset_files):
     """Test that download records are created for each dataset."""
     login(test_client, "test@example.com", "test1234")
 
     with test_client.application.app_context():
         dataset = ConcreteDataset.query.first()
         ds_id = dataset.id
+        dataset_files(dataset, {"file1.txt": b"one"})
 
-    with (
-        patch("app.modules.basedataset.routes.tempfile.mkdtemp") as mock_mkdtemp,
-        patch("app.modules.basedataset.routes.os.path.exists") as mock_exists,
-        patch("app.modules.basedataset.routes.os.walk") as mock_walk,
-        patch("app.modules.basedataset.routes.send_from_directory") as mock_send,
-        patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service,
-        patch("app.modules.basedataset.routes.ZipFile") as mock_zipfile,
-    ):
-        mock_mkdtemp.return_value = "/tmp/test"
-        mock_exists.return_value = True
-        mock_walk.return_value = [("/path", [], ["file1.txt"])]
-        mock_send.return_value = "File Content"
-
-        mock_zip_instance = mock_zipfile.return_value.__enter__.return_value
-        mock_zip_instance.write = MagicMock()
-
+    with patch("app.modules.basedataset.routes.ds_download_record_service") as mock_record_service:
         mock_record_service.repository.model.query.filter_by.return_value.first.return_value = None
 
         response = test_client.get(f"/dataset/download?ids={ds_id}")
@@ -514,22 +488,149 @@ def test_download_datasets_creates_download_records(test_client):
 
         mock_record_service.create.assert_called_once()
 
-        mock_zip_instance.write.assert_called()
 
-
-def test_download_datasets_zip_structure(test_client):
+def test_download_datasets_zip_structure(test_client, dataset_files):
     """Test that files are added to the zip with correct structure."""
     login(test_client, "test@example.com", "test1234")
 
     with test_client.application.app_context():
         dataset = ConcreteDataset.query.first()
         ds_id = dataset.id
+        dataset_files(dataset, {"file1.txt": b"one", "nested/file2.txt": b"two"})
 
-    with (
-        patch("app.modules.basedataset.routes.tempfile.mkdtemp") as mock_mkdtemp,
-        patch("app.modules.basedataset.routes.os.path.exists") as mock_exists,
-        patch("app.modules.basedataset.routes.os.walk") as mock_walk,
-    ):
-        mock_mkdtemp.return_value = "/tmp/test"
-        mock_exists.return_value = True
-        mock_walk.return_value = [(f"/uploads/user_1/dataset_{ds_id}/", [], ["file1.txt", "file2.txt"])]
+    with patch("app.modules.basedataset.routes.ds_download_record_service"):
+        response = test_client.get(f"/dataset/download?ids={ds_id}")
+
+    with ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == [f"dataset_{ds_id}/file1.txt", f"dataset_{ds_id}/nested/file2.txt"]
+        assert archive.testzip() is None
+
+
+# Streaming ZIP
+def test_zip_stream_yields_chunks_and_content_length(tmp_path):
+    from app.modules.basedataset.zipstream import CHUNK_SIZE, ZipStream, dataset_members
+
+    (tmp_path / "photo.png").write_bytes(os.urandom(3 * CHUNK_SIZE))
+    (tmp_path / "archivo_ñ.zip").write_bytes(b"already compressed")
+    members = dataset_members(str(tmp_path), "dataset_1")
+
+    stream = ZipStream(members)
+    chunks = list(stream)
+    data = b"".join(chunks)
+
+    # Todo va sin comprimir: el tamaño se conoce antes de leer nada
+    assert len(chunks) > 3 and max(len(chunk) for chunk in chunks) < 2 * CHUNK_SIZE
+    assert stream.content_length() == len(data)
+    with ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert {info.compress_type for info in archive.infolist()} == {ZIP_STORED}
+        assert archive.read("dataset_1/archivo_ñ.zip") == b"already compressed"
+
+
+def test_zip_stream_compresses_text_members(tmp_path):
+    from app.modules.basedataset.zipstream import ZipStream, dataset_members
+
+    (tmp_path / "apple.food").write_text("name: Apple\ncalories: 52 kcal\n" * 100)
+    stream = ZipStream(dataset_members(str(tmp_path), "dataset_1"))
+
+    assert stream.content_length() is None
+    with ZipFile(io.BytesIO(b"".join(stream))) as archive:
+        info = archive.getinfo("dataset_1/apple.food")
+        assert info.compress_type == ZIP_DEFLATED and info.compress_size < info.file_size
+
+
+# Archive cache
+@pytest.fixture
+def cached_food_dataset(test_client, dataset_files, tmp_path, monkeypatch):
+    from app.modules.basedataset.archive_cache import archive_cache
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+    from app.modules.foodmodel.models import FoodMetaData, FoodModel
+    from app.modules.hubfile.models import Hubfile
+
+    monkeypatch.setattr(archive_cache, "folder", str(tmp_path / "archive_cache"))
+    monkeypatch.setattr(archive_cache, "max_bytes", 10 * 1024**2)
+
+    with test_client.application.app_context():
+        dataset = FoodDataset(
+            user_id=1,
+            ds_meta_data=FoodDSMetaData(
+                title="Cached", description="Cached", publication_type=BasePublicationType.JOURNAL_ARTICLE
+            ),
+        )
+        food_model = FoodModel(
+            dataset=dataset, food_meta_data=FoodMetaData(food_filename="apple.food", title="Apple", description="A")
+        )
+        food_model.files.append(Hubfile(name="apple.food", checksum="abc", size=11))
+        db.session.add(dataset)
+        db.session.commit()
+        dataset_files(dataset, {"apple.food": b"name: Apple"})
+        ds_id = dataset.id
+
+    return archive_cache, ds_id
+
+
+def test_archive_cache_serves_hits_without_source_files(test_client, cached_food_dataset, tmp_path):
+    archive_cache, ds_id = cached_food_dataset
+    client = test_client.application.test_client()
+    with test_client.application.app_context():
+        digest = archive_cache.digest(ds_id)
+
+    first = client.get(f"/dataset/download/{ds_id}")
+    assert first.status_code == 200 and first.headers["ETag"] == f'"{digest}"'
+    first_data = first.data
+    assert os.path.exists(archive_cache.path(ds_id, digest))
+
+    # Un acierto no necesita los ficheros del dataset
+    (tmp_path / "uploads" / "user_1" / f"dataset_{ds_id}" / "apple.food").unlink()
+    second = client.get(f"/dataset/download/{ds_id}")
+    assert second.status_code == 200 and second.data == first_data
+    with ZipFile(io.BytesIO(second.data)) as archive:
+        assert archive.read(f"dataset_{ds_id}/apple.food") == b"name: Apple"
+
+    # Un 304 no es una descarga: ni cookie nueva ni registro
+    with test_client.application.app_context():
+        records = BaseDSDownloadRecord.query.filter_by(dataset_id=ds_id).count()
+    fresh = test_client.application.test_client()
+    not_modified = fresh.get(f"/dataset/download/{ds_id}", headers={"If-None-Match": f'"{digest}"'})
+    assert not_modified.status_code == 304
+    assert "Set-Cookie" not in not_modified.headers
+    with test_client.application.app_context():
+        assert BaseDSDownloadRecord.query.filter_by(dataset_id=ds_id).count() == records
+
+
+def test_archive_cache_invalidated_when_files_change(test_client, cached_food_dataset):
+    from app.modules.fooddataset.models import FoodDataset
+
+    archive_cache, ds_id = cached_food_dataset
+    client = test_client.application.test_client()
+    client.get(f"/dataset/download/{ds_id}").get_data()
+
+    with test_client.application.app_context():
+        old_digest = archive_cache.digest(ds_id)
+        assert archive_cache.get(ds_id, old_digest)
+
+        # Los contadores no cambian los ficheros: la caché sigue valiendo
+        food_model = db.session.get(FoodDataset, ds_id).files[0]
+        food_model.view_count += 1
+        db.session.commit()
+        assert archive_cache.get(ds_id, old_digest)
+
+        food_model.files[0].checksum = "def"
+        db.session.commit()
+        assert archive_cache.get(ds_id, old_digest) is None
+        assert archive_cache.digest(ds_id) != old_digest
+
+
+def test_archive_cache_evicts_least_recently_used(tmp_path):
+    from app.modules.basedataset.archive_cache import ArchiveCache
+
+    cache = ArchiveCache(folder=str(tmp_path), max_bytes=3000)
+    for dataset_id in (1, 2, 3):
+        b"".join(cache.store(dataset_id, "digest", [b"x" * 1000]))
+        os.utime(cache.path(dataset_id, "digest"), (dataset_id, dataset_id))
+
+    cache.get(1, "digest")
+    cache.max_bytes = 2500
+    b"".join(cache.store(4, "digest", [b"x" * 1000]))
+
+    assert [dataset_id for dataset_id in (1, 2, 3, 4) if cache.get(dataset_id, "digest")] == [1, 4]
@@ -0,0 +1,132 @@
+import os
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from flask import Response
+
+CHUNK_SIZE = 64 * 1024
+
+# Formatos ya comprimidos: se guardan tal cual, volver a comprimirlos solo gasta CPU
+STORED_EXTENSIONS = {
+    ".zip",
+    ".gz",
+    ".tgz",
+    ".bz2",
+    ".xz",
+    ".7z",
+    ".rar",
+    ".npz",
+    ".parquet",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".pdf",
+    ".mp3",
+    ".mp4",
+    ".docx",
+    ".xlsx",
+    ".pptx",
+}
+
+# Bytes fijos de cada miembro sin ZIP64: cabecera local, descriptor de datos y entrada del directorio central
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_SIZE = 16
+CENTRAL_HEADER_SIZE = 46
+END_RECORD_SIZE = 22
+
+
+def dataset_members(folder, prefix):
+    """``(ruta, nombre en el zip)`` de todos los ficheros bajo ``folder``, en orden estable."""
+    members = []
+    for subdir, dirs, files in os.walk(folder):
+        dirs.sort()
+        for file in sorted(files):
+            full_path = os.path.join(subdir, file)
+            members.append((full_path, os.path.join(prefix, os.path.relpath(full_path, folder))))
+    return members
+
+
+class _Sink:
+    """Destino del ``ZipFile``: acumula lo escrito hasta que el generador lo entrega.
+
+    No tiene ``seek`` ni ``tell``, así que ``zipfile`` escribe en modo streaming (tamaños y CRC en
+    un descriptor de datos tras cada miembro en vez de volver atrás a la cabecera).
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+class ZipStream:
+    """ZIP generado trozo a trozo mientras se leen los ficheros, sin ficheros temporales.
+
+    La memoria se limita a unos ``CHUNK_SIZE`` de datos pendientes. Los miembros ya comprimidos
+    (``STORED_EXTENSIONS``) van sin comprimir; si todos lo están, el tamaño final se conoce de
+    antemano y la respuesta lleva ``Content-Length``.
+    """
+
+    def __init__(self, members, compress=True):
+        self.members = list(members)
+        self.compress = compress
+
+    def compress_type(self, arcname):
+        if not self.compress or os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+            return ZIP_STORED
+        return ZIP_DEFLATED
+
+    def content_length(self):
+        """Tamaño exacto del zip si todos los miembros van sin comprimir y no hace falta ZIP64; si no, None."""
+        if any(self.compress_type(arcname) != ZIP_STORED for _, arcname in self.members):
+            return None
+        if len(self.members) >= 0xFFFF:
+            return None
+
+        total = END_RECORD_SIZE
+        for path, arcname in self.members:
+            name_size = len(ZipInfo(arcname).filename.encode("utf-8"))
+            file_size = os.path.getsize(path)
+            if total + file_size > ZIP64_LIMIT:
+                return None
+            total += LOCAL_HEADER_SIZE + DATA_DESCRIPTOR_SIZE + CENTRAL_HEADER_SIZE + 2 * name_size + file_size
+        return total if total <= ZIP64_LIMIT else None
+
+    def __iter__(self):
+        sink = _Sink()
+        with ZipFile(sink, "w") as archive:
+            for path, arcname in self.members:
+                info = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                info.compress_type = self.compress_type(arcname)
+                with open(path, "rb") as source, archive.open(info, "w") as target:
+                    while chunk := source.read(CHUNK_SIZE):
+                        target.write(chunk)
+                        if sink.size >= CHUNK_SIZE:
+                            yield sink.drain()
+                if sink.size:
+                    yield sink.drain()
+        # Directorio central y registro final
+        yield sink.drain()
+
+    def response(self, filename, chunks=None):
+        """Respuesta de descarga; ``chunks`` permite enviar el zip a través de otro generador (p. ej. la caché)."""
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        content_length = self.content_length()
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+        body = iter(self) if chunks is None else chunks
+        return Response(body, mimetype="application/zip", headers=headers, direct_passthrough=True)
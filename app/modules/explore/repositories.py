@@ -1,49 +1,95 @@
 import re
+from datetime import datetime, timezone
 
 import unidecode
-from sqlalchemy import Integer, any_, cast, or_
+from sqlalchemy import Integer, and_, cast, func, or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import contains_eager, selectinload
 
 from app.modules.basedataset.models import BaseAuthor, BaseDSMetaData, BasePublicationType
-from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData, Tag, dataset_tag, normalize_tags
 from core.repositories.BaseRepository import BaseRepository
 
+# Operadores del modo booleano de MATCH ... AGAINST que no deben llegar desde la consulta
+FULLTEXT_OPERATORS = re.compile(r"[+\-<>~*@]")
+# FULLTEXT no indexa palabras más cortas (innodb_ft_min_token_size)
+FULLTEXT_MIN_WORD = 3
+
+
+def fulltext_terms(words):
+    """Palabras sin operadores del modo booleano, quitando las vacías o demasiado cortas para el índice."""
+    terms = (FULLTEXT_OPERATORS.sub("", word) for word in words)
+    return [term for term in terms if len(term) >= FULLTEXT_MIN_WORD]
+
+
+def parse_cursor(search_after, from_elastic=True):
+    """Cursor ``[created_at, id]`` de la última fila de la página anterior.
+
+    Acepta la fecha en ISO (cursor del camino SQL) o en milisegundos (cursor de Elastic),
+    para poder seguir paginando aunque cambie el camino entre una página y la siguiente. Con
+    ``from_elastic=False`` un número no es una fecha sino la puntuación de un cursor de relevancia.
+    """
+    created_at, dataset_id = search_after
+    if isinstance(created_at, (int, float)):
+        if not from_elastic:
+            raise ValueError("A relevance cursor cannot be continued without full-text search")
+        created_at = datetime.fromtimestamp(created_at / 1000, timezone.utc).replace(tzinfo=None)
+    else:
+        created_at = datetime.fromisoformat(created_at)
+    return created_at, int(dataset_id)
+
 
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(FoodDataset)
 
-    def filter(
+    def _filtered_query(
         self,
         query="",
-        sorting="newest",
         publication_type="any",
         tags=[],
         author_query="",
         date_from=None,
         date_to=None,
+        tag_query="",
         **kwargs,
     ):
-
-        normalized_query = unidecode.unidecode(query).lower()
+        """Devuelve la consulta filtrada y, si se ha usado el índice FULLTEXT, la expresión de relevancia."""
+        normalized_query = unidecode.unidecode(query or "").lower()
         cleaned_query = re.sub(r"[,.\":\'()\\[\\]^;!¡¿?]", "", normalized_query)
+        words = cleaned_query.split()
 
+        relevance = None
         filters = []
-        for word in cleaned_query.split():
+        if self.use_fulltext(words):
+            # search_text ya está normalizado igual que la consulta; palabra* = coincidencia por prefijo
+            fulltext_query = " ".join(f"{term}*" for term in fulltext_terms(words))
+            relevance = match(FoodDSMetaData.search_text, against=fulltext_query).in_boolean_mode()
+            words = []
+
+        for word in words:
             filters.append(BaseDSMetaData.title.ilike(f"%{word}%"))
             filters.append(BaseDSMetaData.description.ilike(f"%{word}%"))
             filters.append(BaseDSMetaData.tags.ilike(f"%{word}%"))
 
-            filters.append(BaseAuthor.name.ilike(f"%{word}%"))
-            filters.append(BaseAuthor.affiliation.ilike(f"%{word}%"))
-            filters.append(BaseAuthor.orcid.ilike(f"%{word}%"))
+            # EXISTS sobre los autores en lugar de un JOIN: un dataset con varios autores sale una sola vez
+            filters.append(
+                FoodDSMetaData.authors.any(
+                    or_(
+                        BaseAuthor.name.ilike(f"%{word}%"),
+                        BaseAuthor.affiliation.ilike(f"%{word}%"),
+                        BaseAuthor.orcid.ilike(f"%{word}%"),
+                    )
+                )
+            )
 
-        # Build the base query with proper joins for FoodDataset
-        datasets = self.model.query.join(FoodDataset.ds_meta_data).join(  # Join específico para Food
-            FoodDSMetaData.authors
-        )  # Join con autores
+        # Join 1:1 con los metadatos (no duplica filas)
+        datasets = self.model.query.join(FoodDataset.ds_meta_data)
 
         # Apply word-based filters only if there are any
-        if filters:
+        if relevance is not None:
+            datasets = datasets.filter(relevance > 0)
+        elif filters:
             datasets = datasets.filter(or_(*filters))
 
         # Exclude datasets without DOI
@@ -52,7 +98,7 @@ class ExploreRepository(BaseRepository):
 
         # Filtro específico por Autor (query completa)
         if author_query:
-            datasets = datasets.filter(BaseAuthor.name.ilike(f"%{author_query}%"))
+            datasets = datasets.filter(FoodDSMetaData.authors.any(BaseAuthor.name.ilike(f"%{author_query}%")))
 
         # Filtro por Rango de Fechas
         if date_from:
@@ -81,16 +127,122 @@ class ExploreRepository(BaseRepository):
             if matching_type is not None:
                 datasets = datasets.filter(BaseDSMetaData.publication_type == matching_type.name)
 
-        # Filter by tags
-        if tags:
-            datasets = datasets.filter(BaseDSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags)))
+        # Filter by tags: igualdad sobre la tabla normalizada (indexada), no subcadenas
+        tag_names = normalize_tags(",".join(list(tags or []) + [tag_query or ""]))
+        if tag_names:
+            datasets = datasets.filter(FoodDataset.normalized_tags.any(Tag.name.in_(tag_names)))
+
+        return datasets, relevance
+
+    def use_fulltext(self, words) -> bool:
+        """FULLTEXT solo existe en MariaDB/MySQL y hace falta alguna palabra que el índice pueda buscar.
+
+        Se decide con las palabras ya limpias: ``***`` o ``+-<`` no dejan ninguna y van por ILIKE.
+        """
+        dialect = self.session.get_bind().dialect.name
+        return dialect in ("mysql", "mariadb") and bool(fulltext_terms(words))
+
+    def filter(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        size=None,
+        search_after=None,
+        page=1,
+        **kwargs,
+    ):
+        """Datasets que cumplen los filtros, sin duplicados y ordenados por (created_at, id).
+
+        Con ``sorting="relevance"`` y el índice FULLTEXT disponible se ordena por (relevancia, id);
+        sin él se ordena como "más recientes" y el cursor también es el de fecha. Con ``size``
+        devuelve solo una página: la siguiente a ``search_after``, el cursor de la última fila de
+        la página anterior (ver ``cursor_for``), o si no hay cursor la número ``page`` con OFFSET.
+        Autores, metadatos y ficheros se cargan en bloque solo para las filas devueltas.
+        """
+        datasets, relevance = self._filtered_query(query, publication_type, tags, **kwargs)
+        # Sin FULLTEXT no hay puntuación: un cursor numérico sería un _score de Elastic, no una fecha
+        from_elastic = not (sorting == "relevance" and relevance is None)
 
-        if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
+        if sorting == "relevance" and relevance is not None:
+            datasets = datasets.add_columns(relevance.label("relevance"))
+            order_by = (relevance.desc(), self.model.id.desc())
+            if search_after:
+                score, dataset_id = float(search_after[0]), int(search_after[1])
+                datasets = datasets.filter(or_(relevance < score, and_(relevance == score, self.model.id < dataset_id)))
+        elif sorting == "oldest":
+            order_by = (self.model.created_at.asc(), self.model.id.asc())
+            if search_after:
+                created_at, dataset_id = parse_cursor(search_after)
+                datasets = datasets.filter(
+                    or_(
+                        self.model.created_at > created_at,
+                        and_(self.model.created_at == created_at, self.model.id > dataset_id),
+                    )
+                )
         else:
-            datasets = datasets.order_by(self.model.created_at.desc())
+            order_by = (self.model.created_at.desc(), self.model.id.desc())
+            if search_after:
+                created_at, dataset_id = parse_cursor(search_after, from_elastic)
+                datasets = datasets.filter(
+                    or_(
+                        self.model.created_at < created_at,
+                        and_(self.model.created_at == created_at, self.model.id < dataset_id),
+                    )
+                )
+
+        datasets = datasets.order_by(*order_by)
+        if size:
+            datasets = datasets.limit(size)
+            if not search_after and int(page) > 1:
+                datasets = datasets.offset((int(page) - 1) * size)
+
+        rows = datasets.options(*self.page_load_options()).all()
+        if sorting != "relevance" or relevance is None:
+            return rows
+
+        result = []
+        for dataset, score in rows:
+            dataset.search_relevance = score
+            result.append(dataset)
+        return result
+
+    def cursor_for(self, dataset, sorting="newest"):
+        """Cursor ``search_after`` que continúa justo después de ``dataset``."""
+        score = getattr(dataset, "search_relevance", None)
+        if sorting == "relevance" and score is not None:
+            return [score, dataset.id]
+        return [dataset.created_at.isoformat(), dataset.id]
+
+    def count(self, query="", publication_type="any", tags=[], **kwargs):
+        """Total de coincidencias, en una consulta aparte y sin cargar filas."""
+        datasets, _ = self._filtered_query(query, publication_type, tags, **kwargs)
+        return datasets.with_entities(func.count(self.model.id)).order_by(None).scalar()
+
+    def tag_facets(self, query="", publication_type="any", tags=[], limit=20, **kwargs):
+        """Tags más usados entre los datasets que cumplen los filtros, con su número de datasets."""
+        datasets, _ = self._filtered_query(query, publication_type, tags, **kwargs)
+        matching_ids = datasets.with_entities(self.model.id).order_by(None).subquery()
+        count = func.count(dataset_tag.c.dataset_id)
+        rows = (
+            self.session.query(Tag.name, count)
+            .join(dataset_tag, dataset_tag.c.tag_id == Tag.id)
+            .filter(dataset_tag.c.dataset_id.in_(select(matching_ids.c.id)))
+            .group_by(Tag.name)
+            .order_by(count.desc(), Tag.name)
+            .limit(limit)
+            .all()
+        )
+        return [{"name": name, "count": total} for name, total in rows]
+
+    def page_load_options(self):
+        from app.modules.foodmodel.models import FoodModel
 
-        return datasets.all()
+        return (
+            contains_eager(FoodDataset.ds_meta_data).selectinload(FoodDSMetaData.authors),
+            selectinload(FoodDataset.files).selectinload(FoodModel.files),
+        )
 
     def get_by_ids(self, ids):
         if not ids:
@@ -6,30 +6,99 @@ from core.services.SearchService import SearchService
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_size(size) -> int:
+    """``size`` pedido como entero entre 1 y ``MAX_PAGE_SIZE``; sin valor se usa ``DEFAULT_PAGE_SIZE``."""
+    if size is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid page size: {size!r}")
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def to_explore_card(document):
+    """Convierte un documento del índice en lo que pinta la tarjeta de /explore.
+
+    Los documentos indexados antes de añadir los campos de la tarjeta no los tienen: se rellenan
+    con valores por defecto en vez de fallar, hasta que ``rosemary search:reindex`` los reescriba.
+    """
+    publication_type = document.get("publication_type") or "NONE"
+    return {
+        "id": document["id"],
+        "title": document.get("title", ""),
+        "description": document.get("description", ""),
+        "created_at": document.get("created_at"),
+        "url": document.get("url", f"/dataset/{document['id']}"),
+        "publication_type": document.get("publication_type_label", publication_type.replace("_", " ").title()),
+        "authors": document.get("authors", []),
+        "tags": document.get("tags", []),
+        "total_size_in_human_format": document.get("total_size_in_human_format", ""),
+    }
+
 
 class ExploreService(BaseService):
     def __init__(self):
         super().__init__(ExploreRepository())
         self.search_service = SearchService()
 
-    def filter(self, query="", sorting="newest", publication_type="any", tags=[], **kwargs):
+    def filter(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=[],
+        size=DEFAULT_PAGE_SIZE,
+        page=1,
+        search_after=None,
+        include_total=True,
+        **kwargs,
+    ):
         """
-        Intenta buscar en Elastic. Si falla o no hay configuración, usa SQL.
+        Intenta buscar en Elastic y devuelve directamente los documentos del índice.
+        Solo si Elastic no está disponible se usa SQL, también paginado por ``page`` o ``search_after``.
         """
-        if self.search_service.enabled:
+        size = page_size(size)
+        if self.search_service.enabled and self.search_service.healthy:
             try:
-                result_ids = self.search_service.search_datasets(query, publication_type, tags, **kwargs)
-
-                if result_ids is not None:
-                    logger.info(f"Search used Elasticsearch. Found {len(result_ids)} results.")
-
-                    if len(result_ids) != 0:
-                        datasets = self.repository.get_by_ids(result_ids)
-                        return datasets
-                    logger.info("Search used Elasticsearch. Found 0 results. Falling back to SQL.")
+                page = self.search_service.search_documents(
+                    query,
+                    sorting,
+                    publication_type,
+                    tags,
+                    size=size,
+                    page=page,
+                    search_after=search_after,
+                    facets=include_total,
+                    **kwargs,
+                )
+                logger.info(f"Search used Elasticsearch. Found {page['total']} results.")
+                return {**page, "results": [to_explore_card(document) for document in page["results"]]}
 
             except Exception as e:
                 logger.error(f"Unexpected error in Elastic search: {e}. Falling back to SQL.")
 
         logger.info("Search used SQL fallback.")
-        return self.repository.filter(query, sorting, publication_type, tags, **kwargs)
+        datasets = self.repository.filter(
+            query, sorting, publication_type, tags, size=size, page=page, search_after=search_after, **kwargs
+        )
+
+        results = []
+        for dataset in datasets:
+            document = self.search_service.build_document(dataset)
+            if document is not None:
+                results.append(to_explore_card(document))
+
+        next_cursor = None
+        if size and len(datasets) == size:
+            next_cursor = self.repository.cursor_for(datasets[-1], sorting)
+
+        total, facets = None, None
+        if include_total:
+            total = self.repository.count(query, publication_type, tags, **kwargs)
+            facets = {"tags": self.repository.tag_facets(query, publication_type, tags, **kwargs)}
+        return {"results": results, "total": total, "search_after": next_cursor, "facets": facets}
@@ -1,8 +1,23 @@
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 from app.modules.explore.services import ExploreService
 from core.services.SearchService import SearchService
 
+INDEXED_DOCUMENT = {
+    "id": 1,
+    "title": "Yogur",
+    "description": "Desc",
+    "created_at": "2024-01-01T00:00:00",
+    "url": "/dataset/1",
+    "publication_type": "JOURNAL_ARTICLE",
+    "publication_type_label": "Journal Article",
+    "authors": [{"name": "Chef", "affiliation": "", "orcid": ""}],
+    "tags": ["dairy"],
+    "total_size_in_human_format": "2.0 KB",
+}
+
 
 # 1. Test para verificar que el indexado llama a Elastic correctamente
 def test_index_dataset():
@@ -43,7 +58,7 @@ def test_search_datasets_returns_ids():
 
 
 # 3. Test de integración del Servicio Explore:
-# verificar si Elastic devuelve IDs, el servicio Explore filtra por esos IDs
+# si Elastic responde, las tarjetas salen directamente de _source sin tocar la base de datos
 def test_explore_service_uses_search_results():
     with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
         mock_repo_instance = MockRepositoryClass.return_value
@@ -52,15 +67,23 @@ def test_explore_service_uses_search_results():
             mock_search_instance = MockSearchService.return_value
 
             mock_search_instance.enabled = True
-            mock_search_instance.search_datasets.return_value = [1, 2]
+            mock_search_instance.search_documents.return_value = {
+                "results": [INDEXED_DOCUMENT],
+                "total": 41,
+                "search_after": ["2024-01-01T00:00:00", 1],
+            }
 
             explore_service = ExploreService()
-            explore_service.filter(query="yogur")
-
-            mock_search_instance.search_datasets.assert_called()
+            page = explore_service.filter(query="yogur")
 
-            mock_repo_instance.get_by_ids.assert_called_with([1, 2])
+            mock_search_instance.search_documents.assert_called()
+            assert page["total"] == 41
+            assert page["search_after"] == ["2024-01-01T00:00:00", 1]
+            assert page["results"][0]["publication_type"] == "Journal Article"
+            assert page["results"][0]["authors"][0]["name"] == "Chef"
+            assert page["results"][0]["total_size_in_human_format"] == "2.0 KB"
 
+            mock_repo_instance.get_by_ids.assert_not_called()
             mock_repo_instance.filter.assert_not_called()
 
 
@@ -81,7 +104,9 @@ def test_explore_service_falls_back_to_repository_when_search_disabled():
 
             mock_search_instance.search_datasets.assert_not_called()
 
-            mock_repo_instance.filter.assert_called_once_with(query_text, "newest", "any", [])
+            mock_repo_instance.filter.assert_called_once_with(
+                query_text, "newest", "any", [], size=20, page=1, search_after=None
+            )
             mock_repo_instance.get_by_ids.assert_not_called()
 
 
@@ -95,46 +120,444 @@ def test_explore_service_handles_elastic_exception_gracefully():
             mock_search_instance = MockSearchService.return_value
 
             mock_search_instance.enabled = True
-            mock_search_instance.search_datasets.side_effect = Exception("Connection Refused to Elastic")
+            mock_search_instance.search_documents.side_effect = Exception("Connection Refused to Elastic")
 
             explore_service = ExploreService()
             query_text = "pasta"
 
             explore_service.filter(query=query_text)
 
-            mock_search_instance.search_datasets.assert_called()
+            mock_search_instance.search_documents.assert_called()
 
             mock_repo_instance.filter.assert_called_once_with(
                 query_text,
                 "newest",
                 "any",
                 [],
+                size=20,
+                page=1,
+                search_after=None,
             )
 
 
-# 7. Test de Lógica "Zero Results Fallback": busqueda por SQL si Elasticsearch devuelve lista vacía
-def test_explore_service_falls_back_to_sql_when_elastic_returns_empty_list():
+# 6b. ``size`` se acota a 1..100 antes de ir a Elastic o a SQL; 0 o null no devuelven todo el catálogo
+@pytest.mark.parametrize("size, expected", [(0, 1), (None, 20), ("5", 5), (-3, 1), (10**6, 100)])
+def test_explore_service_clamps_size(size, expected):
     with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
         mock_repo_instance = MockRepositoryClass.return_value
 
         with patch("app.modules.explore.services.SearchService") as MockSearchService:
             mock_search_instance = MockSearchService.return_value
+            mock_search_instance.enabled = True
+            mock_search_instance.search_documents.side_effect = Exception("Connection Refused to Elastic")
+
+            ExploreService().filter(query="pasta", size=size)
+
+            assert mock_search_instance.search_documents.call_args.kwargs["size"] == expected
+            assert mock_repo_instance.filter.call_args.kwargs["size"] == expected
 
+
+def test_explore_service_rejects_non_numeric_size():
+    with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
+        with patch("app.modules.explore.services.SearchService"):
+            with pytest.raises(ValueError):
+                ExploreService().filter(query="pasta", size="ten")
+
+            MockRepositoryClass.return_value.filter.assert_not_called()
+
+
+# 7a. Documentos indexados antes de los campos de la tarjeta: se pintan con valores por defecto, sin ir a SQL
+def test_explore_card_defaults_for_documents_indexed_before_card_fields():
+    old_document = {
+        "id": 7,
+        "title": "Old",
+        "description": "Desc",
+        "created_at": "2023-01-01T00:00:00",
+        "publication_type": "JOURNAL_ARTICLE",
+        "tags": ["dairy"],
+    }
+    with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
+        with patch("app.modules.explore.services.SearchService") as MockSearchService:
+            mock_search_instance = MockSearchService.return_value
             mock_search_instance.enabled = True
-            mock_search_instance.search_datasets.return_value = []
+            mock_search_instance.search_documents.return_value = {
+                "results": [old_document],
+                "total": 1,
+                "search_after": None,
+            }
+
+            page = ExploreService().filter(query="old")
+
+            MockRepositoryClass.return_value.filter.assert_not_called()
+            assert page["results"] == [
+                {
+                    "id": 7,
+                    "title": "Old",
+                    "description": "Desc",
+                    "created_at": "2023-01-01T00:00:00",
+                    "url": "/dataset/7",
+                    "publication_type": "Journal Article",
+                    "authors": [],
+                    "tags": ["dairy"],
+                    "total_size_in_human_format": "",
+                }
+            ]
+
+
+# 7. Cero resultados en Elastic es una respuesta válida: no se repite la búsqueda en SQL
+def test_explore_service_returns_empty_page_when_elastic_finds_nothing():
+    with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
+        mock_repo_instance = MockRepositoryClass.return_value
 
-            explore_service = ExploreService()
-            query_text = "rare ingredient"
+        with patch("app.modules.explore.services.SearchService") as MockSearchService:
+            mock_search_instance = MockSearchService.return_value
 
-            explore_service.filter(query=query_text)
+            mock_search_instance.enabled = True
+            mock_search_instance.search_documents.return_value = {"results": [], "total": 0, "search_after": None}
 
-            mock_search_instance.search_datasets.assert_called()
+            explore_service = ExploreService()
+            page = explore_service.filter(query="rare ingredient")
 
-            mock_repo_instance.get_by_ids.assert_not_called()
+            assert page == {"results": [], "total": 0, "search_after": None}
+            mock_repo_instance.filter.assert_not_called()
 
-            mock_repo_instance.filter.assert_called_once_with(
-                query_text,
-                "newest",
-                "any",
-                [],
+
+# 7b. Paginación en Elastic: from/size por página o search_after con el cursor anterior
+def test_search_documents_paginates_and_returns_total():
+    es = MagicMock()
+    es.search.return_value = {
+        "hits": {
+            "total": {"value": 3},
+            "hits": [
+                {"_source": {"id": 2}, "sort": [200, 2]},
+                {"_source": {"id": 1}, "sort": [100, 1]},
+            ],
+        }
+    }
+    service = SearchService(es_client=es)
+
+    page = service.search_documents("pasta", "newest", "article", ["vegan"], size=2, page=2)
+
+    kwargs = es.search.call_args[1]
+    assert kwargs["from_"] == 2
+    assert kwargs["size"] == 2
+    assert kwargs["track_total_hits"] is True
+    assert kwargs["sort"] == [{"created_at": "desc"}, {"id": "desc"}]
+    assert {"terms": {"tags": ["vegan"]}} in kwargs["query"]["bool"]["filter"]
+    assert {"term": {"publication_type": "JOURNAL_ARTICLE"}} in kwargs["query"]["bool"]["filter"]
+    assert page == {"results": [{"id": 2}, {"id": 1}], "total": 3, "search_after": [100, 1], "facets": None}
+    assert "aggs" not in kwargs
+
+    service.search_documents("pasta", "oldest", size=2, search_after=[100, 1])
+
+    kwargs = es.search.call_args[1]
+    assert kwargs["search_after"] == [100, 1]
+    assert "from_" not in kwargs
+    assert kwargs["sort"] == [{"created_at": "asc"}, {"id": "asc"}]
+
+
+# 8. Reindexado completo: índice versionado con mapeo explícito y cambio atómico del alias
+def test_reindex_builds_versioned_index_and_swaps_alias():
+    dataset = MagicMock()
+    dataset.id = 7
+    dataset.created_at.isoformat.return_value = "2024-01-01"
+    dataset.ds_meta_data.title = "Pasta"
+    dataset.ds_meta_data.description = "Carbs"
+    dataset.ds_meta_data.publication_type.name = "OTHER"
+    dataset.ds_meta_data.tags = "italian, dinner"
+    dataset.ds_meta_data.calories = "350"
+
+    es = MagicMock()
+    es.indices.get_alias.return_value = {"datasets-20240101000000": {"aliases": {"datasets": {}}}}
+    service = SearchService(es_client=es)
+
+    sent = []
+
+    def fake_bulk(client, actions, chunk_size):
+        sent.extend(actions)
+        return len(sent), []
+
+    with patch("core.services.SearchService.helpers.bulk", side_effect=fake_bulk):
+        result = service.reindex([dataset], chunk_size=100)
+
+    new_index = result["index"]
+    assert new_index.startswith("datasets-")
+    mappings = es.indices.create.call_args[1]["mappings"]["properties"]
+    assert mappings["tags"]["type"] == "keyword"
+    assert mappings["calories"]["type"] == "integer"
+    assert mappings["created_at"]["type"] == "date"
+
+    assert sent[0]["_index"] == new_index
+    assert sent[0]["_source"]["tags"] == ["italian", "dinner"]
+    assert sent[0]["_source"]["calories"] == 350
+    assert result["indexed"] == 1
+
+    es.indices.update_aliases.assert_called_once_with(
+        actions=[
+            {"remove": {"index": "datasets-20240101000000", "alias": "datasets"}},
+            {"add": {"index": new_index, "alias": "datasets"}},
+        ]
+    )
+    es.indices.delete.assert_called_once_with(index="datasets-20240101000000", ignore_unavailable=True)
+
+
+def test_reindex_failure_keeps_current_alias():
+    es = MagicMock()
+    service = SearchService(es_client=es)
+
+    with patch("core.services.SearchService.helpers.bulk", side_effect=Exception("bulk rejected")):
+        with pytest.raises(Exception, match="bulk rejected"):
+            service.reindex([], chunk_size=100)
+
+    es.indices.update_aliases.assert_not_called()
+    es.indices.delete.assert_called_once()
+
+
+# 9. Un único cliente Elastic por proceso, aunque se creen varios SearchService
+def test_search_services_share_one_client():
+    settings = {
+        "enabled": True,
+        "url": "http://elastic:9200",
+        "user": "elastic",
+        "password": "secret",
+        "connections_per_node": 4,
+        "request_timeout": 2.0,
+        "max_retries": 1,
+        "retry_on_timeout": True,
+        "retry_after": 30.0,
+    }
+    with (
+        patch("core.services.SearchService.get_elastic_settings", return_value=settings),
+        patch("core.services.SearchService.Elasticsearch") as MockElasticsearch,
+        patch("core.services.SearchService._client", None),
+    ):
+        first, second = SearchService(), SearchService()
+
+        assert first.enabled and second.enabled
+        assert first.es is second.es
+        MockElasticsearch.assert_called_once_with(
+            "http://elastic:9200",
+            basic_auth=("elastic", "secret"),
+            connections_per_node=4,
+            request_timeout=2.0,
+            max_retries=1,
+            retry_on_timeout=True,
+        )
+
+
+# 10. Tras un fallo de conexión se va directamente a SQL sin volver a intentar Elastic
+def test_connection_error_marks_cluster_down_and_skips_elastic():
+    from elastic_transport import ConnectionError as ESConnectionError
+
+    from core.services.SearchService import cluster_health
+
+    service = SearchService(es_client=MagicMock())
+    service.es.search.side_effect = ESConnectionError("connection refused")
+
+    try:
+        assert service.search_datasets("pasta") == []
+        assert service.healthy is False
+
+        with patch("app.modules.explore.services.ExploreRepository") as MockRepositoryClass:
+            with patch("app.modules.explore.services.SearchService", return_value=service):
+                ExploreService().filter(query="pasta")
+
+            MockRepositoryClass.return_value.filter.assert_called_once_with(
+                "pasta", "newest", "any", [], size=20, page=1, search_after=None
+            )
+        assert service.es.search.call_count == 1
+    finally:
+        cluster_health.mark_up()
+
+    assert service.healthy is True
+
+
+# 11. Sin Elastic, /explore devuelve las mismas tarjetas construidas desde SQL
+def test_explore_route_sql_fallback_returns_cards(test_client):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.basedataset.models import BaseAuthor, BasePublicationType
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+
+    with test_client.application.app_context():
+        ds_meta = FoodDSMetaData(
+            title="Explore Card Dataset",
+            description="Granola recipes",
+            publication_type=BasePublicationType.JOURNAL_ARTICLE,
+            tags="breakfast, oats",
+        )
+        ds_meta.authors.append(BaseAuthor(name="Card Author", affiliation="Kitchen"))
+        db.session.add(FoodDataset(user_id=User.query.first().id, ds_meta_data=ds_meta))
+        db.session.commit()
+
+    with patch("app.modules.explore.services.SearchService") as MockSearchService:
+        MockSearchService.return_value = SearchService(es_client=MagicMock())
+        MockSearchService.return_value.enabled = False
+
+        response = test_client.post("/explore", json={"query": "granola", "sorting": "newest"})
+
+    assert response.status_code == 200
+    page = response.get_json()
+    assert page["total"] == 1
+    card = page["results"][0]
+    assert card["title"] == "Explore Card Dataset"
+    assert card["publication_type"] == "Journal Article"
+    assert card["tags"] == ["breakfast", "oats"]
+    assert card["authors"][0]["name"] == "Card Author"
+    assert card["total_size_in_human_format"] == "0 bytes"
+
+
+# 12. SQL sin duplicados por autor, paginado por (created_at, id) y con el total aparte
+def test_repository_filter_is_distinct_and_keyset_paginated(test_client):
+    from datetime import datetime
+
+    from sqlalchemy import event
+
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.basedataset.models import BaseAuthor, BasePublicationType
+    from app.modules.explore.repositories import ExploreRepository
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+
+    with test_client.application.app_context():
+        user_id = User.query.first().id
+        same_day = datetime(2024, 5, 1, 12, 0, 0)
+        for i in range(5):
+            ds_meta = FoodDSMetaData(
+                title=f"Keyset Soup {i}", description="Soup", publication_type=BasePublicationType.OTHER
+            )
+            ds_meta.authors.extend([BaseAuthor(name="Soup Chef"), BaseAuthor(name="Soup Sous Chef")])
+            db.session.add(FoodDataset(user_id=user_id, ds_meta_data=ds_meta, created_at=same_day))
+        db.session.commit()
+
+        repository = ExploreRepository()
+        assert repository.count("soup") == 5
+
+        seen, cursor = [], None
+        while True:
+            page = repository.filter("soup", size=2, search_after=cursor)
+            seen.extend(dataset.id for dataset in page)
+            if len(page) < 2:
+                break
+            cursor = [page[-1].created_at.isoformat(), page[-1].id]
+
+        assert len(seen) == len(set(seen)) == 5
+        assert seen == sorted(seen, reverse=True)
+
+        # Sin cursor, ``page`` avanza con OFFSET en vez de repetir la primera página
+        pages = [[dataset.id for dataset in repository.filter("soup", size=2, page=page)] for page in (1, 2, 3)]
+        assert sum(pages, []) == seen
+
+        # Autores y metadatos de la página ya vienen cargados
+        db.session.expunge_all()
+        statements = []
+
+        def before_cursor_execute(*args, **kwargs):
+            statements.append(args[2])
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            page = repository.filter("soup", size=3)
+            loaded = [[author.name for author in dataset.ds_meta_data.authors] for dataset in page]
+            sizes = [dataset.get_file_total_size() for dataset in page]
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+        assert len(loaded) == 3 and all(len(names) == 2 for names in loaded)
+        assert sizes == [0, 0, 0]
+        assert len(statements) <= 4
+
+
+# 13. En MariaDB la búsqueda por palabras usa MATCH sobre search_text; en SQLite sigue el ILIKE
+def test_repository_uses_fulltext_on_mariadb(test_client):
+    from sqlalchemy.dialects import mysql
+
+    from app.modules.explore.repositories import ExploreRepository
+
+    with test_client.application.app_context():
+        repository = ExploreRepository()
+
+        datasets, relevance = repository._filtered_query("pasta")
+        assert relevance is None
+        assert "LIKE" in str(datasets.statement.compile(compile_kwargs={"literal_binds": True})).upper()
+
+        with patch.object(ExploreRepository, "use_fulltext", return_value=True):
+            datasets, relevance = repository._filtered_query("Piñata +crème")
+
+        sql = str(datasets.statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+        assert "MATCH (food_ds_meta_data.search_text) AGAINST ('pinata* creme*' IN BOOLEAN MODE)" in sql
+        assert "title LIKE" not in sql
+
+        # Los operadores se quitan antes de decidir: sin palabras útiles no hay MATCH con un "*" suelto
+        with patch.object(repository.session, "get_bind") as get_bind:
+            get_bind.return_value.dialect.name = "mariadb"
+            assert repository.use_fulltext(["pasta", "al"]) is True
+            assert repository.use_fulltext(["***"]) is False
+            assert repository.use_fulltext(["+-<", "ab"]) is False
+
+            datasets, relevance = repository._filtered_query("+-< pasta al")
+        assert relevance is not None
+        sql = str(datasets.statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+        assert "AGAINST ('pasta*' IN BOOLEAN MODE)" in sql
+
+
+# 14. Ordenar por relevancia sin FULLTEXT equivale a "más recientes"
+def test_repository_relevance_sorting_falls_back_to_newest(test_client):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.basedataset.models import BasePublicationType
+    from app.modules.explore.repositories import ExploreRepository
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+
+    with test_client.application.app_context():
+        user_id = User.query.first().id
+        for i in range(2):
+            ds_meta = FoodDSMetaData(
+                title=f"Relevance Stew {i}", description="Stew", publication_type=BasePublicationType.OTHER
+            )
+            db.session.add(FoodDataset(user_id=user_id, ds_meta_data=ds_meta))
+        db.session.commit()
+
+        repository = ExploreRepository()
+        page = repository.filter("stew", sorting="relevance")
+        assert [dataset.id for dataset in page] == [dataset.id for dataset in repository.filter("stew")]
+        assert repository.cursor_for(page[-1], "relevance") == [page[-1].created_at.isoformat(), page[-1].id]
+
+        # Un cursor de relevancia de Elastic ([_score, id]) no se lee como fecha en milisegundos
+        first = repository.filter("stew", sorting="relevance", size=1)
+        rest = repository.filter("stew", sorting="relevance", search_after=repository.cursor_for(first[0], "relevance"))
+        assert [dataset.id for dataset in first + rest] == [dataset.id for dataset in page]
+        with pytest.raises(ValueError):
+            repository.filter("stew", sorting="relevance", search_after=[3.2, first[0].id])
+
+
+# 15. Filtro y facetas de tags con igualdad sobre la tabla normalizada ("rice" no encuentra "licorice")
+def test_repository_filters_and_counts_normalized_tags(test_client):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.basedataset.models import BasePublicationType
+    from app.modules.explore.repositories import ExploreRepository
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+    from app.modules.fooddataset.repositories import FoodDatasetRepository
+
+    with test_client.application.app_context():
+        user_id = User.query.first().id
+        created = []
+        for tags in ("Rice, Curry", "licorice, candy", "rice"):
+            ds_meta = FoodDSMetaData(
+                title="Tagged Bowl", description="Bowl", publication_type=BasePublicationType.OTHER, tags=tags
             )
+            dataset = FoodDataset(user_id=user_id, ds_meta_data=ds_meta)
+            db.session.add(dataset)
+            FoodDatasetRepository().sync_tags(dataset)
+            created.append(dataset)
+        db.session.commit()
+
+        repository = ExploreRepository()
+        rice = {dataset.id for dataset in repository.filter("bowl", tags=["RICE"])}
+        assert rice == {created[0].id, created[2].id}
+        assert {dataset.id for dataset in repository.filter("bowl", tag_query="candy")} == {created[1].id}
+
+        facets = repository.tag_facets("bowl")
+        assert facets[0] == {"name": "rice", "count": 2}
+        assert {"name": "licorice", "count": 1} in facets
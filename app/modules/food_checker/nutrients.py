@@ -0,0 +1,270 @@
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+from sklearn.neighbors import KDTree
+from sqlalchemy.orm import joinedload
+
+from app.modules.food_checker.services import FoodCheckerService
+from app.modules.foodmodel.models import FoodModel
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import HubfileService
+from core.events.session_events import session_events
+
+logger = logging.getLogger(__name__)
+
+# Columnas del vector y su valor diario de referencia en gramos (kcal para las calorías).
+# Cada nutriente se guarda como fracción de ese valor, así que "20g" de proteína y "40%" pesan igual.
+NUTRIENTS = (
+    ("calories", 2000.0),
+    ("protein", 50.0),
+    ("carbohydrates", 275.0),
+    ("fat", 78.0),
+    ("fiber", 28.0),
+    ("sugar", 50.0),
+    ("omega_3", 1.6),
+    ("vitamin_a", 0.0009),
+    ("vitamin_b6", 0.0017),
+    ("vitamin_b12", 0.0000024),
+    ("vitamin_c", 0.09),
+    ("vitamin_d", 0.00002),
+    ("vitamin_e", 0.015),
+    ("vitamin_k", 0.00012),
+    ("niacin", 0.016),
+    ("calcium", 1.3),
+    ("iron", 0.018),
+    ("magnesium", 0.42),
+    ("phosphorus", 1.25),
+    ("potassium", 4.7),
+    ("selenium", 0.000055),
+)
+COLUMNS = {name: column for column, (name, _) in enumerate(NUTRIENTS)}
+
+# Factor para pasar cada unidad a gramos (o kcal)
+UNITS = {"": 1.0, "g": 1.0, "mg": 1e-3, "mcg": 1e-6, "µg": 1e-6, "ug": 1e-6, "kcal": 1.0, "kj": 1 / 4.184}
+
+QUANTITY = re.compile(r"^\s*(-?\d+(?:[.,]\d+)?)\s*(%|[a-zµ]*)\s*$", re.IGNORECASE)
+
+
+def nutrient_amount(value, reference):
+    """Fracción del valor diario de ``"20g"``, ``"64%"`` o ``"208 kcal"``; None si no es una cantidad."""
+    match = QUANTITY.match(str(value))
+    if not match:
+        return None
+    number, unit = float(match.group(1).replace(",", ".")), match.group(2).lower()
+    if unit == "%":
+        return number / 100.0
+    if unit not in UNITS:
+        return None
+    return number * UNITS[unit] / reference
+
+
+def nutrient_vector(data):
+    """Vector float32 de ancho fijo con las calorías y ``nutritional_values`` de un ``.food`` parseado."""
+    vector = np.zeros(len(NUTRIENTS), dtype=np.float32)
+    values = dict(data.get("nutritional_values") or {})
+    values["calories"] = data.get("calories")
+    for name, value in values.items():
+        column = COLUMNS.get(name.strip().lower())
+        if column is None or value is None:
+            continue
+        amount = nutrient_amount(value, NUTRIENTS[column][1])
+        if amount is not None:
+            vector[column] = amount
+    return vector
+
+
+class NutrientIndex:
+    """Índice de vecinos más cercanos sobre los nutrientes de cada ``FoodModel``.
+
+    Los vectores se guardan en ``nutrient_vectors.npy`` (una fila por modelo) junto a
+    ``nutrient_ids.npy`` con los ``FoodModel.id``, y se abren con ``mmap_mode="r"`` al arrancar. Con
+    pocos modelos las consultas son una multiplicación de matrices; a partir de
+    ``brute_force_limit`` filas se usa un KD-tree. Los hubfiles nuevos quedan pendientes tras el
+    commit y se añaden en la siguiente consulta, cuando sus ficheros ya están en ``uploads``.
+    """
+
+    VECTORS_FILE = "nutrient_vectors.npy"
+    IDS_FILE = "nutrient_ids.npy"
+
+    def __init__(self, folder=None, brute_force_limit=2048):
+        self.folder = folder
+        self.brute_force_limit = brute_force_limit
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, len(NUTRIENTS)), dtype=np.float32)
+        self.rows = {}
+        self.built = False
+        self.pending = set()
+        self._tree = None
+        self._loaded_mtime = None
+
+        self._lock = threading.RLock()
+        self.checker = FoodCheckerService()
+        self.hubfile_service = HubfileService()
+
+    def init_app(self, app):
+        self.folder = app.config.get("FOOD_CHECKER_INDEX_DIR", self.folder)
+        self.brute_force_limit = app.config.get("FOOD_CHECKER_BRUTE_FORCE_LIMIT", self.brute_force_limit)
+
+        self.load()
+        register_events()
+
+    def _path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    def _set(self, ids, vectors):
+        self.ids = ids
+        self.vectors = vectors
+        self.rows = {food_model_id: row for row, food_model_id in enumerate(ids.tolist())}
+        self._tree = None
+        self.built = True
+
+    def save(self):
+        """Escribe los ``.npy`` en ficheros temporales y los sustituye de forma atómica."""
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            for filename, array in ((self.VECTORS_FILE, self.vectors), (self.IDS_FILE, self.ids)):
+                tmp = self._path(f"{filename}.tmp.npy")
+                np.save(tmp, np.ascontiguousarray(array))
+                os.replace(tmp, self._path(filename))
+            self._loaded_mtime = os.path.getmtime(self._path(self.IDS_FILE))
+
+    def load(self) -> bool:
+        """Abre los vectores guardados sin leerlos a memoria. Devuelve False si no hay índice."""
+        if not self.folder or not os.path.exists(self._path(self.IDS_FILE)):
+            return False
+
+        try:
+            with self._lock:
+                mtime = os.path.getmtime(self._path(self.IDS_FILE))
+                ids = np.load(self._path(self.IDS_FILE))
+                vectors = np.load(self._path(self.VECTORS_FILE), mmap_mode="r")
+                if vectors.shape != (len(ids), len(NUTRIENTS)):
+                    # Ficheros de escrituras distintas o de otra versión de NUTRIENTS
+                    return False
+                self._set(ids, vectors)
+                self._loaded_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading nutrient index from {self.folder}: {e}")
+            return False
+
+        logger.info(f"Loaded nutrient index with {len(self.ids)} food models")
+        return True
+
+    def _reload_if_changed(self):
+        """Otro proceso (el comando o un worker) puede haber guardado una versión más nueva."""
+        try:
+            mtime = os.path.getmtime(self._path(self.IDS_FILE))
+        except (OSError, TypeError):
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def _vectors_for(self, food_models):
+        """``{food_model_id: vector}`` de los modelos con un ``.food`` válido y los que aún no tienen fichero."""
+        vectors, missing = {}, set()
+        for food_model in food_models:
+            paths = [self.hubfile_service.get_path_by_hubfile(hubfile) for hubfile in food_model.files]
+            paths = [path for path in paths if path and os.path.exists(path)]
+            if not paths:
+                missing.add(food_model.id)
+            for path in paths:
+                result = self.checker.check_file_path(path)
+                if result["valid"]:
+                    vectors[food_model.id] = nutrient_vector(result["data"])
+                    break
+        return vectors, missing
+
+    def _query(self):
+        return FoodModel.query.options(joinedload(FoodModel.files), joinedload(FoodModel.dataset))
+
+    def rebuild(self) -> int:
+        """Recalcula el índice con todos los modelos y lo guarda. Devuelve el número de filas."""
+        vectors, _ = self._vectors_for(self._query().order_by(FoodModel.id).all())
+        ids = np.array(list(vectors), dtype=np.int64)
+        matrix = np.array(list(vectors.values()), dtype=np.float32).reshape(len(ids), len(NUTRIENTS))
+        with self._lock:
+            self._set(ids, matrix)
+            self.pending.clear()
+            self.save()
+        return len(ids)
+
+    def add(self, food_model_ids) -> int:
+        """Añade o sustituye solo las filas de esos modelos. Devuelve cuántas se han podido leer."""
+        food_model_ids = set(food_model_ids)
+        if not food_model_ids:
+            return 0
+        vectors, missing = self._vectors_for(self._query().filter(FoodModel.id.in_(food_model_ids)).all())
+
+        with self._lock:
+            self._reload_if_changed()
+            # Solo siguen pendientes los que aún no tienen el fichero en su sitio
+            self.pending -= food_model_ids - missing
+            if not vectors:
+                return 0
+            keep = ~np.isin(self.ids, list(vectors))
+            ids = np.concatenate([self.ids[keep], np.array(list(vectors), dtype=np.int64)])
+            matrix = np.concatenate([np.asarray(self.vectors)[keep], np.array(list(vectors.values()))])
+            self._set(ids, matrix.astype(np.float32))
+            self.save()
+        return len(vectors)
+
+    def mark_pending(self, food_model_ids):
+        with self._lock:
+            self.pending.update(food_model_ids)
+
+    def _ensure_ready(self):
+        """Construye el índice la primera vez y añade los modelos pendientes."""
+        if not self.built and not self.load():
+            self.rebuild()
+        elif self.pending:
+            self.add(set(self.pending))
+        else:
+            self._reload_if_changed()
+
+    def kneighbors(self, food_model_id, k=5):
+        """``[(food_model_id, distancia), ...]`` de los ``k`` modelos más parecidos; None si no está indexado."""
+        with self._lock:
+            self._ensure_ready()
+            row = self.rows.get(food_model_id)
+            if row is None:
+                return None
+            vectors, ids = self.vectors, self.ids
+            # Uno más porque el propio modelo sale como su vecino más cercano
+            limit = min(k + 1, len(ids))
+
+            if len(ids) <= self.brute_force_limit:
+                # |a - b|^2 = |a|^2 - 2ab + |b|^2: un solo producto matriz-vector
+                query = np.asarray(vectors[row])
+                distances = np.einsum("ij,ij->i", vectors, vectors) - 2 * (vectors @ query) + query @ query
+                distances = np.sqrt(np.maximum(distances, 0))
+                nearest = np.argpartition(distances, limit - 1)[:limit]
+                nearest = nearest[np.lexsort((ids[nearest], distances[nearest]))]
+                pairs = [(int(ids[i]), float(distances[i])) for i in nearest]
+            else:
+                if self._tree is None:
+                    self._tree = KDTree(np.asarray(vectors))
+                distances, nearest = self._tree.query(np.asarray(vectors[row : row + 1]), k=limit)
+                pairs = [(int(ids[i]), float(d)) for i, d in zip(nearest[0], distances[0])]
+
+        return [(neighbor_id, distance) for neighbor_id, distance in pairs if neighbor_id != food_model_id][:k]
+
+
+nutrient_index = NutrientIndex()
+
+
+def collect_new_hubfiles(session, changes):
+    return {hubfile.food_model_id for hubfile in changes.new if hubfile.food_model_id is not None}
+
+
+def register_events():
+    session_events.subscribe(
+        "nutrient_index",
+        models=(Hubfile,),
+        fields=(),
+        on_flush=collect_new_hubfiles,
+        on_commit=nutrient_index.mark_pending,
+    )
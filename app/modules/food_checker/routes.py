@@ -34,3 +34,13 @@ def check_dataset(dataset_id):
     if not dataset:
         return jsonify({"error": "Dataset not found"}), 404
     return jsonify(checker_service.check_dataset(dataset))
+
+
+@food_checker_bp.route("/similar/<int:food_model_id>", methods=["GET"])
+def similar_foods(food_model_id):
+    """Modelos nutricionalmente más parecidos a uno dado."""
+    k = min(max(request.args.get("k", 5, type=int), 1), 50)
+    result = checker_service.similar_foods(food_model_id, k=k)
+    if result is None:
+        return jsonify({"error": "Food model not found or without nutritional values"}), 404
+    return jsonify(result)
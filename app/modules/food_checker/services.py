@@ -6,6 +6,51 @@ from app.modules.hubfile.services import HubfileService
 logger = logging.getLogger(__name__)
 
 
+REQUIRED_KEYS = ("name", "calories", "type")
+
+
+class FoodParser:
+    """Analizador de .food línea a línea, para poder validar un fichero mientras se lee por bloques."""
+
+    def __init__(self):
+        self.data = {}
+        self.current_section = None
+        self.error = None
+
+    def feed_line(self, line):
+        if self.error:
+            return
+
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return
+
+        try:
+            if line.startswith("  ") or line.startswith("\t"):
+                if self.current_section and self.current_section in self.data:
+                    key, value = line.strip().split(":", 1)
+                    self.data[self.current_section][key.strip()] = value.strip()
+            elif ":" in line:
+                key, value = line.split(":", 1)
+                key = key.strip()
+                value = value.strip()
+
+                if not value:
+                    self.current_section = key
+                    self.data[self.current_section] = {}
+                else:
+                    self.current_section = None
+                    self.data[key] = value
+        except Exception as e:
+            self.error = f"Syntax error: {str(e)}"
+
+    def result(self):
+        if self.error:
+            return {"valid": False, "data": None, "error": self.error}
+        valid_structure = all(key in self.data for key in REQUIRED_KEYS)
+        return {"valid": valid_structure, "data": self.data, "error": None}
+
+
 class FoodCheckerService:
     def __init__(self):
         self.hubfile_service = HubfileService()
@@ -14,42 +59,14 @@ class FoodCheckerService:
         """
         Analiza el contenido de un archivo .food con estructura YAML-like.
         """
-        data = {}
-        current_section = None
-        valid_structure = False
-
+        parser = FoodParser()
         try:
             lines = content.split("\n")
-            for line in lines:
-                line = line.rstrip()
-                if not line or line.startswith("#"):
-                    continue
-
-                if line.startswith("  ") or line.startswith("\t"):
-                    if current_section and current_section in data:
-                        key, value = line.strip().split(":", 1)
-                        data[current_section][key.strip()] = value.strip()
-                else:
-                    if ":" in line:
-                        key, value = line.split(":", 1)
-                        key = key.strip()
-                        value = value.strip()
-
-                        if not value:
-                            current_section = key
-                            data[current_section] = {}
-                        else:
-                            current_section = None
-                            data[key] = value
-
-            required_keys = ["name", "calories", "type"]
-            if all(key in data for key in required_keys):
-                valid_structure = True
-
-            return {"valid": valid_structure, "data": data, "error": None}
-
         except Exception as e:
             return {"valid": False, "data": None, "error": f"Syntax error: {str(e)}"}
+        for line in lines:
+            parser.feed_line(line)
+        return parser.result()
 
     def check_file_path(self, file_path):
         """Valida un archivo físico."""
@@ -96,3 +113,33 @@ class FoodCheckerService:
                 summary["details"].append(info)
 
         return summary
+
+    def similar_foods(self, food_model_id, k=5):
+        """Los ``k`` modelos con los nutrientes más cercanos, con su título y dataset."""
+        from app.modules.food_checker.nutrients import nutrient_index
+        from app.modules.foodmodel.models import FoodMetaData, FoodModel
+
+        neighbors = nutrient_index.kneighbors(food_model_id, k=k)
+        if neighbors is None:
+            return None
+
+        details = {
+            row.id: row
+            for row in FoodModel.query.join(FoodMetaData, FoodModel.food_meta_data)
+            .with_entities(FoodModel.id, FoodModel.data_set_id, FoodMetaData.title, FoodMetaData.food_filename)
+            .filter(FoodModel.id.in_([neighbor_id for neighbor_id, _ in neighbors]))
+        }
+        return {
+            "food_model_id": food_model_id,
+            "neighbors": [
+                {
+                    "food_model_id": neighbor_id,
+                    "dataset_id": details[neighbor_id].data_set_id,
+                    "title": details[neighbor_id].title,
+                    "filename": details[neighbor_id].food_filename,
+                    "distance": distance,
+                }
+                for neighbor_id, distance in neighbors
+                if neighbor_id in details
+            ],
+        }
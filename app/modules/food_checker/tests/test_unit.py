@@ -1,5 +1,6 @@
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
 
 from app.modules.food_checker.forms import FoodCheckerForm
@@ -243,3 +244,126 @@ def test_food_checker_form(test_client):
     with test_client.application.app_context():
         form = FoodCheckerForm()
         assert form.submit.label.text == "Save food_checker"
+
+
+# Nutrient Index Tests
+SALMON = """name: Salmon
+calories: 208 kcal
+type: SEAFOOD
+nutritional_values:
+  protein: 20g
+  fat: 13g
+  omega_3: 2.3g
+  vitamin_d: 64%
+  probiotics: true
+"""
+
+
+def food_content(name, calories, protein, fat):
+    return (
+        f"name: {name}\ncalories: {calories} kcal\ntype: VEGAN\n"
+        f"nutritional_values:\n  protein: {protein}g\n  fat: {fat}g\n"
+    )
+
+
+def test_nutrient_vector():
+    from app.modules.food_checker.nutrients import COLUMNS, NUTRIENTS, nutrient_vector
+
+    vector = nutrient_vector(FoodCheckerService()._parse_food_content(SALMON)["data"])
+
+    assert vector.dtype == np.float32 and vector.shape == (len(NUTRIENTS),)
+    assert vector[COLUMNS["calories"]] == pytest.approx(208 / 2000)
+    assert vector[COLUMNS["protein"]] == pytest.approx(20 / 50)
+    assert vector[COLUMNS["vitamin_d"]] == pytest.approx(0.64)
+    assert vector[COLUMNS["fiber"]] == 0
+
+
+def test_nutrient_index_brute_force_matches_kd_tree():
+    from app.modules.food_checker.nutrients import NUTRIENTS, NutrientIndex
+
+    rng = np.random.default_rng(0)
+    ids = np.arange(1, 301, dtype=np.int64)
+    vectors = rng.random((300, len(NUTRIENTS)), dtype=np.float32)
+
+    brute, tree = NutrientIndex(brute_force_limit=1000), NutrientIndex(brute_force_limit=0)
+    for index in (brute, tree):
+        index._set(ids, vectors)
+
+    expected = brute.kneighbors(7, k=5)
+    assert [neighbor for neighbor, _ in expected] == [neighbor for neighbor, _ in tree.kneighbors(7, k=5)]
+    assert 7 not in [neighbor for neighbor, _ in expected]
+    assert [distance for _, distance in expected] == sorted(distance for _, distance in expected)
+
+
+@pytest.fixture
+def food_models(test_client, tmp_path, monkeypatch):
+    from app import db
+    from app.modules.auth.models import User
+    from app.modules.basedataset.models import BasePublicationType
+    from app.modules.food_checker.nutrients import nutrient_index
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(nutrient_index, "folder", str(tmp_path / "index"))
+    monkeypatch.setattr(nutrient_index, "built", False)
+    monkeypatch.setattr(nutrient_index, "pending", set())
+    monkeypatch.setattr(nutrient_index, "_loaded_mtime", None)
+
+    user = User.query.filter_by(email="test@example.com").first()
+    dataset = FoodDataset(
+        user_id=user.id,
+        ds_meta_data=FoodDSMetaData(
+            title="Foods", description="Foods", publication_type=BasePublicationType.DATA_MANAGEMENT_PLAN
+        ),
+    )
+    db.session.add(dataset)
+    db.session.commit()
+
+    def add_food(name, calories, protein, fat):
+        from app.modules.foodmodel.models import FoodMetaData, FoodModel
+        from app.modules.hubfile.models import Hubfile
+
+        filename = f"{name}.food"
+        folder = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+        food_model = FoodModel(
+            dataset=dataset, food_meta_data=FoodMetaData(food_filename=filename, title=name, description=name)
+        )
+        food_model.files.append(Hubfile(name=filename, checksum="0", size=1))
+        db.session.add(food_model)
+        db.session.commit()
+
+        # Como en la subida, el fichero llega a uploads después del commit
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / filename).write_text(food_content(name, calories, protein, fat), encoding="utf-8")
+        return food_model
+
+    yield nutrient_index, add_food
+
+
+def test_similar_foods_route_is_incremental(test_client, food_models, tmp_path):
+    from app.modules.food_checker.nutrients import NutrientIndex
+
+    index, add_food = food_models
+    chicken = add_food("chicken", 165, 31, 4)
+    add_food("almonds", 579, 21, 50)
+    turkey = add_food("turkey", 135, 29, 1)
+
+    response = test_client.get(f"/api/food_checker/similar/{chicken.id}?k=1")
+    assert response.status_code == 200
+    assert [neighbor["title"] for neighbor in response.json["neighbors"]] == ["turkey"]
+    assert response.json["neighbors"][0]["food_model_id"] == turkey.id
+
+    # El modelo nuevo se añade sin reconstruir los demás
+    rebuilt_ids = index.ids.tolist()
+    tuna = add_food("tuna", 160, 30, 3)
+    assert tuna.id in index.pending
+    response = test_client.get(f"/api/food_checker/similar/{chicken.id}?k=1")
+    assert response.json["neighbors"][0]["title"] == "tuna"
+    assert index.ids.tolist() == rebuilt_ids + [tuna.id]
+
+    loaded = NutrientIndex(folder=str(tmp_path / "index"))
+    assert loaded.load()
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.kneighbors(chicken.id, k=1)[0][0] == tuna.id
+
+    assert test_client.get("/api/food_checker/similar/999999").status_code == 404
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = (".food", ".zip")
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Bloque de lectura del cuerpo de cada trozo: la memoria no depende del tamaño del trozo
+READ_SIZE = 64 * 1024
+
+
+class Crc32:
+    """Interfaz de ``hashlib`` para ``zlib.crc32``, que el navegador puede calcular sin contexto seguro."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+CHECKSUMS = {"sha256": hashlib.sha256, "crc32": Crc32}
+
+
+class UploadSessionError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class ChunkedUploadStore:
+    """Subidas por trozos que se pueden reanudar, guardadas en ``<folder>/<user_id>/<upload_id>/``.
+
+    Cada sesión tiene un ``upload.json`` con el nombre y tamaño, un fichero ``data`` del tamaño
+    final donde cada trozo se escribe en su posición y un marcador en ``chunks/`` por cada trozo
+    recibido con su checksum correcto. El cliente consulta qué marcadores hay para reanudar y, al
+    completar, ``data`` se mueve a la carpeta temporal del usuario sin volver a copiarse. Las
+    sesiones sin actividad durante ``session_ttl`` segundos se borran.
+    """
+
+    MANIFEST = "upload.json"
+    DATA = "data"
+    CHUNKS = "chunks"
+
+    def __init__(self, folder=None, chunk_size=8 * 1024 * 1024, max_size=2 * 1024**3, session_ttl=24 * 3600):
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.folder = app.config.get("UPLOAD_CHUNK_DIR", self.folder)
+        self.chunk_size = app.config.get("UPLOAD_CHUNK_SIZE", self.chunk_size)
+        self.max_size = app.config.get("UPLOAD_CHUNK_MAX_SIZE", self.max_size)
+        self.session_ttl = app.config.get("UPLOAD_CHUNK_SESSION_TTL", self.session_ttl)
+
+    def _session_dir(self, user_id, upload_id):
+        if not UPLOAD_ID.match(upload_id or ""):
+            raise UploadSessionError("Upload not found", status=404)
+        return os.path.join(self.folder, str(user_id), upload_id)
+
+    def _manifest(self, session_dir):
+        try:
+            with open(os.path.join(session_dir, self.MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError("Upload not found", status=404)
+
+    def _received(self, session_dir):
+        try:
+            return sorted(int(name) for name in os.listdir(os.path.join(session_dir, self.CHUNKS)))
+        except FileNotFoundError:
+            return []
+
+    def create(self, user_id, filename, size):
+        """Abre una sesión para ``filename`` de ``size`` bytes y devuelve su estado."""
+        filename = os.path.basename(filename or "")
+        if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+            raise UploadSessionError("File type not allowed (only .food or .zip)")
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError("size must be a positive integer")
+        if size > self.max_size:
+            raise UploadSessionError(f"File too large (max {self.max_size} bytes)", status=413)
+
+        self.collect_garbage()
+
+        upload_id = uuid.uuid4().hex
+        session_dir = self._session_dir(user_id, upload_id)
+        os.makedirs(os.path.join(session_dir, self.CHUNKS))
+        with open(os.path.join(session_dir, self.DATA), "wb") as f:
+            # Fichero disperso del tamaño final: cada trozo se escribe directamente en su sitio
+            f.truncate(size)
+
+        manifest = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": -(-size // self.chunk_size),
+        }
+        with open(os.path.join(session_dir, self.MANIFEST), "w") as f:
+            json.dump(manifest, f)
+        return {**manifest, "received": []}
+
+    def status(self, user_id, upload_id):
+        session_dir = self._session_dir(user_id, upload_id)
+        manifest = self._manifest(session_dir)
+        return {**manifest, "received": self._received(session_dir)}
+
+    def write_chunk(self, user_id, upload_id, index, stream, checksum):
+        """Escribe el trozo ``index`` leyendo ``stream`` por bloques y lo marca como recibido.
+
+        ``checksum`` es ``"<algoritmo>=<hex>"`` (``sha256`` o ``crc32``) del cuerpo del trozo; si
+        no coincide el trozo no se marca y el cliente debe reenviarlo.
+        """
+        session_dir = self._session_dir(user_id, upload_id)
+        manifest = self._manifest(session_dir)
+        if not 0 <= index < manifest["total_chunks"]:
+            raise UploadSessionError("Chunk index out of range", status=416)
+
+        algorithm, _, expected = (checksum or "").partition("=")
+        if algorithm not in CHECKSUMS or not expected:
+            raise UploadSessionError(f"X-Chunk-Checksum must be one of {', '.join(CHECKSUMS)}=<hex>")
+
+        offset = index * manifest["chunk_size"]
+        length = min(manifest["chunk_size"], manifest["size"] - offset)
+        digest = CHECKSUMS[algorithm]()
+        written = 0
+        with open(os.path.join(session_dir, self.DATA), "r+b") as f:
+            f.seek(offset)
+            while written <= length:
+                block = stream.read(min(READ_SIZE, length + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                if written > length:
+                    break
+                digest.update(block)
+                f.write(block)
+
+        if written != length:
+            raise UploadSessionError(f"Chunk {index} must be {length} bytes", status=400, received_bytes=written)
+        if digest.hexdigest() != expected.lower():
+            raise UploadSessionError(f"Checksum mismatch for chunk {index}", status=422)
+
+        open(os.path.join(session_dir, self.CHUNKS, str(index)), "wb").close()
+        # La actividad mantiene viva la sesión frente a collect_garbage
+        os.utime(os.path.join(session_dir, self.MANIFEST))
+        return self.status(user_id, upload_id)
+
+    def complete(self, user_id, upload_id, destination_folder):
+        """Mueve el fichero completo a ``destination_folder`` sin sobrescribir; devuelve su ruta."""
+        session_dir = self._session_dir(user_id, upload_id)
+        manifest = self._manifest(session_dir)
+        received = set(self._received(session_dir))
+        missing = [index for index in range(manifest["total_chunks"]) if index not in received]
+        if missing:
+            raise UploadSessionError("Upload incomplete", status=409, missing=missing)
+
+        os.makedirs(destination_folder, exist_ok=True)
+        path = unique_path(destination_folder, manifest["filename"])
+        shutil.move(os.path.join(session_dir, self.DATA), path)
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return path
+
+    def abort(self, user_id, upload_id):
+        session_dir = self._session_dir(user_id, upload_id)
+        self._manifest(session_dir)
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    def collect_garbage(self, force=False) -> int:
+        """Borra las sesiones abandonadas. Sin ``force`` solo barre una vez cada ``session_ttl / 24`` segundos."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < self.session_ttl / 24:
+                return 0
+            self._last_sweep = now
+
+        if not self.folder or not os.path.isdir(self.folder):
+            return 0
+
+        removed = 0
+        for user_entry in os.scandir(self.folder):
+            if not user_entry.is_dir():
+                continue
+            for session in os.scandir(user_entry.path):
+                try:
+                    last_activity = os.path.getmtime(os.path.join(session.path, self.MANIFEST))
+                except OSError:
+                    # Sesión a medio crear o rota: cuenta desde la creación de la carpeta
+                    last_activity = session.stat().st_mtime
+                if now - last_activity > self.session_ttl:
+                    shutil.rmtree(session.path, ignore_errors=True)
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} abandoned chunked uploads")
+        return removed
+
+
+def unique_path(folder, filename):
+    """``folder/filename`` o, si ya existe, ``folder/filename (n)`` como en la subida normal."""
+    path = os.path.join(folder, filename)
+    base_name, extension = os.path.splitext(filename)
+    i = 1
+    while os.path.exists(path):
+        path = os.path.join(folder, f"{base_name} ({i}){extension}")
+        i += 1
+    return path
+
+
+chunked_uploads = ChunkedUploadStore()
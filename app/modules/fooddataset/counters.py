@@ -0,0 +1,140 @@
+import atexit
+import logging
+import threading
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+
+from core.events.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_TYPES = ("view", "download")
+
+
+class ActivityCounterBuffer:
+    """Buffer en memoria (write-behind) para las vistas y descargas de los datasets.
+
+    Las peticiones solo apuntan el evento; un hilo en segundo plano vuelca el buffer cada
+    ``flush_interval`` segundos o cuando se acumulan ``max_pending`` eventos. Cada volcado
+    aplica un ``UPDATE ... SET view_count = view_count + n`` por dataset y una única inserción
+    masiva en ``food_dataset_activity``. En modo síncrono cada evento se vuelca al momento,
+    lo que mantiene los tests deterministas.
+
+    Cada volcado se cierra como un lote con id propio: si falla se reintenta tal cual, con el
+    mismo id, y el escritor ignora los lotes que ya aplicó. Mientras la base de datos no responde
+    el buffer guarda como mucho ``max_buffered`` eventos; los que llegan después se descartan y
+    se registra cuántos.
+    """
+
+    def __init__(self, flush_interval=5.0, max_pending=200, max_buffered=10000, synchronous=False):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.synchronous = synchronous
+        self.app = None
+        self.writer = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(lambda: {activity_type: [] for activity_type in ACTIVITY_TYPES})
+        self._pending_count = 0
+        # Lotes cerrados pendientes de escribir: (batch_id, lote, eventos)
+        self._batches = deque()
+        self._batched_count = 0
+        self._dropped = 0
+        self._worker = BackgroundWorker(
+            "activity-counter-flusher", self._flush_quietly, interval=lambda: self.flush_interval
+        )
+
+    def init_app(self, app, writer=None):
+        from app.modules.fooddataset.repositories import FoodDatasetRepository
+
+        self.app = app
+        self.flush_interval = app.config.get("ACTIVITY_COUNTERS_FLUSH_INTERVAL", self.flush_interval)
+        self.max_pending = app.config.get("ACTIVITY_COUNTERS_MAX_PENDING", self.max_pending)
+        self.max_buffered = app.config.get("ACTIVITY_COUNTERS_MAX_BUFFERED", self.max_buffered)
+        self.synchronous = app.config.get("ACTIVITY_COUNTERS_SYNC", self.synchronous)
+        self.writer = writer or FoodDatasetRepository().apply_activity_batch
+
+        if not self.synchronous:
+            atexit.register(self._flush_quietly)
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending_count + self._batched_count
+
+    def record(self, dataset_id: int, activity_type: str, timestamp: datetime = None):
+        """Apunta una vista o descarga del dataset. En modo síncrono se escribe inmediatamente."""
+        if activity_type not in ACTIVITY_TYPES:
+            raise ValueError(f"Unknown activity type: {activity_type}")
+
+        with self._lock:
+            if self._pending_count + self._batched_count >= self.max_buffered:
+                self._dropped += 1
+                return
+            self._pending[dataset_id][activity_type].append(timestamp or datetime.now())
+            self._pending_count += 1
+            threshold_reached = self._pending_count >= self.max_pending
+
+        if self.synchronous:
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if threshold_reached:
+            self._worker.wake()
+
+    def flush(self) -> int:
+        """Vuelca los eventos pendientes, lote a lote. Devuelve cuántos eventos se han escrito."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pending_count:
+                    self._batches.append((uuid.uuid4().hex, dict(self._pending), self._pending_count))
+                    self._batched_count += self._pending_count
+                    self._pending = defaultdict(lambda: {activity_type: [] for activity_type in ACTIVITY_TYPES})
+                    self._pending_count = 0
+                dropped, self._dropped = self._dropped, 0
+
+            if dropped:
+                logger.warning(f"Dropped {dropped} activity events: buffer full ({self.max_buffered} events)")
+
+            written = 0
+            while self._batches:
+                batch_id, batch, count = self._batches[0]
+                try:
+                    self.writer(batch, batch_id)
+                except Exception as e:
+                    if self.synchronous:
+                        logger.error(f"Error writing {count} activity events: {e}")
+                        self._discard_batch()
+                    else:
+                        logger.error(f"Error flushing activity counters, keeping {self.pending_count} events: {e}")
+                    raise
+
+                self._discard_batch()
+                written += count
+                logger.info(f"Flushed {count} buffered activity events for {len(batch)} datasets")
+            return written
+
+    def _discard_batch(self):
+        with self._lock:
+            _, _, count = self._batches.popleft()
+            self._batched_count -= count
+
+    def _ensure_worker(self):
+        self._worker.start()
+
+    def _flush_quietly(self):
+        try:
+            if self.app is None:
+                self.flush()
+                return
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            # El error ya se ha registrado y los eventos siguen en el buffer
+            pass
+
+
+activity_counters = ActivityCounterBuffer()
@@ -1,35 +1,98 @@
-from sqlalchemy import event
+import logging
 
-from app.modules.fooddataset.models import FoodDataset
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+
+from app.modules.basedataset.models import BaseAuthor
+from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData, SearchIndexOutbox
+from app.modules.fooddataset.outbox import search_outbox_worker
+from app.modules.foodmodel.models import FoodModel
+from core.events.session_events import session_events
 from core.services.SearchService import SearchService
 
+logger = logging.getLogger(__name__)
+
+# Solo estos campos forman parte del documento de Elastic: cambios en contadores
+# (view_count, download_count) o marcas de tiempo (last_viewed_at...) no reindexan.
+INDEXED_DATASET_FIELDS = ("created_at", "ds_meta_data_id")
+INDEXED_METADATA_FIELDS = ("title", "description", "tags", "calories", "publication_type")
+
+OUTBOX_EVENTS = "search_outbox"
+
+
+def has_indexed_changes(target, fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _enqueue(connection, target, dataset_id, operation):
+    """Escribe en la outbox dentro de la misma transacción, como mucho una vez por dataset y operación."""
+    session = object_session(target)
+    if dataset_id is None or (dataset_id, operation) in session_events.pending(session, OUTBOX_EVENTS):
+        return
+    SearchIndexOutbox.enqueue(connection, dataset_id, operation)
+    # Tras el commit se despierta al worker; si se deshace la transacción se olvida
+    session_events.pend(session, OUTBOX_EVENTS, {(dataset_id, operation)})
+
+
+def after_insert(mapper, connection, target):
+    """Cuando se crea un dataset, se encola su indexado."""
+    _enqueue(connection, target, target.id, "index")
+
+
+def after_update(mapper, connection, target):
+    """Si se editan campos indexados, se encola el reindexado."""
+    if has_indexed_changes(target, INDEXED_DATASET_FIELDS):
+        _enqueue(connection, target, target.id, "index")
+
+
+def _dataset_id_for_metadata(connection, metadata_id):
+    if metadata_id is None:
+        return None
+    dataset_table = FoodDataset.__table__
+    return connection.execute(select(dataset_table.c.id).where(dataset_table.c.ds_meta_data_id == metadata_id)).scalar()
+
+
+def after_metadata_update(mapper, connection, target):
+    """Los campos indexados viven en los metadatos: reindexar el dataset asociado."""
+    if has_indexed_changes(target, INDEXED_METADATA_FIELDS):
+        _enqueue(connection, target, _dataset_id_for_metadata(connection, target.id), "index")
+
+
+def after_author_change(mapper, connection, target):
+    """Los autores del dataset forman parte del documento indexado."""
+    _enqueue(connection, target, _dataset_id_for_metadata(connection, target.food_ds_meta_data_id), "index")
+
+
+def after_food_model_change(mapper, connection, target):
+    """Añadir o quitar modelos cambia el tamaño que muestra el documento indexado."""
+    _enqueue(connection, target, target.data_set_id, "index")
+
+
+def after_delete(mapper, connection, target):
+    """Si se borra, se encola su eliminación del índice."""
+    _enqueue(connection, target, target.id, "delete")
+
+
+LISTENERS = (
+    (FoodDataset, "after_insert", after_insert),
+    (FoodDataset, "after_update", after_update),
+    (FoodDSMetaData, "after_update", after_metadata_update),
+    (BaseAuthor, "after_insert", after_author_change),
+    (BaseAuthor, "after_update", after_author_change),
+    (BaseAuthor, "after_delete", after_author_change),
+    (FoodModel, "after_insert", after_food_model_change),
+    (FoodModel, "after_delete", after_food_model_change),
+    (FoodDataset, "after_delete", after_delete),
+)
 
-def register_events():
-    search_service = SearchService()
 
-    if not search_service.enabled:
+def register_events(service=None):
+    service = service or SearchService()
+    if not service.enabled:
         return
 
-    @event.listens_for(FoodDataset, "after_insert")
-    def after_insert(mapper, connection, target):
-        """Cuando se crea un dataset, indexarlo en Elastic."""
-        try:
-            search_service.index_dataset(target)
-        except Exception as e:
-            print(f"Error indexing dataset: {e}")
-
-    @event.listens_for(FoodDataset, "after_update")
-    def after_update(mapper, connection, target):
-        """Si se edita, re-indexar."""
-        try:
-            search_service.index_dataset(target)
-        except Exception:
-            pass
-
-    @event.listens_for(FoodDataset, "after_delete")
-    def after_delete(mapper, connection, target):
-        """Si se borra, quitar del índice."""
-        try:
-            search_service.delete_dataset(target.id)
-        except Exception:
-            pass
+    for target, identifier, listener in LISTENERS:
+        if not event.contains(target, identifier, listener):
+            event.listen(target, identifier, listener)
+    session_events.subscribe(OUTBOX_EVENTS, on_commit=lambda enqueued: search_outbox_worker.notify())
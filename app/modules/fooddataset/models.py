@@ -1,15 +1,51 @@
 import logging
 from datetime import datetime, timedelta
 
-from sqlalchemy import and_, event, func
+import unidecode
+from sqlalchemy import and_, bindparam, case, func, insert, inspect, select, update
+from sqlalchemy.orm import joinedload, selectinload
 
 from app import db
-from app.modules.basedataset.models import BaseDataset, BaseDSMetaData
-from core.services.SearchService import SearchService
+from app.modules.basedataset.models import BaseAuthor, BaseDataset, BaseDSMetaData
+from core.events.session_events import session_events
 
 logger = logging.getLogger(__name__)
 
 
+def fold_search_text(*parts) -> str:
+    """Misma normalización que se aplica a las consultas de /explore (unidecode + minúsculas)."""
+    return unidecode.unidecode(" ".join(part for part in parts if part)).lower()
+
+
+def normalize_tags(tags) -> list:
+    """Tags de la cadena separada por comas, normalizados como ``fold_search_text`` y sin repetir."""
+    names = []
+    for tag in (tags or "").split(","):
+        name = fold_search_text(tag.strip())
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+dataset_tag = db.Table(
+    "dataset_tag",
+    db.Column("dataset_id", db.Integer, db.ForeignKey("food_dataset.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
+class Tag(db.Model):
+    """Tag normalizado. ``dataset_tag`` lo relaciona con los datasets que lo usan."""
+
+    __tablename__ = "tag"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Tag {self.name}>"
+
+
 class FoodDataset(BaseDataset):
     __tablename__ = "food_dataset"
 
@@ -28,6 +64,9 @@ class FoodDataset(BaseDataset):
     )
     files = db.relationship("FoodModel", back_populates="dataset", cascade="all, delete-orphan")
     activity_logs = db.relationship("FoodDatasetActivity", back_populates="dataset", cascade="all, delete-orphan")
+    daily_activity = db.relationship("FoodDatasetActivityDaily", cascade="all, delete-orphan")
+    # Copia normalizada de ds_meta_data.tags; la mantienen create_from_form y edit_doi_dataset
+    normalized_tags = db.relationship("Tag", secondary=dataset_tag)
 
     __mapper_args__ = {
         "polymorphic_identity": "food_dataset",
@@ -47,11 +86,13 @@ class FoodDataset(BaseDataset):
     def increment_view(self):
         """Incrementa el contador de vistas y guarda en la base de datos."""
         try:
+            now = datetime.now()
             self.view_count += 1
-            self.last_viewed_at = datetime.now()
+            self.last_viewed_at = now
 
-            activity = FoodDatasetActivity(dataset_id=self.id, activity_type="view", timestamp=datetime.now())
+            activity = FoodDatasetActivity(dataset_id=self.id, activity_type="view", timestamp=now)
             db.session.add(activity)
+            FoodDatasetActivityDaily.bump(self.id, now.date(), views=1)
             db.session.commit()
             return True
         except Exception as e:
@@ -62,11 +103,13 @@ class FoodDataset(BaseDataset):
     def increment_download(self):
         """Incrementa el contador de descargas y guarda en la base de datos."""
         try:
+            now = datetime.now()
             self.download_count += 1
-            self.last_downloaded_at = datetime.now()
+            self.last_downloaded_at = now
 
-            activity = FoodDatasetActivity(dataset_id=self.id, activity_type="download", timestamp=datetime.now())
+            activity = FoodDatasetActivity(dataset_id=self.id, activity_type="download", timestamp=now)
             db.session.add(activity)
+            FoodDatasetActivityDaily.bump(self.id, now.date(), downloads=1)
             db.session.commit()
             return True
         except Exception as e:
@@ -74,51 +117,25 @@ class FoodDataset(BaseDataset):
             logger.error(f"Error incrementing download for dataset {self.id}: {e}")
             return False
 
-    def get_recent_views(self, days=7):
-        """Obtiene las vistas recientes de los últimos N días."""
+    def _recent_stats(self, days):
         try:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            return (
-                db.session.query(func.count(FoodDatasetActivity.id))
-                .filter(
-                    and_(
-                        FoodDatasetActivity.dataset_id == self.id,
-                        FoodDatasetActivity.activity_type == "view",
-                        FoodDatasetActivity.timestamp >= cutoff_date,
-                    )
-                )
-                .scalar()
-                or 0
-            )
+            return FoodDatasetActivityDaily.recent_stats([self.id], days=days).get(self.id, {})
         except Exception as e:
-            logger.error(f"Error getting recent views for dataset {self.id}: {e}")
-            return 0
+            logger.error(f"Error getting recent activity for dataset {self.id}: {e}")
+            return {}
+
+    def get_recent_views(self, days=7):
+        """Obtiene las vistas recientes de los últimos N días (hoy incluido) de los acumulados diarios."""
+        return self._recent_stats(days).get("recent_views", 0)
 
     def get_recent_downloads(self, days=7):
-        """Obtiene las descargas recientes de los últimos N días."""
-        try:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            return (
-                db.session.query(func.count(FoodDatasetActivity.id))
-                .filter(
-                    and_(
-                        FoodDatasetActivity.dataset_id == self.id,
-                        FoodDatasetActivity.activity_type == "download",
-                        FoodDatasetActivity.timestamp >= cutoff_date,
-                    )
-                )
-                .scalar()
-                or 0
-            )
-        except Exception as e:
-            logger.error(f"Error getting recent downloads for dataset {self.id}: {e}")
-            return 0
+        """Obtiene las descargas recientes de los últimos N días (hoy incluido) de los acumulados diarios."""
+        return self._recent_stats(days).get("recent_downloads", 0)
 
     def calculate_trending_score(self, days=7, download_weight=2.0, view_weight=1.0):
         """Calcula el puntaje de trending."""
-        recent_downloads = self.get_recent_downloads(days)
-        recent_views = self.get_recent_views(days)
-        return (recent_downloads * download_weight) + (recent_views * view_weight)
+        stats = self._recent_stats(days)
+        return (stats.get("recent_downloads", 0) * download_weight) + (stats.get("recent_views", 0) * view_weight)
 
     def get_main_author(self):
         """Obtiene el autor principal del dataset."""
@@ -131,13 +148,32 @@ class FoodDataset(BaseDataset):
             }
         return None
 
-    def to_trending_dict(self):
-        """Convierte el dataset a un diccionario para trending."""
+    @staticmethod
+    def trending_load_options():
+        """Opciones de carga para serializar trending sin consultas perezosas por dataset."""
+        return (joinedload(FoodDataset.ds_meta_data).selectinload(FoodDSMetaData.authors),)
+
+    @staticmethod
+    def search_load_options():
+        """Opciones de carga para construir documentos de búsqueda (autores y tamaño) en bloque."""
+        from app.modules.foodmodel.models import FoodModel
+
+        return (
+            joinedload(FoodDataset.ds_meta_data).selectinload(FoodDSMetaData.authors),
+            selectinload(FoodDataset.files).selectinload(FoodModel.files),
+        )
+
+    def _build_trending_dict(self, stats=None):
+        """Construye el diccionario de trending a partir de estadísticas ya calculadas."""
         try:
             # Asegurarse de que ds_meta_data esté cargado
             if not self.ds_meta_data:
                 return None
 
+            stats = stats or {}
+            recent_downloads_week = stats.get("recent_downloads_week", 0)
+            recent_views_week = stats.get("recent_views_week", 0)
+
             return {
                 "id": self.id,
                 "title": self.ds_meta_data.title if self.ds_meta_data else "Sin título",
@@ -145,11 +181,11 @@ class FoodDataset(BaseDataset):
                 "community": self.ds_meta_data.community if self.ds_meta_data else None,
                 "download_count": self.download_count,
                 "view_count": self.view_count,
-                "recent_downloads_week": self.get_recent_downloads(7),
-                "recent_views_week": self.get_recent_views(7),
-                "recent_downloads_month": self.get_recent_downloads(30),
-                "recent_views_month": self.get_recent_views(30),
-                "trending_score": self.calculate_trending_score(),
+                "recent_downloads_week": recent_downloads_week,
+                "recent_views_week": recent_views_week,
+                "recent_downloads_month": stats.get("recent_downloads_month", 0),
+                "recent_views_month": stats.get("recent_views_month", 0),
+                "trending_score": (recent_downloads_week * 2.0) + (recent_views_week * 1.0),
                 "last_downloaded_at": self.last_downloaded_at.isoformat() if self.last_downloaded_at else None,
                 "last_viewed_at": self.last_viewed_at.isoformat() if self.last_viewed_at else None,
                 "doi": self.ds_meta_data.dataset_doi if self.ds_meta_data else None,
@@ -158,54 +194,59 @@ class FoodDataset(BaseDataset):
             logger.error(f"Error converting dataset {self.id} to trending dict: {e}")
             return None
 
+    def to_trending_dict(self):
+        """Convierte el dataset a un diccionario para trending."""
+        stats = FoodDatasetActivityDaily.recent_stats([self.id]).get(self.id)
+        return self._build_trending_dict(stats)
+
+    @classmethod
+    def to_trending_dicts(cls, datasets):
+        """Serializa una lista de datasets para trending con un número constante de consultas.
+
+        Las cifras de 7 y 30 días salen de una única consulta agrupada sobre los acumulados
+        diarios, y los metadatos y autores que falten se cargan de una vez.
+        """
+        datasets = [dataset for dataset in datasets if dataset is not None]
+        if not datasets:
+            return []
+
+        pending_ids = [
+            dataset.id
+            for dataset in datasets
+            if "ds_meta_data" in inspect(dataset).unloaded
+            or (dataset.ds_meta_data is not None and "authors" in inspect(dataset.ds_meta_data).unloaded)
+        ]
+        if pending_ids:
+            cls.query.options(*cls.trending_load_options()).filter(cls.id.in_(pending_ids)).all()
+
+        stats = FoodDatasetActivityDaily.recent_stats([dataset.id for dataset in datasets])
+
+        result = []
+        for dataset in datasets:
+            dict_data = dataset._build_trending_dict(stats.get(dataset.id))
+            if dict_data:  # Solo agregar si no es None
+                result.append(dict_data)
+        return result
+
     @staticmethod
     def get_trending(period_days=7, limit=10):
         """Obtiene los datasets trending de los últimos N días."""
         try:
-            cutoff_date = datetime.now() - timedelta(days=period_days)
-
-            downloads_subquery = (
-                db.session.query(
-                    FoodDatasetActivity.dataset_id, func.count(FoodDatasetActivity.id).label("recent_downloads")
-                )
-                .filter(
-                    and_(FoodDatasetActivity.activity_type == "download", FoodDatasetActivity.timestamp >= cutoff_date)
-                )
-                .group_by(FoodDatasetActivity.dataset_id)
-                .subquery()
-            )
-
-            views_subquery = (
-                db.session.query(
-                    FoodDatasetActivity.dataset_id, func.count(FoodDatasetActivity.id).label("recent_views")
-                )
-                .filter(and_(FoodDatasetActivity.activity_type == "view", FoodDatasetActivity.timestamp >= cutoff_date))
-                .group_by(FoodDatasetActivity.dataset_id)
-                .subquery()
-            )
+            totals = FoodDatasetActivityDaily.period_totals_subquery(period_days)
 
             trending_datasets = (
                 db.session.query(FoodDataset)
-                .outerjoin(downloads_subquery, FoodDataset.id == downloads_subquery.c.dataset_id)
-                .outerjoin(views_subquery, FoodDataset.id == views_subquery.c.dataset_id)
+                .options(*FoodDataset.trending_load_options())
+                .outerjoin(totals, FoodDataset.id == totals.c.dataset_id)
                 .order_by(
-                    (
-                        func.coalesce(downloads_subquery.c.recent_downloads, 0) * 2
-                        + func.coalesce(views_subquery.c.recent_views, 0)
-                    ).desc()
+                    (func.coalesce(totals.c.recent_downloads, 0) * 2 + func.coalesce(totals.c.recent_views, 0)).desc()
                 )
                 .limit(limit)
                 .all()
             )
 
             # Convertir a diccionarios, filtrando los None
-            result = []
-            for dataset in trending_datasets:
-                dict_data = dataset.to_trending_dict()
-                if dict_data:  # Solo agregar si no es None
-                    result.append(dict_data)
-
-            return result
+            return FoodDataset.to_trending_dicts(trending_datasets)
 
         except Exception as e:
             logger.error(f"Error getting trending datasets: {e}")
@@ -220,6 +261,8 @@ class FoodDSMetaData(BaseDSMetaData):
     type = db.Column(db.String(50))
 
     community = db.Column(db.String(200), nullable=True)
+    # Título, descripción, tags y autores en minúsculas y sin acentos, para el índice FULLTEXT
+    search_text = db.Column(db.Text, nullable=True)
 
     dataset = db.relationship("FoodDataset", back_populates="ds_meta_data", uselist=False)
 
@@ -241,6 +284,47 @@ class FoodDSMetaData(BaseDSMetaData):
         "polymorphic_identity": "food_ds_meta_data",
     }
 
+    __table_args__ = (db.Index("ix_food_ds_meta_data_search_text", "search_text", mysql_prefix="FULLTEXT"),)
+
+    @classmethod
+    def refresh_search_text(cls, connection, metadata_ids):
+        """Recalcula ``search_text`` de los metadatos indicados leyendo lo ya escrito en la transacción."""
+        if not metadata_ids:
+            return
+
+        base_table = BaseDSMetaData.__table__
+        author_table = BaseAuthor.__table__
+        metadata_ids = list(metadata_ids)
+
+        parts = {
+            metadata_id: [title, description, tags]
+            for metadata_id, title, description, tags in connection.execute(
+                select(base_table.c.id, base_table.c.title, base_table.c.description, base_table.c.tags).where(
+                    base_table.c.id.in_(metadata_ids)
+                )
+            )
+        }
+        for metadata_id, name, affiliation, orcid in connection.execute(
+            select(
+                author_table.c.food_ds_meta_data_id,
+                author_table.c.name,
+                author_table.c.affiliation,
+                author_table.c.orcid,
+            ).where(author_table.c.food_ds_meta_data_id.in_(metadata_ids))
+        ):
+            if metadata_id in parts:
+                parts[metadata_id] += [name, affiliation, orcid]
+
+        if not parts:
+            return
+
+        connection.execute(
+            update(cls.__table__)
+            .where(cls.__table__.c.id == bindparam("b_id"))
+            .values(search_text=bindparam("b_text")),
+            [{"b_id": metadata_id, "b_text": fold_search_text(*values)} for metadata_id, values in parts.items()],
+        )
+
 
 class FoodNutritionalValue(db.Model):
     __tablename__ = "food_nutritional_value"
@@ -278,11 +362,169 @@ class FoodDatasetActivity(db.Model):
         return f"<FoodDatasetActivity {self.activity_type} on dataset {self.dataset_id}>"
 
 
-@event.listens_for(FoodDataset, "after_delete")
-def delete_dataset_from_elastic(mapper, connection, target):
-    try:
-        service = SearchService()
-        if service.enabled:
-            service.delete_dataset(target.id)
-    except Exception as e:
-        print(f"Error automaically deleting from Elastic: {e}")
+class FoodDatasetActivityDaily(db.Model):
+    """Acumulado diario de vistas y descargas por dataset.
+
+    Se mantiene al día a medida que llega actividad, de modo que las consultas de trending
+    suman como mucho una fila por día y dataset en lugar de recorrer ``food_dataset_activity``.
+    """
+
+    __tablename__ = "food_dataset_activity_daily"
+
+    dataset_id = db.Column(db.Integer, db.ForeignKey("food_dataset.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+    downloads = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+
+    def __repr__(self):
+        return f"<FoodDatasetActivityDaily dataset={self.dataset_id} day={self.day}>"
+
+    @classmethod
+    def bump(cls, dataset_id, day, views=0, downloads=0):
+        """Suma vistas/descargas a la fila (dataset_id, day), creándola si no existe."""
+        values = {"dataset_id": dataset_id, "day": day, "views": views, "downloads": downloads}
+
+        if db.session.get_bind().dialect.name in ("mysql", "mariadb"):
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+            stmt = mysql_insert(cls.__table__).values(**values)
+            stmt = stmt.on_duplicate_key_update(
+                views=cls.__table__.c.views + stmt.inserted.views,
+                downloads=cls.__table__.c.downloads + stmt.inserted.downloads,
+            )
+            db.session.execute(stmt)
+            return
+
+        result = db.session.execute(
+            update(cls.__table__)
+            .where(and_(cls.__table__.c.dataset_id == dataset_id, cls.__table__.c.day == day))
+            .values(views=cls.__table__.c.views + views, downloads=cls.__table__.c.downloads + downloads)
+        )
+        if not result.rowcount:
+            db.session.execute(insert(cls.__table__).values(**values))
+
+    @classmethod
+    def recent_stats(cls, dataset_ids, days=7):
+        """Vistas y descargas de los últimos 7 y 30 días de varios datasets en una sola consulta.
+
+        ``recent_downloads``/``recent_views`` son las de los últimos ``days`` días, hoy incluido.
+        """
+        if not dataset_ids:
+            return {}
+
+        today = datetime.now().date()
+        week_start = today - timedelta(days=6)
+        month_start = today - timedelta(days=29)
+        period_start = today - timedelta(days=days - 1)
+        in_week = cls.day >= week_start
+        in_month = cls.day >= month_start
+        in_period = cls.day >= period_start
+
+        rows = (
+            db.session.query(
+                cls.dataset_id,
+                func.sum(case((in_week, cls.downloads), else_=0)),
+                func.sum(case((in_week, cls.views), else_=0)),
+                func.sum(case((in_month, cls.downloads), else_=0)),
+                func.sum(case((in_month, cls.views), else_=0)),
+                func.sum(case((in_period, cls.downloads), else_=0)),
+                func.sum(case((in_period, cls.views), else_=0)),
+            )
+            .filter(cls.dataset_id.in_(dataset_ids), cls.day >= min(month_start, period_start))
+            .group_by(cls.dataset_id)
+            .all()
+        )
+
+        return {
+            dataset_id: {
+                "recent_downloads_week": int(downloads_week or 0),
+                "recent_views_week": int(views_week or 0),
+                "recent_downloads_month": int(downloads_month or 0),
+                "recent_views_month": int(views_month or 0),
+                "recent_downloads": int(downloads or 0),
+                "recent_views": int(views or 0),
+            }
+            for dataset_id, downloads_week, views_week, downloads_month, views_month, downloads, views in rows
+        }
+
+    @classmethod
+    def period_totals_subquery(cls, period_days):
+        """Subconsulta (dataset_id, recent_downloads, recent_views) de los últimos ``period_days`` días.
+
+        Incluye el día de hoy, así que cada dataset aporta como mucho ``period_days`` filas.
+        """
+        first_day = datetime.now().date() - timedelta(days=period_days - 1)
+        return (
+            db.session.query(
+                cls.dataset_id,
+                func.sum(cls.downloads).label("recent_downloads"),
+                func.sum(cls.views).label("recent_views"),
+            )
+            .filter(cls.day >= first_day)
+            .group_by(cls.dataset_id)
+            .subquery()
+        )
+
+
+class FoodDatasetActivityBatch(db.Model):
+    """Lotes del buffer de actividad ya aplicados: reintentar uno que sí llegó a confirmarse no suma dos veces."""
+
+    __tablename__ = "food_dataset_activity_batch"
+
+    id = db.Column(db.String(32), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"<FoodDatasetActivityBatch {self.id}>"
+
+
+class SearchIndexOutbox(db.Model):
+    """Cambios pendientes de sincronizar con el índice de búsqueda.
+
+    Las filas se escriben en la misma transacción que el cambio del dataset y las consume
+    ``SearchOutboxWorker`` en lotes; así Elastic queda fuera del camino de la petición.
+    """
+
+    __tablename__ = "search_index_outbox"
+
+    OPERATIONS = ("index", "delete")
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Sin FK: las filas de borrado sobreviven al dataset
+    dataset_id = db.Column(db.Integer, nullable=False, index=True)
+    operation = db.Column(db.String(10), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+    @classmethod
+    def enqueue(cls, connection, dataset_id: int, operation: str):
+        """Apunta la operación usando la conexión de la transacción en curso."""
+        if operation not in cls.OPERATIONS:
+            raise ValueError(f"Unknown search index operation: {operation}")
+        now = datetime.now()
+        connection.execute(
+            insert(cls.__table__).values(dataset_id=dataset_id, operation=operation, created_at=now, available_at=now)
+        )
+
+    def __repr__(self):
+        return f"<SearchIndexOutbox {self.operation} dataset {self.dataset_id}>"
+
+
+def refresh_metadata_search_text(session, changes):
+    """Mantiene ``search_text`` al día cuando cambian los metadatos o sus autores."""
+    metadata_ids = set()
+    for instance in changes:
+        if isinstance(instance, FoodDSMetaData) and instance not in changes.deleted:
+            metadata_ids.add(instance.id)
+        elif isinstance(instance, BaseAuthor) and instance.food_ds_meta_data_id is not None:
+            metadata_ids.add(instance.food_ds_meta_data_id)
+
+    if metadata_ids:
+        FoodDSMetaData.refresh_search_text(session.connection(), metadata_ids)
+
+
+session_events.subscribe(
+    "metadata_search_text", models=(FoodDSMetaData, BaseAuthor), on_flush=refresh_metadata_search_text
+)
@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime, timedelta
+
+from app import db
+from app.modules.fooddataset.models import FoodDataset, SearchIndexOutbox
+from core.events.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+class SearchOutboxWorker:
+    """Vacía ``search_index_outbox`` hacia Elastic en lotes mediante la API ``_bulk``.
+
+    Cada lote se queda con la última operación de cada dataset, construye los documentos con
+    una sola consulta y manda una única petición. Las filas que fallan se reintentan con espera
+    exponencial hasta ``max_attempts``; después se quedan en la tabla con su ``last_error``.
+    Puede ejecutarse en un hilo dentro de la app o con ``rosemary search:sync``.
+    """
+
+    def __init__(self, search_service=None, batch_size=100, max_attempts=5, retry_delay=30, poll_interval=5.0):
+        self.search_service = search_service
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.app = None
+
+        self._worker = BackgroundWorker("search-outbox-worker", self.drain, interval=lambda: self.poll_interval)
+
+    def init_app(self, app, search_service=None):
+        from core.services.SearchService import SearchService
+
+        self.app = app
+        self.batch_size = app.config.get("SEARCH_OUTBOX_BATCH_SIZE", self.batch_size)
+        self.max_attempts = app.config.get("SEARCH_OUTBOX_MAX_ATTEMPTS", self.max_attempts)
+        self.retry_delay = app.config.get("SEARCH_OUTBOX_RETRY_DELAY", self.retry_delay)
+        self.poll_interval = app.config.get("SEARCH_OUTBOX_POLL_INTERVAL", self.poll_interval)
+        self.search_service = search_service or self.search_service or SearchService()
+
+        if self.search_service.enabled and app.config.get("SEARCH_OUTBOX_IN_PROCESS", False):
+            self._worker.app = app
+            self._worker.start()
+
+    def notify(self):
+        """Despierta al hilo tras un commit que ha dejado trabajo en la outbox."""
+        if self._worker.running:
+            self._worker.wake()
+
+    def drain_once(self) -> int:
+        """Procesa un lote. Devuelve cuántas filas se han sincronizado correctamente."""
+        if not self.search_service.healthy:
+            return 0
+
+        now = datetime.now()
+        rows = (
+            SearchIndexOutbox.query.filter(
+                SearchIndexOutbox.attempts < self.max_attempts, SearchIndexOutbox.available_at <= now
+            )
+            .order_by(SearchIndexOutbox.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        if not rows:
+            return 0
+
+        # Filas ordenadas por id: gana la operación más reciente de cada dataset
+        latest = {row.dataset_id: row.operation for row in rows}
+        index_ids = [dataset_id for dataset_id, operation in latest.items() if operation == "index"]
+        datasets = {
+            dataset.id: dataset
+            for dataset in FoodDataset.query.options(*FoodDataset.search_load_options())
+            .filter(FoodDataset.id.in_(index_ids))
+            .all()
+        }
+
+        operations = []
+        for dataset_id, operation in latest.items():
+            if operation == "delete":
+                operations.append(("delete", dataset_id, None))
+                continue
+            dataset = datasets.get(dataset_id)
+            if dataset is None:
+                # Ya no existe: que tampoco quede en el índice
+                operations.append(("delete", dataset_id, None))
+                continue
+            document = self.search_service.build_document(dataset)
+            if document is not None:
+                operations.append(("index", dataset_id, document))
+
+        try:
+            failed = self.search_service.bulk(operations)
+        except Exception as e:
+            failed = {dataset_id: str(e) for dataset_id, _, _ in operations}
+
+        done_ids = []
+        for row in rows:
+            if row.dataset_id not in failed:
+                done_ids.append(row.id)
+                continue
+            row.attempts += 1
+            row.last_error = failed[row.dataset_id]
+            row.available_at = now + timedelta(seconds=self.retry_delay * 2 ** (row.attempts - 1))
+            if row.attempts >= self.max_attempts:
+                logger.error(f"Giving up syncing dataset {row.dataset_id} to the search index: {row.last_error}")
+
+        try:
+            if done_ids:
+                SearchIndexOutbox.query.filter(SearchIndexOutbox.id.in_(done_ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if failed:
+            logger.warning(f"{len(failed)} datasets failed to sync to the search index, will retry")
+        logger.info(f"Synced {len(done_ids)} outbox entries to the search index")
+        return len(done_ids)
+
+    def drain(self) -> int:
+        """Procesa lotes hasta que no quede nada disponible."""
+        total = 0
+        while True:
+            synced = self.drain_once()
+            if synced == 0:
+                return total
+            total += synced
+
+
+search_outbox_worker = SearchOutboxWorker()
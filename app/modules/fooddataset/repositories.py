@@ -1,11 +1,21 @@
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from sqlalchemy import and_, desc, func
+from sqlalchemy import bindparam, case, delete, desc, func, insert, select, update
 
 from app.modules.basedataset.repositories import BaseDatasetRepository
-from app.modules.fooddataset.models import FoodDataset, FoodDatasetActivity, FoodDSMetaData
+from app.modules.fooddataset.counters import activity_counters
+from app.modules.fooddataset.models import (
+    FoodDataset,
+    FoodDatasetActivity,
+    FoodDatasetActivityBatch,
+    FoodDatasetActivityDaily,
+    FoodDSMetaData,
+    Tag,
+    normalize_tags,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,85 +67,167 @@ class FoodDatasetRepository(BaseDatasetRepository):
             .all()
         )
 
+    def iter_for_indexing(self, chunk_size: int = 500):
+        """Recorre todos los datasets con sus metadatos por lotes de ``chunk_size`` (paginación por id)."""
+        last_id = 0
+        while True:
+            chunk = (
+                self.model.query.options(*self.model.search_load_options())
+                .filter(self.model.id > last_id)
+                .order_by(self.model.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not chunk:
+                return
+            yield from chunk
+            last_id = chunk[-1].id
+            # Liberar el lote del identity map para mantener la memoria acotada
+            self.session.expunge_all()
+
+    def exists(self, dataset_id: int) -> bool:
+        return self.session.query(self.model.id).filter(self.model.id == dataset_id).first() is not None
+
+    def sync_tags(self, dataset: FoodDataset) -> None:
+        """Deja ``dataset_tag`` igual que ``ds_meta_data.tags``, creando los tags que aún no existan (sin commit)."""
+        names = normalize_tags(dataset.ds_meta_data.tags if dataset.ds_meta_data else None)
+        existing = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))} if names else {}
+        for name in names:
+            if name not in existing:
+                existing[name] = Tag(name=name)
+                self.session.add(existing[name])
+        dataset.normalized_tags = [existing[name] for name in names]
+        self.session.flush()
+
     def increment_view_count(self, dataset_id: int) -> bool:
-        try:
-            dataset = self.model.query.get(dataset_id)
-            if dataset:
-                dataset.increment_view()
-                self.session.commit()
-                logger.info(f"View count incremented for dataset {dataset_id}")
-                return True
-            logger.warning(f"Dataset {dataset_id} not found")
-            return False
-        except Exception as e:
-            logger.error(f"Error incrementing view count for dataset {dataset_id}: {e}")
-            self.session.rollback()
-            return False
+        return self._record_activity(dataset_id, "view")
 
     def increment_download_count(self, dataset_id: int) -> bool:
+        return self._record_activity(dataset_id, "download")
+
+    def _record_activity(self, dataset_id: int, activity_type: str) -> bool:
         try:
-            dataset = self.model.query.get(dataset_id)
-            if dataset:
-                dataset.increment_download()
-                self.session.commit()
-                logger.info(f"Download count incremented for dataset {dataset_id}")
-                return True
-            logger.warning(f"Dataset {dataset_id} not found")
-            return False
+            if not self.exists(dataset_id):
+                logger.warning(f"Dataset {dataset_id} not found")
+                return False
+            activity_counters.record(dataset_id, activity_type)
+            logger.info(f"{activity_type.capitalize()} count incremented for dataset {dataset_id}")
+            return True
         except Exception as e:
-            logger.error(f"Error incrementing download count for dataset {dataset_id}: {e}")
+            logger.error(f"Error incrementing {activity_type} count for dataset {dataset_id}: {e}")
             self.session.rollback()
             return False
 
-    def get_trending_datasets(self, period_days: int = 7, limit: int = 10) -> List[dict]:
-        try:
-            cutoff_date = datetime.now() - timedelta(days=period_days)
+    # Tiempo que se recuerdan los lotes aplicados; un reintento llega mucho antes
+    ACTIVITY_BATCH_RETENTION = timedelta(days=1)
 
-            # Subquery para descargas recientes
-            downloads_subquery = (
-                self.session.query(
-                    FoodDatasetActivity.dataset_id, func.count(FoodDatasetActivity.id).label("recent_downloads")
-                )
-                .filter(
-                    and_(FoodDatasetActivity.activity_type == "download", FoodDatasetActivity.timestamp >= cutoff_date)
-                )
-                .group_by(FoodDatasetActivity.dataset_id)
-                .subquery()
+    def apply_activity_batch(self, batch: Dict[int, Dict[str, List[datetime]]], batch_id: str = None) -> None:
+        """Aplica un lote de vistas/descargas acumuladas ``{dataset_id: {"view": [ts...], "download": [ts...]}}``.
+
+        Los contadores se suman de forma atómica en la base de datos (sin leer-modificar-escribir
+        en Python), el log de actividad se inserta en bloque y se actualizan los acumulados diarios,
+        todo en una sola transacción. Con ``batch_id`` el lote se apunta en esa misma transacción y
+        un reintento del mismo lote (p. ej. si el commit llegó pero se perdió la respuesta) no hace nada.
+        """
+        if batch_id is not None and self.session.get(FoodDatasetActivityBatch, batch_id) is not None:
+            logger.info(f"Activity batch {batch_id} already applied, skipping")
+            return
+
+        dataset_table = self.model.__table__
+        existing_ids = {
+            dataset_id
+            for (dataset_id,) in self.session.query(self.model.id).filter(self.model.id.in_(list(batch.keys())))
+        }
+
+        counter_updates = []
+        activity_rows = []
+        daily_totals = defaultdict(lambda: {"views": 0, "downloads": 0})
+        for dataset_id, events in batch.items():
+            if dataset_id not in existing_ids:
+                logger.warning(f"Dropping buffered activity for missing dataset {dataset_id}")
+                continue
+
+            views, downloads = events.get("view", []), events.get("download", [])
+            counter_updates.append(
+                {
+                    "b_id": dataset_id,
+                    "b_views": len(views),
+                    "b_downloads": len(downloads),
+                    "b_last_viewed_at": max(views) if views else None,
+                    "b_last_downloaded_at": max(downloads) if downloads else None,
+                }
             )
+            for activity_type, timestamps, key in (("view", views, "views"), ("download", downloads, "downloads")):
+                for timestamp in timestamps:
+                    activity_rows.append(
+                        {"dataset_id": dataset_id, "activity_type": activity_type, "timestamp": timestamp}
+                    )
+                    daily_totals[(dataset_id, timestamp.date())][key] += 1
 
-            # Subquery para vistas recientes
-            views_subquery = (
-                self.session.query(
-                    FoodDatasetActivity.dataset_id, func.count(FoodDatasetActivity.id).label("recent_views")
-                )
-                .filter(and_(FoodDatasetActivity.activity_type == "view", FoodDatasetActivity.timestamp >= cutoff_date))
-                .group_by(FoodDatasetActivity.dataset_id)
-                .subquery()
+        if not counter_updates:
+            return
+
+        try:
+            self.session.execute(
+                update(dataset_table)
+                .where(dataset_table.c.id == bindparam("b_id"))
+                .values(
+                    view_count=dataset_table.c.view_count + bindparam("b_views"),
+                    download_count=dataset_table.c.download_count + bindparam("b_downloads"),
+                    last_viewed_at=func.coalesce(bindparam("b_last_viewed_at"), dataset_table.c.last_viewed_at),
+                    last_downloaded_at=func.coalesce(
+                        bindparam("b_last_downloaded_at"), dataset_table.c.last_downloaded_at
+                    ),
+                ),
+                counter_updates,
             )
+            self.session.execute(insert(FoodDatasetActivity.__table__), activity_rows)
+            for (dataset_id, day), totals in daily_totals.items():
+                FoodDatasetActivityDaily.bump(dataset_id, day, **totals)
+            if batch_id is not None:
+                batch_table = FoodDatasetActivityBatch.__table__
+                self.session.execute(
+                    delete(batch_table).where(batch_table.c.applied_at < datetime.now() - self.ACTIVITY_BATCH_RETENTION)
+                )
+                self.session.execute(insert(batch_table).values(id=batch_id, applied_at=datetime.now()))
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def get_trending_datasets(self, period_days: int = 7, limit: int = 10) -> List[dict]:
+        try:
+            # Acumulados diarios: como mucho `period_days` filas por dataset
+            totals = FoodDatasetActivityDaily.period_totals_subquery(period_days)
+            recent_downloads_col = func.coalesce(totals.c.recent_downloads, 0)
+            recent_views_col = func.coalesce(totals.c.recent_views, 0)
 
             # Query principal
             trending_datasets = (
                 self.session.query(
                     self.model,
-                    func.coalesce(downloads_subquery.c.recent_downloads, 0).label("recent_downloads"),
-                    func.coalesce(views_subquery.c.recent_views, 0).label("recent_views"),
-                )
-                .outerjoin(downloads_subquery, self.model.id == downloads_subquery.c.dataset_id)
-                .outerjoin(views_subquery, self.model.id == views_subquery.c.dataset_id)
-                .order_by(
-                    desc(
-                        func.coalesce(downloads_subquery.c.recent_downloads, 0) * 2
-                        + func.coalesce(views_subquery.c.recent_views, 0)
-                    )
+                    recent_downloads_col.label("recent_downloads"),
+                    recent_views_col.label("recent_views"),
                 )
+                .options(*self.model.trending_load_options())
+                .outerjoin(totals, self.model.id == totals.c.dataset_id)
+                .order_by(desc(recent_downloads_col * 2 + recent_views_col))
                 .limit(limit)
                 .all()
             )
 
-            # Procesar resultados
+            # Procesar resultados (serialización en bloque: consultas constantes)
+            trending_dicts = {
+                trending_dict["id"]: trending_dict
+                for trending_dict in self.model.to_trending_dicts([row[0] for row in trending_datasets])
+            }
+
             result = []
             for dataset, recent_downloads, recent_views in trending_datasets:
-                trending_dict = dataset.to_trending_dict()
+                trending_dict = trending_dicts.get(dataset.id)
+                if trending_dict is None:
+                    continue
+                recent_downloads, recent_views = int(recent_downloads), int(recent_views)
 
                 # Añadir estadísticas recientes específicas del período
                 if period_days == 7:
@@ -172,12 +264,13 @@ class FoodDatasetRepository(BaseDatasetRepository):
     def get_most_viewed_datasets(self, limit: int = 10) -> List[dict]:
         try:
             datasets = (
-                self.model.query.filter(self.model.view_count > 0)
+                self.model.query.options(*self.model.trending_load_options())
+                .filter(self.model.view_count > 0)
                 .order_by(desc(self.model.view_count))
                 .limit(limit)
                 .all()
             )
-            return [dataset.to_trending_dict() for dataset in datasets]
+            return self.model.to_trending_dicts(datasets)
         except Exception as e:
             logger.error(f"Error getting most viewed datasets: {e}")
             return []
@@ -185,12 +278,13 @@ class FoodDatasetRepository(BaseDatasetRepository):
     def get_most_downloaded_datasets(self, limit: int = 10) -> List[dict]:
         try:
             datasets = (
-                self.model.query.filter(self.model.download_count > 0)
+                self.model.query.options(*self.model.trending_load_options())
+                .filter(self.model.download_count > 0)
                 .order_by(desc(self.model.download_count))
                 .limit(limit)
                 .all()
             )
-            return [dataset.to_trending_dict() for dataset in datasets]
+            return self.model.to_trending_dicts(datasets)
         except Exception as e:
             logger.error(f"Error getting most downloaded datasets: {e}")
             return []
@@ -204,3 +298,26 @@ class FoodDatasetRepository(BaseDatasetRepository):
         except Exception as e:
             logger.error(f"Error getting dataset stats for {dataset_id}: {e}")
             return None
+
+    def rebuild_daily_rollups(self) -> int:
+        """Reconstruye ``food_dataset_activity_daily`` a partir del log completo de actividad."""
+        day = func.date(FoodDatasetActivity.timestamp)
+        aggregated = select(
+            FoodDatasetActivity.dataset_id,
+            day.label("day"),
+            func.sum(case((FoodDatasetActivity.activity_type == "view", 1), else_=0)).label("views"),
+            func.sum(case((FoodDatasetActivity.activity_type == "download", 1), else_=0)).label("downloads"),
+        ).group_by(FoodDatasetActivity.dataset_id, day)
+
+        try:
+            self.session.execute(delete(FoodDatasetActivityDaily))
+            result = self.session.execute(
+                insert(FoodDatasetActivityDaily).from_select(["dataset_id", "day", "views", "downloads"], aggregated)
+            )
+            self.session.commit()
+            logger.info(f"Rebuilt {result.rowcount} daily activity rollups")
+            return result.rowcount
+        except Exception as e:
+            logger.error(f"Error rebuilding daily activity rollups: {e}")
+            self.session.rollback()
+            raise
@@ -5,24 +5,26 @@ import shutil
 import tempfile
 import urllib.error
 import urllib.request
-from zipfile import ZipFile
 
 from flask import Blueprint, jsonify, render_template, request, send_from_directory, url_for
 from flask_login import current_user, login_required
 
+from app.modules.basedataset.archive_cache import archive_cache
 from app.modules.basedataset.repositories import BaseDOIMappingRepository
 from app.modules.basedataset.services import BaseDSMetaDataService
 from app.modules.fakenodo.services import FakenodoService
+from app.modules.fooddataset.chunked_upload import UploadSessionError, chunked_uploads
 from app.modules.fooddataset.forms import AuthorForm, FoodDatasetForm, FoodModelForm
 from app.modules.fooddataset.services import FoodDatasetService
-from core.services.SearchService import SearchService
+from app.modules.fooddataset.zip_import import ZipImportError, extract_zip
+from app.modules.hubfile.blobs import link_or_copy
+from app.modules.hubfile.checksums import copy_with_checksum, file_checksum, remember_checksum, remove_with_checksum
 
 logger = logging.getLogger(__name__)
 
 fooddataset_bp = Blueprint("fooddataset", __name__, template_folder="templates", static_folder="assets")
 
 food_service = FoodDatasetService()
-search_service = SearchService()
 base_doi_mapping_repository = BaseDOIMappingRepository()
 dsmetadata_service = BaseDSMetaDataService()
 
@@ -48,11 +50,6 @@ def create_dataset():
             dataset = food_service.create_from_form(form=form, current_user=current_user)
             logger.info(f"Created dataset: {dataset.id}")
 
-            try:
-                search_service.index_dataset(dataset)
-            except Exception as e:
-                logger.error(f"Failed to index dataset in Elasticsearch: {e}")
-
         except Exception as exc:
             logger.exception(f"Exception creating local dataset: {exc}")
             return jsonify({"message": str(exc)}), 400
@@ -151,7 +148,9 @@ def upload_draft_dataset(dataset_id):
                     i += 1
                 dest_file = os.path.join(temp_folder, f"{base_name} ({i}){ext}")
 
-            shutil.copy(src_file, dest_file)
+            # Un enlace en vez de una copia; el checksum guardado sigue valiendo
+            link_or_copy(src_file, dest_file)
+            remember_checksum(dest_file, file.checksum)
 
     result, errors = food_service.edit_doi_dataset(dataset, form)
     fakenodo_service = FakenodoService()
@@ -167,7 +166,12 @@ def upload_draft_dataset(dataset_id):
         if not os.path.exists(dst):
             if not os.path.exists(src):
                 raise FileNotFoundError(f"Missing file for upload: {food_filename}")
-            shutil.copy(src, dst)
+            link_or_copy(src, dst)
+        # Ya está en el dataset: la copia temporal y su checksum sobran
+        remove_with_checksum(src)
+
+    # Los ficheros del dataset se han vuelto a copiar: sus zips en caché ya no valen
+    archive_cache.invalidate(dataset.id)
 
     data = {}
     try:
@@ -234,7 +238,7 @@ def edit_doi_dataset(dataset_id):
                         i += 1
                     dest_file = os.path.join(temp_folder, f"{base_name} ({i}){ext}")
 
-                shutil.copy(src_file, dest_file)
+                link_or_copy(src_file, dest_file)
 
         form.title.data = dataset.ds_meta_data.title
         form.desc.data = dataset.ds_meta_data.description
@@ -306,7 +310,8 @@ def upload_file_temp():
         new_filename = file.filename
 
     try:
-        file.save(file_path)
+        # Se hashea mientras se escribe: al crear el dataset no hay que volver a leerlo
+        copy_with_checksum(file.stream, file_path)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
@@ -325,12 +330,66 @@ def delete_file_temp():
     filepath = os.path.join(temp_folder, filename)
 
     if os.path.exists(filepath):
-        os.remove(filepath)
+        remove_with_checksum(filepath)
         return jsonify({"message": "File deleted successfully"})
 
     return jsonify({"error": "File not found"})
 
 
+@fooddataset_bp.errorhandler(UploadSessionError)
+def upload_session_error(error):
+    return jsonify({"message": str(error), **error.details}), error.status
+
+
+@fooddataset_bp.route("/dataset/file/upload/chunked", methods=["POST"])
+@login_required
+def create_chunked_upload():
+    """Abre una subida por trozos: ``{"filename", "size"}`` -> ``upload_id``, ``chunk_size`` y ``total_chunks``."""
+    data = request.get_json(silent=True) or {}
+    return jsonify(chunked_uploads.create(current_user.id, data.get("filename"), data.get("size"))), 201
+
+
+@fooddataset_bp.route("/dataset/file/upload/chunked/<upload_id>", methods=["GET"])
+@login_required
+def chunked_upload_status(upload_id):
+    """Trozos ya recibidos, para reanudar tras una desconexión."""
+    return jsonify(chunked_uploads.status(current_user.id, upload_id))
+
+
+@fooddataset_bp.route("/dataset/file/upload/chunked/<upload_id>/<int:index>", methods=["PUT"])
+@login_required
+def upload_chunk(upload_id, index):
+    """Cuerpo en bruto del trozo ``index`` con su checksum en ``X-Chunk-Checksum``."""
+    status = chunked_uploads.write_chunk(
+        current_user.id, upload_id, index, request.stream, request.headers.get("X-Chunk-Checksum")
+    )
+    return jsonify(status)
+
+
+@fooddataset_bp.route("/dataset/file/upload/chunked/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Mueve el fichero a la carpeta temporal (o extrae el ZIP) y responde como la subida normal."""
+    temp_folder = current_user.temp_folder()
+    path = chunked_uploads.complete(current_user.id, upload_id, temp_folder)
+
+    if not path.lower().endswith(".zip"):
+        remember_checksum(path, file_checksum(path)[0])
+        return jsonify({"message": "File uploaded successfully", "filename": os.path.basename(path)}), 200
+
+    try:
+        return import_zip(path, temp_folder)
+    finally:
+        os.remove(path)
+
+
+@fooddataset_bp.route("/dataset/file/upload/chunked/<upload_id>", methods=["DELETE"])
+@login_required
+def abort_chunked_upload(upload_id):
+    chunked_uploads.abort(current_user.id, upload_id)
+    return jsonify({"message": "Upload aborted"})
+
+
 @fooddataset_bp.route("/dataset/trending", methods=["GET"])
 def trending_datasets():
     try:
@@ -421,7 +480,8 @@ def upload():
         new_filename = file.filename
 
     try:
-        file.save(file_path)
+        # Se hashea mientras se escribe: al crear el dataset no hay que volver a leerlo
+        copy_with_checksum(file.stream, file_path)
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
@@ -436,6 +496,23 @@ def upload():
     )
 
 
+def import_zip(
+    zip_path, temp_folder, message="ZIP extracted successfully", empty_message="No files extracted from the ZIP"
+):
+    """Extrae ``zip_path`` en ``temp_folder`` y responde con los nombres guardados y los .food descartados."""
+    try:
+        extraction = extract_zip(zip_path, temp_folder)
+    except ZipImportError as e:
+        return jsonify({"message": str(e)}), e.status
+    except Exception as e:
+        logger.exception("Error extracting zip file: %s", e)
+        return jsonify({"message": str(e)}), 500
+
+    if not extraction.files:
+        return jsonify({"message": empty_message, "rejected": extraction.rejected}), 400
+    return jsonify({"message": message, "filenames": extraction.filenames, "rejected": extraction.rejected}), 200
+
+
 @fooddataset_bp.route("/dataset/file/upload_zip", methods=["POST"])
 @login_required
 def upload_zip():
@@ -456,37 +533,9 @@ def upload_zip():
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
     try:
         file.save(tmp.name)
-
-        saved_files = []
-        with ZipFile(tmp.name, "r") as z:
-            for member in z.namelist():
-                if member.endswith("/"):
-                    continue
-
-                member_basename = os.path.basename(member)
-                if not member_basename:
-                    continue
-
-                dest_path = os.path.join(temp_folder, member_basename)
-
-                base_name, extension = os.path.splitext(member_basename)
-                i = 1
-                while os.path.exists(dest_path):
-                    dest_path = os.path.join(temp_folder, f"{base_name} ({i}){extension}")
-                    i += 1
-
-                # Extract member to the destination
-                with z.open(member) as src, open(dest_path, "wb") as dst:
-                    shutil.copyfileobj(src, dst)
-
-                saved_files.append(os.path.basename(dest_path))
-
-        if not saved_files:
-            return jsonify({"message": "No files extracted from the ZIP"}), 400
-
-        return jsonify({"message": "ZIP extracted successfully", "filenames": saved_files}), 200
+        return import_zip(tmp.name, temp_folder)
     except Exception as e:
-        logger.exception("Error extracting zip file: %s", e)
+        logger.exception("Error saving zip file: %s", e)
         return jsonify({"message": str(e)}), 500
     finally:
         try:
@@ -532,32 +581,12 @@ def upload_github():
             with open(tmp.name, "wb") as out:
                 shutil.copyfileobj(resp, out)
 
-        # extract files as in upload_zip
-        saved_files = []
-        with ZipFile(tmp.name, "r") as z:
-            for member in z.namelist():
-                if member.endswith("/"):
-                    continue
-                member_basename = os.path.basename(member)
-                if not member_basename:
-                    continue
-
-                dest_path = os.path.join(temp_folder, member_basename)
-                base_name, extension = os.path.splitext(member_basename)
-                i = 1
-                while os.path.exists(dest_path):
-                    dest_path = os.path.join(temp_folder, f"{base_name} ({i}){extension}")
-                    i += 1
-
-                with z.open(member) as src, open(dest_path, "wb") as dst:
-                    shutil.copyfileobj(src, dst)
-
-                saved_files.append(os.path.basename(dest_path))
-
-        if not saved_files:
-            return jsonify({"message": "No files extracted from the GitHub ZIP"}), 400
-
-        return jsonify({"message": "GitHub repo extracted successfully", "filenames": saved_files}), 200
+        return import_zip(
+            tmp.name,
+            temp_folder,
+            message="GitHub repo extracted successfully",
+            empty_message="No files extracted from the GitHub ZIP",
+        )
     except urllib.error.HTTPError as he:
         logger.exception("HTTPError downloading GitHub zip: %s", he)
         if he.code == 404:
@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from app.modules.auth.models import User
 from app.modules.basedataset.models import BaseAuthor, BasePublicationType
 from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData, FoodNutritionalValue
+from app.modules.fooddataset.repositories import FoodDatasetRepository
 from app.modules.foodmodel.models import FoodMetaData, FoodModel
 from app.modules.hubfile.models import Hubfile
 from core.seeders.BaseSeeder import BaseSeeder
@@ -34,6 +35,7 @@ class FooddatasetSeeder(BaseSeeder):
         food_files = [f for f in os.listdir(src_folder) if f.endswith(".food")]
 
         datasets_to_create = 4
+        repository = FoodDatasetRepository()
         seeded_datasets = []
         seeded_ds_meta_data = []
 
@@ -74,6 +76,8 @@ class FooddatasetSeeder(BaseSeeder):
                 user_id=user.id, ds_meta_data_id=ds_meta_data.id, created_at=datetime.now(timezone.utc)
             )
             dataset = self.seed([dataset])[0]
+            repository.sync_tags(dataset)
+            repository.session.commit()
             seeded_datasets.append(dataset)
 
         # 2. Assign Food Models (.food files) to Datasets
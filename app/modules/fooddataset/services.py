@@ -1,12 +1,9 @@
-import hashlib
-import io
 import logging
 import os
 import shutil
-import zipfile
+import tempfile
 from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
-from zipfile import ZipFile
 
 import requests
 from sqlalchemy import func
@@ -16,19 +13,20 @@ from app.modules.basedataset.repositories import BaseAuthorRepository
 from app.modules.basedataset.services import BaseDatasetService
 from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
 from app.modules.fooddataset.repositories import FoodDatasetRepository
+from app.modules.fooddataset.zip_import import extract_zip
 from app.modules.foodmodel.models import FoodMetaData, FoodModel
 from app.modules.foodmodel.repositories import FoodModelRepository
+from app.modules.hubfile.blobs import blob_store
+from app.modules.hubfile.checksums import file_checksum, file_checksums, forget_checksum, remove_with_checksum
 from app.modules.hubfile.repositories import HubfileRepository
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content).hexdigest()
-        return hash_md5, file_size
+    return file_checksum(file_path)
 
 
 class FoodDatasetService(BaseDatasetService):
@@ -61,28 +59,38 @@ class FoodDatasetService(BaseDatasetService):
         domain = os.getenv("DOMAIN", "localhost")
         return f"http://{domain}/doi/{dataset.ds_meta_data.dataset_doi}"
 
-    def create_from_form(self, form, current_user) -> FoodDataset:
-
+    def _create_dataset_shell(self, form, current_user) -> FoodDataset:
+        """Crea metadatos, autores y el dataset todavía sin modelos, sin hacer commit."""
         main_author = {
             "name": f"{current_user.profile.surname}, {current_user.profile.name}",
             "affiliation": current_user.profile.affiliation,
             "orcid": current_user.profile.orcid,
         }
 
-        try:
-            logger.info(f"Creating FoodDSMetaData...: {form.get_dsmetadata()}")
-            print(form.dataset_doi.data)
-            dsmetadata = FoodDSMetaData(**form.get_dsmetadata())
+        logger.info(f"Creating FoodDSMetaData...: {form.get_dsmetadata()}")
+        dsmetadata = FoodDSMetaData(**form.get_dsmetadata())
 
-            self.dsmetadata_repository.session.add(dsmetadata)
-            self.dsmetadata_repository.session.flush()
+        self.dsmetadata_repository.session.add(dsmetadata)
+        self.dsmetadata_repository.session.flush()
 
-            for author_data in [main_author] + form.get_authors():
-                self.author_repository.create(commit=False, food_ds_meta_data_id=dsmetadata.id, **author_data)
+        for author_data in [main_author] + form.get_authors():
+            self.author_repository.create(commit=False, food_ds_meta_data_id=dsmetadata.id, **author_data)
+
+        dataset = self.create(commit=False, user_id=current_user.id)
+
+        dataset.ds_meta_data = dsmetadata
+        self.repository.sync_tags(dataset)
+        return dataset
 
-            dataset = self.create(commit=False, user_id=current_user.id)
+    def create_from_form(self, form, current_user) -> FoodDataset:
+        try:
+            dataset = self._create_dataset_shell(form, current_user)
 
-            dataset.ds_meta_data = dsmetadata
+            # Los ficheros se hashean en paralelo antes de crear los modelos
+            checksums = file_checksums(
+                os.path.join(current_user.temp_folder(), food_model_form.filename.data)
+                for food_model_form in form.food_models
+            )
 
             for food_model_form in form.food_models:
                 filename = food_model_form.filename.data
@@ -96,8 +104,7 @@ class FoodDatasetService(BaseDatasetService):
 
                 food_model = FoodModel(dataset=dataset, food_meta_data_id=food_metadata.id)
 
-                file_path = os.path.join(current_user.temp_folder(), filename)
-                checksum, size = calculate_checksum_and_size(file_path)
+                checksum, size = checksums[os.path.join(current_user.temp_folder(), filename)]
 
                 hubfile = self.hubfile_repository.create(
                     commit=False, name=filename, checksum=checksum, size=size, food_model=food_model
@@ -129,8 +136,16 @@ class FoodDatasetService(BaseDatasetService):
         for food_model in dataset.files:
             for file in food_model.files:
                 src_file = os.path.join(source_dir, file.name)
-                if os.path.exists(src_file):
+                if not os.path.exists(src_file):
+                    continue
+                if blob_store.enabled:
+                    # Un contenido ya guardado no se vuelve a escribir: el dataset solo lo enlaza
+                    blob_store.place(src_file, file.checksum, file.size, os.path.join(dest_dir, file.name))
+                    remove_with_checksum(src_file)
+                else:
                     shutil.move(src_file, dest_dir)
+                    # El checksum apuntado no viaja con el fichero: acabaría dentro del zip del dataset
+                    forget_checksum(src_file)
 
     def edit_doi_dataset(self, dataset, form):
         current_user = AuthenticationService().get_authenticated_user()
@@ -184,6 +199,7 @@ class FoodDatasetService(BaseDatasetService):
                 new_files.append(file)
 
             updated_instance = self.update_dsmetadata(dsmetadata.id, **form.get_dsmetadata())
+            self.repository.sync_tags(dataset)
 
             self.repository.session.commit()
 
@@ -243,6 +259,10 @@ class FoodDatasetService(BaseDatasetService):
         logger.info(f"Getting stats for dataset {dataset_id}")
         return self.repository.get_dataset_stats(dataset_id)
 
+    def rebuild_daily_rollups(self) -> int:
+        logger.info("Rebuilding daily activity rollups from the activity log")
+        return self.repository.rebuild_daily_rollups()
+
     def register_dataset_view(self, dataset_id: int) -> bool:
         return self.increment_view_count(dataset_id)
 
@@ -331,6 +351,8 @@ class FoodDatasetService(BaseDatasetService):
 
             self.repository.session.commit()
 
+            self._move_dataset_files(dataset, current_user)
+
         except Exception as exc:
             logger.exception(f"Exception creating dataset from ZIP...: {exc}")
             self.repository.session.rollback()
@@ -338,45 +360,25 @@ class FoodDatasetService(BaseDatasetService):
         return dataset
 
     def _process_zip_file(self, dataset, zip_file_obj, current_user):
-        temp_folder = current_user.temp_folder()
-        os.makedirs(temp_folder, exist_ok=True)
-
+        """Extrae los .food del ZIP en la carpeta temporal y crea un modelo con su fichero por cada uno."""
         zip_file_obj.seek(0)
-        if not zipfile.is_zipfile(zip_file_obj):
-            raise ValueError("File is not a valid ZIP archive.")
-
-        files_count = 0
-        with ZipFile(zip_file_obj, "r") as zip_ref:
-            for file_path in zip_ref.namelist():
-                # accept only .food files inside ZIP
-                if (file_path.endswith(".food")) and not file_path.startswith("__MACOSX"):
-                    filename = os.path.basename(file_path)
-                    if not filename:
-                        continue
-
-                    try:
-                        file_content = zip_ref.read(file_path)
-                        temp_file_path = os.path.join(temp_folder, filename)
-
-                        with open(temp_file_path, "wb") as f:
-                            f.write(file_content)
-
-                        fmmetadata = self.fmmetadata_repository.create(commit=False, uvl_filename=filename)
-                        fm = self.feature_model_repository.create(
-                            commit=False, data_set_id=dataset.id, fm_meta_data_id=fmmetadata.id
-                        )
-
-                        checksum, size = calculate_checksum_and_size(temp_file_path)
-                        hubfile = self.hubfilerepository.create(
-                            commit=False, name=filename, checksum=checksum, size=size, feature_model_id=fm.id
-                        )
-                        fm.files.append(hubfile)
-
-                        files_count += 1
-                    except Exception as e:
-                        logger.warning(f"Failed to process file '{filename}' from ZIP: {e}")
-
-        if files_count == 0:
+        extraction = extract_zip(zip_file_obj, current_user.temp_folder(), extensions=(".food",))
+
+        for file in extraction.files:
+            filename = file["filename"]
+
+            food_metadata = FoodMetaData(food_filename=filename, title=os.path.splitext(filename)[0], description="")
+            self.repository.session.add(food_metadata)
+            self.repository.session.flush()
+
+            food_model = self.food_model_repository.create(
+                commit=False, data_set_id=dataset.id, food_meta_data_id=food_metadata.id
+            )
+            self.hubfile_repository.create(
+                commit=False, name=filename, checksum=file["checksum"], size=file["size"], food_model_id=food_model.id
+            )
+
+        if not extraction.files:
             logger.warning(f"No .food files found in the provided ZIP archive for dataset {dataset.id}.")
 
     def create_from_github(self, form, current_user) -> FoodDataset:
@@ -410,14 +412,20 @@ class FoodDatasetService(BaseDatasetService):
             logger.info(f"Downloading repo from {zip_url}")
 
             response = requests.get(zip_url, stream=True)
-            response.raise_for_status()
-
-            zip_in_memory = io.BytesIO(response.content)
-
-            self._process_zip_file(dataset, zip_in_memory, current_user)
+            try:
+                response.raise_for_status()
+                # El ZIP se baja a disco por bloques: un repositorio grande no pasa entero por memoria
+                with tempfile.TemporaryFile(suffix=".zip") as zip_file:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        zip_file.write(chunk)
+                    self._process_zip_file(dataset, zip_file, current_user)
+            finally:
+                response.close()
 
             self.repository.session.commit()
 
+            self._move_dataset_files(dataset, current_user)
+
         except requests.RequestException as e:
             logger.exception(f"Exception downloading from GitHub: {e}")
             self.repository.session.rollback()
@@ -194,6 +194,7 @@ def test_create_dataset_from_zip(tmp_path, mock_user):
         "publication_type": "MANUAL",
     }
     form.get_authors.return_value = []
+    mock_user.temp_folder.return_value = str(tmp_path)
 
     # Inicializamos el servicio con repositorios fake
     service = FoodDatasetService()
@@ -201,16 +202,18 @@ def test_create_dataset_from_zip(tmp_path, mock_user):
     service.dsmetadata_repository.create = MagicMock(return_value=SimpleNamespace(id=1, authors=[]))
     service.create = MagicMock(return_value=SimpleNamespace(id=1, feature_models=[]))
 
-    service.fmmetadata_repository = FakeRepo()
-    service.feature_model_repository = FakeRepo()
-    service.hubfilerepository = FakeHubFileRepo()
+    service.food_model_repository = FakeRepo()
+    service.hubfile_repository = FakeHubFileRepo()
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
-    # Stub the private helper used by the real service implementation to avoid
-    # AttributeError in the test environment and focus on ZIP processing.
+    # Stub the private helper used by the real service implementation to focus on ZIP processing.
     service._create_dataset_shell = MagicMock(return_value=SimpleNamespace(id=1, feature_models=[]))
 
     dataset = service.create_from_zip(form, mock_user)
     assert dataset is not None
+    assert sorted(hubfile.name for hubfile in service.hubfile_repository.created) == ["fm1.food", "fm2.food"]
+    service._move_dataset_files.assert_called_once_with(dataset, mock_user)
 
 
 def test_upload_github_no_food_files(test_client, mock_user, monkeypatch, tmp_path):
@@ -376,7 +379,7 @@ def test_publish_dataset_success_safe(test_client, mock_user, mock_dataset, monk
         patch("app.modules.fooddataset.routes.dsmetadata_service"),
         patch("app.modules.fooddataset.routes.os.makedirs"),
         patch("app.modules.fooddataset.routes.os.path.exists", side_effect=safe_exists),
-        patch("app.modules.fooddataset.routes.shutil.copy"),
+        patch("app.modules.fooddataset.routes.link_or_copy"),
         patch("app.modules.fooddataset.routes.os.getenv", return_value="/tmp"),
     ):
         mock_service.get_or_404.return_value = mock_dataset
@@ -428,7 +431,7 @@ def test_publish_dataset_fakenodo_upload_error_safe(test_client, mock_user, mock
         patch("app.modules.fooddataset.routes.food_service") as mock_service,
         patch("app.modules.fooddataset.routes.FakenodoService") as MockFakenodo,
         patch("app.modules.fooddataset.routes.os.path.exists", side_effect=exists),
-        patch("app.modules.fooddataset.routes.shutil.copy"),
+        patch("app.modules.fooddataset.routes.link_or_copy"),
         patch("app.modules.fooddataset.routes.os.makedirs"),
     ):
         mock_service.get_or_404.return_value = mock_dataset
@@ -468,7 +471,7 @@ def test_edit_doi_dataset_get_loads_form_data(test_client, mock_user, mock_datas
         patch("app.modules.fooddataset.routes.FoodModelForm"),
         patch("os.makedirs"),
         patch("os.path.exists", return_value=False),
-        patch("shutil.copy"),
+        patch("app.modules.fooddataset.routes.link_or_copy"),
         patch("app.modules.fooddataset.routes.render_template"),
         patch("os.getenv", return_value="/work"),
     ):
@@ -506,7 +509,7 @@ def test_edit_doi_dataset_get_handles_duplicate_filenames(test_client, mock_user
         patch("app.modules.fooddataset.routes.FoodModelForm"),
         patch("os.makedirs"),
         patch("os.path.exists", side_effect=mock_exists),
-        patch("shutil.copy") as mock_copy,
+        patch("app.modules.fooddataset.routes.link_or_copy") as mock_copy,
         patch("app.modules.fooddataset.routes.render_template"),
         patch("os.getenv", return_value="/work"),
     ):
@@ -1,22 +1,31 @@
 import io
 import logging
 import zipfile
+from datetime import datetime, timedelta
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
 import requests
+from sqlalchemy import event
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.basedataset.models import BaseAuthor, BasePublicationType
+from app.modules.fooddataset import events
+from app.modules.fooddataset.counters import ActivityCounterBuffer
 from app.modules.fooddataset.models import (
     FoodDataset,
     FoodDatasetActivity,
+    FoodDatasetActivityDaily,
     FoodDSMetaData,
     FoodNutritionalValue,
+    SearchIndexOutbox,
+    fold_search_text,
 )
+from app.modules.fooddataset.outbox import SearchOutboxWorker
 from app.modules.fooddataset.services import FoodDatasetService
+from core.services.SearchService import SearchService
 
 pytestmark = pytest.mark.unit
 
@@ -187,6 +196,41 @@ def test_to_trending_dict(test_client):
         assert "main_author" in data
 
 
+def test_to_trending_dicts_uses_constant_queries(test_client):
+    with test_client.application.app_context():
+        user = User.query.first()
+        for i in range(3):
+            ds_meta = FoodDSMetaData(
+                title=f"Bulk DS {i}", description="desc", publication_type=BasePublicationType.OTHER
+            )
+            ds_meta.authors.append(BaseAuthor(name=f"Bulk Author {i}"))
+            db.session.add(FoodDataset(user_id=user.id, ds_meta_data=ds_meta))
+        db.session.commit()
+
+        def count_queries(datasets):
+            statements = []
+
+            def before_cursor_execute(*args, **kwargs):
+                statements.append(args[2])
+
+            event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+            try:
+                result = FoodDataset.to_trending_dicts(datasets)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+            return result, len(statements)
+
+        db.session.expunge_all()
+        one, one_queries = count_queries(FoodDataset.query.limit(1).all())
+        db.session.expunge_all()
+        many, many_queries = count_queries(FoodDataset.query.all())
+
+        assert len(one) == 1
+        assert len(many) > 1
+        assert many_queries == one_queries
+        assert all(d["main_author"] is not None for d in many if d["title"].startswith("Bulk DS"))
+
+
 def test_get_trending(test_client):
     with test_client.application.app_context():
         trending = FoodDataset.get_trending(limit=5)
@@ -207,6 +251,343 @@ def test_activity_log_creation(test_client):
         assert logs[0].dataset_id == dataset.id
 
 
+def test_increment_updates_daily_rollup(test_client):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        today = datetime.now().date()
+
+        before = db.session.get(FoodDatasetActivityDaily, (dataset.id, today))
+        views_before = before.views if before else 0
+        downloads_before = before.downloads if before else 0
+
+        dataset.increment_view()
+        dataset.increment_download()
+        db.session.expire_all()
+
+        rollup = db.session.get(FoodDatasetActivityDaily, (dataset.id, today))
+        assert rollup.views == views_before + 1
+        assert rollup.downloads == downloads_before + 1
+
+
+def test_rebuild_daily_rollups_matches_activity_log(test_client):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        old_day = datetime.now() - timedelta(days=3)
+        db.session.add(FoodDatasetActivity(dataset_id=dataset.id, activity_type="view", timestamp=old_day))
+        db.session.commit()
+
+        FoodDatasetService().rebuild_daily_rollups()
+
+        rollups = FoodDatasetActivityDaily.query.filter_by(dataset_id=dataset.id).all()
+        assert (
+            sum(r.views for r in rollups)
+            == FoodDatasetActivity.query.filter_by(dataset_id=dataset.id, activity_type="view").count()
+        )
+        assert (
+            sum(r.downloads for r in rollups)
+            == FoodDatasetActivity.query.filter_by(dataset_id=dataset.id, activity_type="download").count()
+        )
+        assert any(r.day == old_day.date() for r in rollups)
+
+
+def test_trending_uses_daily_rollups(test_client):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        today = datetime.now().date()
+        rollup = db.session.get(FoodDatasetActivityDaily, (dataset.id, today))
+
+        trending = FoodDatasetService().repository.get_trending_datasets(period_days=7, limit=50)
+        entry = next(d for d in trending if d["id"] == dataset.id)
+
+        assert entry["recent_views_week"] >= rollup.views
+        assert entry["trending_score"] == entry["recent_downloads_week"] * 2 + entry["recent_views_week"]
+
+
+def test_activity_buffer_aggregates_until_flush():
+    batches = []
+    buffer = ActivityCounterBuffer(max_pending=1000)
+    buffer.writer = lambda batch, batch_id: batches.append(batch)
+    buffer._ensure_worker = lambda: None
+
+    buffer.record(1, "view")
+    buffer.record(1, "view")
+    buffer.record(1, "download")
+    buffer.record(2, "view")
+
+    assert batches == []
+    assert buffer.pending_count == 4
+    assert buffer.flush() == 4
+    assert len(batches[0][1]["view"]) == 2
+    assert len(batches[0][1]["download"]) == 1
+    assert len(batches[0][2]["view"]) == 1
+    assert buffer.pending_count == 0
+    assert buffer.flush() == 0
+
+    with pytest.raises(ValueError):
+        buffer.record(1, "like")
+
+
+def test_activity_buffer_requeues_failed_flush():
+    buffer = ActivityCounterBuffer(max_pending=1000)
+    buffer.writer = MagicMock(side_effect=Exception("DB down"))
+    buffer._ensure_worker = lambda: None
+
+    buffer.record(1, "view")
+    buffer.record(1, "download")
+
+    with pytest.raises(Exception, match="DB down"):
+        buffer.flush()
+    assert buffer.pending_count == 2
+    failed_id = buffer.writer.call_args[0][1]
+
+    # El lote fallido se reintenta tal cual y con el mismo id, antes que los eventos nuevos
+    buffer.record(2, "view")
+    buffer.writer = MagicMock()
+    assert buffer.flush() == 3
+    (batch, batch_id), (newer, newer_id) = [call.args for call in buffer.writer.call_args_list]
+    assert batch_id == failed_id and newer_id != failed_id
+    assert len(batch[1]["view"]) == 1 and len(batch[1]["download"]) == 1
+    assert list(newer) == [2]
+    assert buffer.pending_count == 0
+
+
+def test_activity_buffer_drops_events_beyond_max_buffered(caplog):
+    buffer = ActivityCounterBuffer(max_pending=1000, max_buffered=3)
+    buffer.writer = MagicMock(side_effect=Exception("DB down"))
+    buffer._ensure_worker = lambda: None
+
+    for _ in range(5):
+        buffer.record(1, "view")
+    assert buffer.pending_count == 3
+
+    caplog.set_level(logging.WARNING)
+    with pytest.raises(Exception, match="DB down"):
+        buffer.flush()
+    assert any("Dropped 2 activity events" in record.getMessage() for record in caplog.records)
+
+    # Con el buffer lleno por un lote fallido tampoco entra nada nuevo
+    buffer.record(1, "download")
+    assert buffer.pending_count == 3
+
+
+def test_apply_activity_batch_updates_counters_atomically(test_client):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        views, downloads = dataset.view_count, dataset.download_count
+        logged = FoodDatasetActivity.query.filter_by(dataset_id=dataset.id).count()
+        now = datetime.now()
+
+        FoodDatasetService().repository.apply_activity_batch(
+            {dataset.id: {"view": [now, now], "download": [now]}, 999999: {"view": [now], "download": []}}
+        )
+
+        db.session.refresh(dataset)
+        assert dataset.view_count == views + 2
+        assert dataset.download_count == downloads + 1
+        assert dataset.last_viewed_at is not None
+        assert FoodDatasetActivity.query.filter_by(dataset_id=dataset.id).count() == logged + 3
+
+        # Reintentar un lote ya confirmado no vuelve a sumarlo
+        repository = FoodDatasetService().repository
+        repository.apply_activity_batch({dataset.id: {"view": [now], "download": []}}, "batch-1")
+        repository.apply_activity_batch({dataset.id: {"view": [now], "download": []}}, "batch-1")
+        db.session.refresh(dataset)
+        assert dataset.view_count == views + 3
+        assert FoodDatasetActivity.query.filter_by(dataset_id=dataset.id).count() == logged + 4
+
+
+def test_increment_view_count_writes_through_in_sync_mode(test_client):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        views = dataset.view_count
+        repository = FoodDatasetService().repository
+
+        assert repository.increment_view_count(dataset.id) is True
+        assert repository.increment_view_count(999999) is False
+
+        db.session.refresh(dataset)
+        assert dataset.view_count == views + 1
+
+
+class FakeElasticsearch:
+    """Cliente local que imita la API ``_bulk`` de Elastic."""
+
+    def __init__(self, failing_ids=()):
+        self.documents = {}
+        self.failing_ids = set(failing_ids)
+        self.bulk_calls = 0
+
+    def bulk(self, operations):
+        self.bulk_calls += 1
+        items = []
+        pending = iter(operations)
+        for action in pending:
+            operation, meta = next(iter(action.items()))
+            document_id = meta["_id"]
+            if operation == "index":
+                document = next(pending)
+                if int(document_id) in self.failing_ids:
+                    items.append({operation: {"_id": document_id, "status": 503, "error": "unavailable"}})
+                    continue
+                self.documents[document_id] = document
+                items.append({operation: {"_id": document_id, "status": 200}})
+            else:
+                status = 200 if self.documents.pop(document_id, None) else 404
+                items.append({operation: {"_id": document_id, "status": status}})
+        return {"errors": False, "items": items}
+
+
+@pytest.fixture
+def search_events():
+    service = MagicMock()
+    service.enabled = True
+    events.register_events(service)
+
+    yield
+
+    for target, identifier, listener in events.LISTENERS:
+        if event.contains(target, identifier, listener):
+            event.remove(target, identifier, listener)
+    SearchIndexOutbox.query.delete()
+    db.session.commit()
+
+
+def outbox_rows(dataset_id):
+    return SearchIndexOutbox.query.filter_by(dataset_id=dataset_id).order_by(SearchIndexOutbox.id).all()
+
+
+def test_counter_updates_do_not_reindex(test_client, search_events):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+
+        dataset.increment_view()
+        dataset.increment_download()
+
+        assert outbox_rows(dataset.id) == []
+
+
+def test_metadata_update_enqueues_once_per_transaction(test_client, search_events):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+
+        dataset.ds_meta_data.description = "Even more delicious food data"
+        db.session.flush()
+        dataset.ds_meta_data.tags = "healthy, vegan"
+        db.session.commit()
+
+        assert [row.operation for row in outbox_rows(dataset.id)] == ["index"]
+
+
+def test_rolled_back_changes_are_not_enqueued(test_client, search_events):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+
+        dataset.ds_meta_data.description = "Discarded description"
+        db.session.flush()
+        db.session.rollback()
+
+        assert outbox_rows(dataset.id) == []
+
+
+def test_outbox_worker_syncs_through_bulk_api(test_client, search_events):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        dataset.ds_meta_data.description = "Synced description"
+        db.session.commit()
+        SearchIndexOutbox.enqueue(db.session.connection(), 999999, "delete")
+        db.session.commit()
+
+        es = FakeElasticsearch()
+        worker = SearchOutboxWorker(search_service=SearchService(es_client=es))
+
+        assert worker.drain() == 2
+        assert es.bulk_calls == 1
+        assert es.documents[str(dataset.id)]["description"] == "Synced description"
+        assert SearchIndexOutbox.query.count() == 0
+
+        # Volver a sincronizar lo mismo es idempotente
+        SearchIndexOutbox.enqueue(db.session.connection(), dataset.id, "index")
+        db.session.commit()
+        assert worker.drain() == 1
+        assert len(es.documents) == 1
+
+
+def test_outbox_worker_retries_failed_entries(test_client, search_events):
+    with test_client.application.app_context():
+        dataset = FoodDataset.query.join(FoodDSMetaData).filter(FoodDSMetaData.title == "Food Dataset 1").first()
+        SearchIndexOutbox.enqueue(db.session.connection(), dataset.id, "index")
+        db.session.commit()
+
+        es = FakeElasticsearch(failing_ids={dataset.id})
+        worker = SearchOutboxWorker(search_service=SearchService(es_client=es), retry_delay=0)
+
+        assert worker.drain_once() == 0
+        row = outbox_rows(dataset.id)[0]
+        assert row.attempts == 1
+        assert row.last_error == "unavailable"
+
+        es.failing_ids.clear()
+        assert worker.drain_once() == 1
+        assert outbox_rows(dataset.id) == []
+        assert str(dataset.id) in es.documents
+
+
+def test_iter_for_indexing_streams_all_datasets_in_chunks(test_client):
+    with test_client.application.app_context():
+        expected = [dataset_id for (dataset_id,) in db.session.query(FoodDataset.id).order_by(FoodDataset.id)]
+
+        streamed = [dataset.id for dataset in FoodDatasetService().repository.iter_for_indexing(chunk_size=2)]
+
+        assert streamed == expected
+
+
+def test_fold_search_text_matches_query_normalization():
+    assert fold_search_text("Crème Brûlée", None, "", "Año") == "creme brulee ano"
+
+
+def test_search_text_refreshed_on_metadata_and_author_changes(test_client):
+    with test_client.application.app_context():
+        ds_meta = FoodDSMetaData(
+            title="Paella Valenciana", description="Arroz", tags="España", publication_type=BasePublicationType.OTHER
+        )
+        ds_meta.authors.append(BaseAuthor(name="José Núñez"))
+        dataset = FoodDataset(user_id=User.query.first().id, ds_meta_data=ds_meta)
+        db.session.add(dataset)
+        db.session.commit()
+
+        db.session.refresh(ds_meta)
+        assert ds_meta.search_text == "paella valenciana arroz espana jose nunez"
+
+        ds_meta.title = "Fideuà"
+        ds_meta.authors.append(BaseAuthor(name="Zoë"))
+        db.session.commit()
+
+        db.session.refresh(ds_meta)
+        assert ds_meta.search_text == "fideua arroz espana jose nunez zoe"
+
+
+def test_sync_tags_keeps_dataset_tag_in_step_with_metadata(test_client):
+    from app.modules.fooddataset.models import Tag
+    from app.modules.fooddataset.repositories import FoodDatasetRepository
+
+    with test_client.application.app_context():
+        ds_meta = FoodDSMetaData(
+            title="Tag Sync", description="Tags", publication_type=BasePublicationType.OTHER, tags="Pan, Café, pan"
+        )
+        dataset = FoodDataset(user_id=User.query.first().id, ds_meta_data=ds_meta)
+        db.session.add(dataset)
+        repository = FoodDatasetRepository()
+        repository.sync_tags(dataset)
+        db.session.commit()
+        assert [tag.name for tag in dataset.normalized_tags] == ["pan", "cafe"]
+
+        ds_meta.tags = "cafe, te"
+        repository.sync_tags(dataset)
+        db.session.commit()
+        assert [tag.name for tag in dataset.normalized_tags] == ["cafe", "te"]
+        assert Tag.query.filter_by(name="cafe").count() == 1
+
+
 def test_service_get_doi(test_client):
 
     dataset = MagicMock()
@@ -226,7 +607,7 @@ def test_service_create_from_form(test_client):
     with (
         patch("app.modules.fooddataset.services.FoodDatasetRepository"),
         patch("app.modules.fooddataset.services.HubfileRepository"),
-        patch("app.modules.fooddataset.services.calculate_checksum_and_size") as mock_checksum,
+        patch("app.modules.fooddataset.services.file_checksums") as mock_checksums,
     ):
 
         service = FoodDatasetService()
@@ -260,7 +641,7 @@ def test_service_create_from_form(test_client):
         mock_food_form.get_authors.return_value = []
         mock_form.food_models = [mock_food_form]
 
-        mock_checksum.return_value = ("hash", 100)
+        mock_checksums.return_value = {"/tmp/test/test.food": ("hash", 100)}
 
         # Mock the internal move method to avoid complex setup of dataset.files on the mock
         service._move_dataset_files = MagicMock()
@@ -407,7 +788,7 @@ def test_route_file_upload(test_client):
 
         data = {"file": (BytesIO(b"content"), "test.food")}
 
-        with patch("werkzeug.datastructures.FileStorage.save") as mock_save:
+        with patch("app.modules.fooddataset.routes.copy_with_checksum") as mock_save:
             response = test_client.post("/dataset/file/upload", data=data, content_type="multipart/form-data")
             assert response.status_code == 200
             assert response.json["message"] == "File uploaded successfully"
@@ -533,18 +914,6 @@ class FakeRepo:
         return obj
 
 
-class FakeFeatureModelRepo:
-    def __init__(self):
-        self.created = []
-        self.counter = 1
-
-    def create(self, commit=False, data_set_id=None, fm_meta_data_id=None):
-        fm = SimpleNamespace(id=self.counter, files=[])
-        self.counter += 1
-        self.created.append(fm)
-        return fm
-
-
 class FakeHubFileRepo:
     def __init__(self):
         self.created = []
@@ -558,11 +927,11 @@ class FakeHubFileRepo:
 
 
 def test_process_zip_extracts_food_files_only(tmp_path):
-    """_process_zip_file extrae solo archivos .food y los registra en hubfilerepository"""
+    """_process_zip_file extrae solo archivos .food y los registra en hubfile_repository"""
     service = FoodDatasetService()
-    service.fmmetadata_repository = FakeRepo()
-    service.feature_model_repository = FakeFeatureModelRepo()
-    service.hubfilerepository = FakeHubFileRepo()
+    service.repository.session = MagicMock()
+    service.food_model_repository = FakeRepo()
+    service.hubfile_repository = FakeHubFileRepo()
 
     current_user = SimpleNamespace()
     temp_dir = tmp_path / "temp"
@@ -588,8 +957,8 @@ def test_process_zip_extracts_food_files_only(tmp_path):
     assert "model1.uvl" not in extracted
 
     # Hubfile repo tiene registro
-    assert len(service.hubfilerepository.created) == 1
-    created = service.hubfilerepository.created[0]
+    assert len(service.hubfile_repository.created) == 1
+    created = service.hubfile_repository.created[0]
     assert created.name == "model2.food"
 
 
@@ -605,13 +974,13 @@ def test_process_zip_invalid_raises(tmp_path):
 
 def test_process_zip_no_matching_files_logs_warning(tmp_path, caplog):
     service = FoodDatasetService()
-    service.fmmetadata_repository = FakeRepo()
-    service.feature_model_repository = FakeFeatureModelRepo()
-    service.hubfilerepository = FakeHubFileRepo()
+    service.food_model_repository = FakeRepo()
+    service.hubfile_repository = FakeHubFileRepo()
 
     current_user = SimpleNamespace()
     current_user.temp_folder = lambda: str(tmp_path)
 
+    service.repository.session = MagicMock()
     zipbuf = create_test_zip({"readme.md": "hello"})
 
     caplog.set_level(logging.WARNING)
@@ -620,6 +989,56 @@ def test_process_zip_no_matching_files_logs_warning(tmp_path, caplog):
     assert any("No .food files found" in rec.getMessage() for rec in caplog.records)
 
 
+def test_create_from_zip_imports_real_archive(test_client, tmp_path, monkeypatch):
+    """Importación completa de un ZIP real: modelos, ficheros y metadatos en la BD y ficheros en su carpeta."""
+    from app.modules.foodmodel.models import FoodModel
+    from app.modules.hubfile.checksums import file_checksum
+
+    temp_dir = tmp_path / "temp"
+    monkeypatch.setenv("WORKING_DIR", str(tmp_path))
+    zipbuf = create_test_zip(
+        {
+            "foods/apple.food": "name: Apple\ncalories: 52 kcal\n",
+            "foods/pear.food": "name: Pear\n",
+            "broken.food": "nutritional_values:\n  no colon here\n",
+            "README.md": "# Foods",
+        }
+    )
+    form = SimpleNamespace(
+        get_dsmetadata=lambda: {
+            "title": "Imported from ZIP",
+            "description": "Fruits",
+            "publication_type": BasePublicationType.NONE,
+        },
+        get_authors=lambda: [],
+        zip_file=SimpleNamespace(data=zipbuf),
+    )
+
+    with test_client.application.app_context():
+        user = User.query.filter_by(email="test_food@example.com").first()
+        current_user = SimpleNamespace(
+            id=user.id,
+            profile=SimpleNamespace(name="John", surname="Doe", affiliation="Kitchen", orcid=""),
+            temp_folder=lambda: str(temp_dir),
+        )
+
+        dataset = FoodDatasetService().create_from_zip(form, current_user)
+        db.session.expire_all()
+
+        models = FoodModel.query.filter_by(data_set_id=dataset.id).order_by(FoodModel.id).all()
+        assert [model.food_meta_data.title for model in models] == ["apple", "pear"]
+        assert [model.food_meta_data.food_filename for model in models] == ["apple.food", "pear.food"]
+        assert dataset.ds_meta_data.title == "Imported from ZIP"
+
+        dest_dir = tmp_path / "uploads" / f"user_{user.id}" / f"dataset_{dataset.id}"
+        for model in models:
+            (hubfile,) = model.files
+            assert (hubfile.checksum, hubfile.size) == file_checksum(str(dest_dir / hubfile.name))
+        assert sorted(p.name for p in dest_dir.iterdir()) == ["apple.food", "pear.food"]
+        # Ni los ficheros ni sus checksums apuntados se quedan en la carpeta temporal
+        assert list(temp_dir.iterdir()) == []
+
+
 def make_form(url: str):
     return SimpleNamespace(github_url=SimpleNamespace(data=url))
 
@@ -630,7 +1049,8 @@ def test_create_from_github_success(monkeypatch, tmp_path):
     fake_dataset = SimpleNamespace(id=99)
     service._create_dataset_shell = MagicMock(return_value=fake_dataset)
     service._process_zip_file = MagicMock()
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     # Simular requests.get: repo info and zip
     def fake_get(url, *args, **kwargs):
@@ -641,7 +1061,7 @@ def test_create_from_github_success(monkeypatch, tmp_path):
             return m
         elif url.endswith(".zip"):
             m = MagicMock()
-            m.content = b"PK\x03\x04fakezip"
+            m.iter_content.return_value = [b"PK\x03\x04fakezip"]
             m.raise_for_status = MagicMock()
             return m
         raise RuntimeError("Unexpected URL")
@@ -662,7 +1082,8 @@ def test_create_from_github_invalid_url_raises(tmp_path):
     service = FoodDatasetService()
     service._create_dataset_shell = MagicMock(return_value=SimpleNamespace(id=1))
     service._process_zip_file = MagicMock()
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     form = make_form("https://notgithub.com/user/repo")
     current_user = SimpleNamespace()
@@ -677,7 +1098,8 @@ def test_create_from_github_malformed_url_raises(tmp_path):
     service = FoodDatasetService()
     service._create_dataset_shell = MagicMock(return_value=SimpleNamespace(id=2))
     service._process_zip_file = MagicMock()
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     # github.com/user (no repo) -> invalid
     form = make_form("https://github.com/onlyuser")
@@ -695,11 +1117,11 @@ def test_create_from_github_no_food_files(monkeypatch, tmp_path, caplog):
     service._create_dataset_shell = MagicMock(return_value=fake_dataset)
 
     # use fake repos so that _process_zip_file can create objects without DB
-    service.fmmetadata_repository = FakeRepo()
-    service.feature_model_repository = FakeFeatureModelRepo()
-    service.hubfilerepository = FakeHubFileRepo()
+    service.food_model_repository = FakeRepo()
+    service.hubfile_repository = FakeHubFileRepo()
 
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     # create zip with no .food files
     zipbuf = create_test_zip({"README.md": "no food here"})
@@ -712,7 +1134,7 @@ def test_create_from_github_no_food_files(monkeypatch, tmp_path, caplog):
             return m
         elif url.endswith(".zip"):
             m = MagicMock()
-            m.content = zipbuf.getvalue()
+            m.iter_content.return_value = [zipbuf.getvalue()]
             m.raise_for_status = MagicMock()
             return m
         raise RuntimeError("Unexpected URL")
@@ -728,14 +1150,15 @@ def test_create_from_github_no_food_files(monkeypatch, tmp_path, caplog):
 
     assert result is fake_dataset
     # no hubfiles created
-    assert len(service.hubfilerepository.created) == 0
+    assert len(service.hubfile_repository.created) == 0
 
 
 def test_create_from_github_invalid_branch_raises(monkeypatch, tmp_path):
     """If zip download fails (invalid branch) raise ValueError"""
     service = FoodDatasetService()
     service._create_dataset_shell = MagicMock(return_value=SimpleNamespace(id=10))
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     def fake_get(url, *args, **kwargs):
         if url.startswith("https://api.github.com/"):
@@ -764,11 +1187,11 @@ def test_create_from_github_with_food_files(monkeypatch, tmp_path):
     fake_dataset = SimpleNamespace(id=300)
     service._create_dataset_shell = MagicMock(return_value=fake_dataset)
 
-    service.fmmetadata_repository = FakeRepo()
-    service.feature_model_repository = FakeFeatureModelRepo()
-    service.hubfilerepository = FakeHubFileRepo()
+    service.food_model_repository = FakeRepo()
+    service.hubfile_repository = FakeHubFileRepo()
 
-    service.repository.session = SimpleNamespace(commit=MagicMock(), rollback=MagicMock())
+    service.repository.session = MagicMock()
+    service._move_dataset_files = MagicMock()
 
     # zip with a .food file
     zipbuf = create_test_zip({"models/model.food": "food content"})
@@ -781,7 +1204,7 @@ def test_create_from_github_with_food_files(monkeypatch, tmp_path):
             return m
         elif url.endswith("main.zip") or url.endswith(".zip"):
             m = MagicMock()
-            m.content = zipbuf.getvalue()
+            m.iter_content.return_value = [zipbuf.getvalue()]
             m.raise_for_status = MagicMock()
             return m
         raise RuntimeError("Unexpected URL")
@@ -796,8 +1219,8 @@ def test_create_from_github_with_food_files(monkeypatch, tmp_path):
 
     assert result is fake_dataset
     # hubfile should have been created for model.food
-    assert len(service.hubfilerepository.created) == 1
-    assert service.hubfilerepository.created[0].name == "model.food"
+    assert len(service.hubfile_repository.created) == 1
+    assert service.hubfile_repository.created[0].name == "model.food"
 
 
 def test_upload_file_valid(test_client, mock_user, monkeypatch, tmp_path):
@@ -819,6 +1242,23 @@ def test_upload_file_valid(test_client, mock_user, monkeypatch, tmp_path):
     assert j["filename"] == "test.food"
 
 
+def test_delete_file_temp_removes_remembered_checksum(test_client, mock_user, monkeypatch, tmp_path):
+    """Borrar un fichero subido deja la carpeta temporal vacía, sin el checksum apuntado al subirlo."""
+    monkeypatch.setattr("app.modules.fooddataset.routes.current_user", mock_user, raising=False)
+    monkeypatch.setattr("flask_login.utils._get_user", lambda: mock_user, raising=False)
+
+    temp_dir = tmp_path / "temp_user_fixture"
+
+    data = {"file": (io.BytesIO(b"dummy content"), "test.food")}
+    assert test_client.post("/dataset/file/upload", data=data, content_type="multipart/form-data").status_code == 200
+    assert sorted(p.name for p in temp_dir.iterdir()) == [".test.food.checksum", "test.food"]
+
+    resp = test_client.post("/dataset/file/delete", json={"file": "test.food"})
+
+    assert resp.json["message"] == "File deleted successfully"
+    assert list(temp_dir.iterdir()) == []
+
+
 def test_upload_file_invalid_extension(test_client, mock_user, monkeypatch, tmp_path):
     """Upload a non-.food file should be rejected with 400"""
     monkeypatch.setattr("app.modules.fooddataset.routes.current_user", mock_user, raising=False)
@@ -1538,3 +1978,180 @@ def test_get_all_statistics_with_real_data(test_client):
         assert "total_dataset_downloads" in stats
         assert "total_dataset_views" in stats
         assert isinstance(stats, dict)
+
+
+# Chunked uploads
+@pytest.fixture
+def chunked_store(tmp_path, monkeypatch):
+    from app.modules.fooddataset.chunked_upload import chunked_uploads
+
+    monkeypatch.setattr(chunked_uploads, "folder", str(tmp_path / "chunked"))
+    monkeypatch.setattr(chunked_uploads, "chunk_size", 4)
+    with patch("app.modules.auth.models.User.temp_folder", return_value=str(tmp_path / "temp")):
+        yield chunked_uploads, tmp_path
+
+
+def put_chunk(test_client, upload_id, index, body, checksum=None):
+    import hashlib
+
+    checksum = checksum or f"sha256={hashlib.sha256(body).hexdigest()}"
+    return test_client.put(
+        f"/dataset/file/upload/chunked/{upload_id}/{index}", data=body, headers={"X-Chunk-Checksum": checksum}
+    )
+
+
+def test_chunked_upload_resumes_and_completes(test_client, chunked_store):
+    import zlib
+
+    from app.modules.conftest import login
+
+    store, tmp_path = chunked_store
+    login(test_client, "test_food@example.com", "test1234")
+    content = b"name: Big\n"
+
+    assert test_client.post("/dataset/file/upload/chunked", json={"filename": "big.txt", "size": 3}).status_code == 400
+    created = test_client.post("/dataset/file/upload/chunked", json={"filename": "big.food", "size": len(content)})
+    assert created.status_code == 201 and created.json["total_chunks"] == 3
+    upload_id = created.json["upload_id"]
+
+    assert put_chunk(test_client, upload_id, 0, content[0:4]).status_code == 200
+    assert put_chunk(test_client, upload_id, 2, content[8:]).status_code == 200
+    assert put_chunk(test_client, upload_id, 1, b"oops", checksum="sha256=00").status_code == 422
+    assert put_chunk(test_client, upload_id, 1, content[4:7]).status_code == 400
+
+    # Tras una desconexión el cliente pregunta qué tiene el servidor y sigue
+    assert test_client.get(f"/dataset/file/upload/chunked/{upload_id}").json["received"] == [0, 2]
+    incomplete = test_client.post(f"/dataset/file/upload/chunked/{upload_id}/complete")
+    assert incomplete.status_code == 409 and incomplete.json["missing"] == [1]
+
+    chunk = content[4:8]
+    assert put_chunk(test_client, upload_id, 1, chunk, checksum=f"crc32={zlib.crc32(chunk):08x}").status_code == 200
+    completed = test_client.post(f"/dataset/file/upload/chunked/{upload_id}/complete")
+
+    assert completed.status_code == 200 and completed.json["filename"] == "big.food"
+    assert (tmp_path / "temp" / "big.food").read_bytes() == content
+    assert test_client.get(f"/dataset/file/upload/chunked/{upload_id}").status_code == 404
+
+
+def test_chunked_upload_extracts_zip(test_client, chunked_store):
+    from app.modules.conftest import login
+
+    store, tmp_path = chunked_store
+    store.chunk_size = 1024 * 1024
+    login(test_client, "test_food@example.com", "test1234")
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("foods/apple.food", "name: Apple")
+        z.writestr("pear.food", "name: Pear")
+    body = archive.getvalue()
+
+    upload_id = test_client.post(
+        "/dataset/file/upload/chunked", json={"filename": "foods.zip", "size": len(body)}
+    ).json["upload_id"]
+    put_chunk(test_client, upload_id, 0, body)
+    completed = test_client.post(f"/dataset/file/upload/chunked/{upload_id}/complete")
+
+    assert completed.status_code == 200 and sorted(completed.json["filenames"]) == ["apple.food", "pear.food"]
+    assert sorted(p.name for p in (tmp_path / "temp").glob("*.food")) == ["apple.food", "pear.food"]
+
+
+def test_chunked_upload_garbage_collects_abandoned_sessions(tmp_path):
+    import os
+
+    from app.modules.fooddataset.chunked_upload import ChunkedUploadStore
+
+    store = ChunkedUploadStore(folder=str(tmp_path), chunk_size=4, session_ttl=60)
+    old = store.create(1, "old.food", 8)["upload_id"]
+    fresh = store.create(1, "fresh.food", 8)["upload_id"]
+    os.utime(tmp_path / "1" / old / store.MANIFEST, (0, 0))
+
+    assert store.collect_garbage(force=True) == 1
+    assert store.status(1, fresh)["received"] == []
+    assert not (tmp_path / "1" / old).exists()
+
+
+def test_extract_zip_streams_validates_and_renames(tmp_path):
+    from app.modules.fooddataset.zip_import import extract_zip
+
+    (tmp_path / "apple.food").write_text("name: Old apple")
+    zipbuf = create_test_zip(
+        {
+            "a/apple.food": "name: Apple\ncalories: 52 kcal\ntype: VEGAN\n",
+            "b/apple.food": "name: Other apple",
+            "broken.food": "nutritional_values:\n  no colon here\n",
+            "binary.food": b"\xff\xfe\x00name",
+            "README.md": "# Foods",
+        }
+    )
+
+    extraction = extract_zip(zipbuf, str(tmp_path))
+
+    assert extraction.filenames == ["apple (1).food", "apple (2).food", "README.md"]
+    assert set(extraction.rejected) == {"broken.food", "binary.food"}
+    assert extraction.files[0]["check"]["valid"] is True
+    assert extraction.files[1]["check"]["valid"] is False
+    assert extraction.files[2]["check"] is None
+    assert (tmp_path / "apple (2).food").read_text() == "name: Other apple"
+    assert not (tmp_path / "broken.food").exists() and not (tmp_path / "binary.food").exists()
+
+
+def test_extract_zip_enforces_limits(test_client, tmp_path, monkeypatch):
+    from app.modules.fooddataset.zip_import import ZipImportError, extract_zip
+
+    config = test_client.application.config
+    bomb = io.BytesIO()
+    with zipfile.ZipFile(bomb, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("bomb.food", b"\n" * (4 * 1024 * 1024))
+
+    with test_client.application.app_context():
+        with pytest.raises(ZipImportError, match="compression ratio") as raised:
+            extract_zip(bomb, str(tmp_path / "ratio"))
+        assert raised.value.status == 413
+
+        monkeypatch.setitem(config, "ZIP_IMPORT_MAX_MEMBERS", 1)
+        with pytest.raises(ZipImportError, match="Too many files"):
+            extract_zip(create_test_zip({"a.food": "name: A", "b.food": "name: B"}), str(tmp_path / "members"))
+
+        monkeypatch.setitem(config, "ZIP_IMPORT_MAX_SIZE", 10)
+        with pytest.raises(ZipImportError, match="too large"):
+            extract_zip(create_test_zip({"a.food": "name: Apple pie"}), str(tmp_path / "size"))
+
+    # Nada se escribe si el ZIP supera algún límite
+    assert not any(path.is_file() for path in tmp_path.rglob("*"))
+
+
+def test_session_events_dispatch_only_subscribed_changes(test_client):
+    from core.events.session_events import session_events
+
+    flushed, committed = [], []
+    session_events.subscribe(
+        "test_titles",
+        models=(FoodDSMetaData,),
+        fields=("title",),
+        on_flush=lambda session, changes: flushed.append(list(changes)) or {meta.id for meta in changes},
+        on_commit=committed.append,
+    )
+    try:
+        with test_client.application.app_context():
+            meta = FoodDSMetaData.query.filter_by(title="Food Dataset 1").first()
+
+            # Otro campo u otro modelo: la suscripción ni se entera
+            meta.description = "Only the description"
+            db.session.commit()
+            assert flushed == [] and committed == []
+
+            meta.title = "Renamed dataset"
+            db.session.flush()
+            db.session.rollback()
+            assert len(flushed) == 1 and committed == []
+
+            meta = db.session.get(FoodDSMetaData, meta.id)
+            meta.title = "Renamed dataset"
+            db.session.commit()
+            assert committed == [{meta.id}]
+
+            meta.title = "Food Dataset 1"
+            db.session.commit()
+    finally:
+        session_events.unsubscribe("test_titles")
@@ -0,0 +1,163 @@
+import codecs
+import logging
+import os
+import zipfile
+import zlib
+
+from flask import current_app, has_app_context
+
+from app.modules.food_checker.services import FoodParser
+from app.modules.hubfile.checksums import copy_with_checksum
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de este tamaño no se mira la tasa de compresión: un .food pequeño y repetitivo comprime mucho
+RATIO_MIN_SIZE = 1024 * 1024
+
+LIMITS = {
+    "ZIP_IMPORT_MAX_SIZE": 2 * 1024**3,
+    "ZIP_IMPORT_MAX_MEMBERS": 10000,
+    "ZIP_IMPORT_MAX_RATIO": 100,
+}
+
+
+class ZipImportError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class MemberRejected(Exception):
+    pass
+
+
+def _limit(key):
+    return current_app.config.get(key, LIMITS[key]) if has_app_context() else LIMITS[key]
+
+
+class FoodStreamValidator:
+    """Lector que pasa los bloques de un miembro .food al ``FoodParser`` a medida que se copian.
+
+    Corta la extracción con ``MemberRejected`` en cuanto el contenido no es UTF-8 o no se puede analizar,
+    sin haber escrito el resto del fichero.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.parser = FoodParser()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+
+    def _feed(self, text):
+        *lines, self._pending = (self._pending + text).split("\n")
+        for line in lines:
+            self.parser.feed_line(line)
+        if self.parser.error:
+            raise MemberRejected(self.parser.error)
+
+    def read(self, size=-1):
+        block = self.source.read(size)
+        try:
+            self._feed(self._decoder.decode(block, final=not block))
+        except UnicodeDecodeError:
+            raise MemberRejected("Not a UTF-8 text file")
+        if not block:
+            self._feed("\n")
+        return block
+
+    def result(self):
+        return self.parser.result()
+
+
+class ZipExtraction:
+    def __init__(self):
+        # Un dict por fichero extraído: filename, checksum, size y check (resultado del FoodParser en los .food)
+        self.files = []
+        self.rejected = {}
+
+    @property
+    def filenames(self):
+        return [file["filename"] for file in self.files]
+
+
+def _wanted(info, extensions):
+    name = os.path.basename(info.filename)
+    if info.is_dir() or not name or info.filename.startswith("__MACOSX"):
+        return False
+    return extensions is None or name.lower().endswith(extensions)
+
+
+def check_limits(members):
+    """Rechaza el ZIP antes de escribir nada si sus cabeceras superan algún límite."""
+    if len(members) > _limit("ZIP_IMPORT_MAX_MEMBERS"):
+        raise ZipImportError(f"Too many files in ZIP (max {_limit('ZIP_IMPORT_MAX_MEMBERS')})", status=413)
+
+    if sum(info.file_size for info in members) > _limit("ZIP_IMPORT_MAX_SIZE"):
+        raise ZipImportError(f"ZIP too large once extracted (max {_limit('ZIP_IMPORT_MAX_SIZE')} bytes)", status=413)
+
+    max_ratio = _limit("ZIP_IMPORT_MAX_RATIO")
+    for info in members:
+        if info.file_size > RATIO_MIN_SIZE and info.file_size > max_ratio * max(info.compress_size, 1):
+            raise ZipImportError(f"Suspicious compression ratio for '{info.filename}'", status=413)
+
+
+def _unique_name(filename, taken):
+    """``filename`` o ``filename (n)`` que no esté en ``taken``, como en la subida normal; lo añade a ``taken``."""
+    name = filename
+    base_name, extension = os.path.splitext(filename)
+    i = 1
+    while name in taken:
+        name = f"{base_name} ({i}){extension}"
+        i += 1
+    taken.add(name)
+    return name
+
+
+def extract_zip(source, folder, extensions=None):
+    """Extrae en ``folder`` los ficheros (sin directorios) del ZIP ``source``, ruta o fichero abierto.
+
+    Los límites se comprueban con las cabeceras antes de extraer y ``zipfile`` nunca devuelve más
+    bytes de los declarados, así que una cabecera falsa tampoco los supera. Cada miembro se copia por
+    bloques calculando su checksum y los .food se analizan mientras se copian: los que no son texto
+    o no se pueden analizar se descartan y quedan en ``rejected``.
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise ZipImportError("File is not a valid ZIP archive.")
+
+    extraction = ZipExtraction()
+    with archive:
+        members = [info for info in archive.infolist() if _wanted(info, extensions)]
+        check_limits(members)
+
+        os.makedirs(folder, exist_ok=True)
+        # Un solo listado de la carpeta: los nombres repetidos se resuelven en memoria
+        taken = set(os.listdir(folder))
+
+        for info in members:
+            filename = _unique_name(os.path.basename(info.filename), taken)
+            path = os.path.join(folder, filename)
+            try:
+                with archive.open(info) as member:
+                    if filename.lower().endswith(".food"):
+                        stream = FoodStreamValidator(member)
+                        checksum, size = copy_with_checksum(stream, path)
+                        check = stream.result()
+                    else:
+                        checksum, size = copy_with_checksum(member, path)
+                        check = None
+            except MemberRejected as e:
+                logger.warning(f"Skipping '{info.filename}' from ZIP: {e}")
+                os.remove(path)
+                taken.discard(filename)
+                extraction.rejected[info.filename] = str(e)
+                continue
+            except (zipfile.BadZipFile, zlib.error, NotImplementedError) as e:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise ZipImportError(f"Cannot extract '{info.filename}': {e}")
+
+            extraction.files.append({"filename": filename, "checksum": checksum, "size": size, "check": check})
+
+    return extraction
@@ -0,0 +1,158 @@
+import logging
+import os
+import shutil
+import uuid
+from collections import Counter
+
+from sqlalchemy import insert, inspect, update
+
+from app.modules.hubfile.checksums import checksum_algorithm, file_checksum
+from app.modules.hubfile.models import Hubfile, HubfileBlob
+from core.events.session_events import session_events
+
+logger = logging.getLogger(__name__)
+
+
+def link_or_copy(source, destination):
+    """Deja ``destination`` como enlace duro de ``source`` (copia si no se puede) sin escribir encima del original.
+
+    Se enlaza a un nombre temporal y se sustituye con ``os.replace``: si ``destination`` ya era un
+    enlace a otro blob solo cambia la entrada del directorio, nunca el contenido compartido.
+    """
+    # rename() entre dos enlaces del mismo fichero no hace nada y dejaría el temporal
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    tmp = f"{destination}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        # Otro sistema de ficheros o sin soporte de enlaces duros
+        shutil.copy2(source, tmp)
+    os.replace(tmp, destination)
+
+
+class BlobStore:
+    """Almacén de contenidos por checksum: cada fichero distinto se guarda una sola vez.
+
+    Los blobs viven en ``<folder>/<algoritmo>/<xx>/<hex>-<tamaño>`` y las rutas de siempre
+    (``uploads/user_X/dataset_Y/<nombre>``) son enlaces duros a ellos, así que las descargas,
+    los zips y nginx no cambian. Copiar ficheros entre datasets o a la carpeta temporal es crear
+    un enlace. ``file_blob.ref_count`` cuenta los ``Hubfile`` de cada contenido y se mantiene con
+    eventos de sesión; los blobs sin referencias los borra ``collect_garbage``.
+    """
+
+    def __init__(self, folder=None, enabled=True):
+        self.folder = folder
+        self._enabled = enabled
+
+    def init_app(self, app):
+        self.folder = app.config.get("HUBFILE_BLOB_DIR", self.folder)
+        self._enabled = app.config.get("HUBFILE_BLOB_STORE", self._enabled)
+        register_events()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.folder) and self._enabled
+
+    def path(self, checksum, size):
+        algorithm = checksum_algorithm(checksum)
+        digest = checksum.partition(":")[2] if ":" in checksum else checksum
+        return os.path.join(self.folder, algorithm, digest[:2], f"{digest}-{size}")
+
+    def place(self, source, checksum, size, destination):
+        """Guarda ``source`` como blob si aún no existe y deja ``destination`` enlazado a él.
+
+        Si el contenido ya estaba en el almacén, ``source`` ni se lee; en ambos casos ``source`` se
+        queda donde estaba y lo borra quien llama.
+        """
+        blob = self.path(checksum, size)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            link_or_copy(source, blob)
+        link_or_copy(blob, destination)
+        return blob
+
+    def adopt(self, path, checksum, size) -> bool:
+        """Pasa un fichero ya subido al almacén comprobando antes que su checksum es el guardado."""
+        algorithm = checksum_algorithm(checksum)
+        try:
+            actual, actual_size = file_checksum(path, algorithm)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            return False
+        if (actual, actual_size) != (checksum, size):
+            logger.warning(f"Skipping {path}: stored checksum does not match its content")
+            return False
+
+        blob = self.path(checksum, size)
+        if os.path.exists(blob) and os.path.samefile(blob, path):
+            return True
+        self.place(path, checksum, size, path)
+        return True
+
+    def collect_garbage(self, session) -> int:
+        """Borra los blobs que ningún ``Hubfile`` usa. Devuelve cuántos se han borrado."""
+        removed = 0
+        for blob in session.query(HubfileBlob).filter(HubfileBlob.ref_count <= 0).all():
+            path = self.path(blob.checksum, blob.size)
+            try:
+                # Si algún dataset aún lo enlaza (fichero huérfano en disco) se deja
+                if os.stat(path).st_nlink > 1:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            session.delete(blob)
+            removed += 1
+        session.commit()
+        return removed
+
+
+blob_store = BlobStore()
+
+
+def load_deleted_blob_keys(session, changes):
+    """Carga checksum y tamaño de los ``Hubfile`` borrados mientras su fila existe; en after_flush ya no se puede."""
+    for instance in changes.deleted:
+        if {"checksum", "size"} & inspect(instance).expired_attributes:
+            session.refresh(instance, ["checksum", "size"])
+
+
+def count_blob_references(session, changes):
+    """Suma o resta referencias de ``file_blob`` por cada ``Hubfile`` creado, borrado o con otro contenido."""
+    deltas = Counter()
+    for instance in changes.new:
+        deltas[(instance.checksum, instance.size)] += 1
+    for instance in changes.deleted:
+        deltas[(instance.checksum, instance.size)] -= 1
+    for instance in changes.dirty:
+        attrs = inspect(instance).attrs
+        old_checksum = (attrs.checksum.history.deleted or [instance.checksum])[0]
+        old_size = (attrs.size.history.deleted or [instance.size])[0]
+        deltas[(old_checksum, old_size)] -= 1
+        deltas[(instance.checksum, instance.size)] += 1
+
+    deltas = {key: delta for key, delta in deltas.items() if delta and None not in key}
+    if not deltas:
+        return
+
+    table = HubfileBlob.__table__
+    connection = session.connection()
+    for (checksum, size), delta in deltas.items():
+        updated = connection.execute(
+            update(table)
+            .where(table.c.checksum == checksum, table.c.size == size)
+            .values(ref_count=table.c.ref_count + delta)
+        )
+        if updated.rowcount == 0:
+            connection.execute(insert(table).values(checksum=checksum, size=size, ref_count=delta))
+
+
+def register_events():
+    session_events.subscribe(
+        "blob_references",
+        models=(Hubfile,),
+        fields=("checksum", "size"),
+        on_before_flush=load_deleted_blob_keys,
+        on_flush=count_blob_references,
+    )
@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# MD5 se guarda como hex sin prefijo, como siempre; el resto lleva "algoritmo:" delante
+DIGESTS = {
+    "md5": hashlib.md5,
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+}
+DEFAULT_ALGORITHM = "md5"
+
+
+def _config(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def new_digest(algorithm=None):
+    algorithm = algorithm or _config("HUBFILE_CHECKSUM_ALGORITHM", DEFAULT_ALGORITHM)
+    if algorithm not in DIGESTS:
+        raise ValueError(f"Unknown checksum algorithm: {algorithm}")
+    return algorithm, DIGESTS[algorithm]()
+
+
+def format_checksum(algorithm, digest):
+    return digest.hexdigest() if algorithm == "md5" else f"{algorithm}:{digest.hexdigest()}"
+
+
+def checksum_algorithm(checksum):
+    """Algoritmo de un checksum guardado; los que no tienen prefijo son MD5."""
+    algorithm, separator, _ = checksum.partition(":")
+    return algorithm if separator else "md5"
+
+
+def _sidecar(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}.checksum")
+
+
+def remember_checksum(path, checksum):
+    """Apunta el checksum junto al fichero, válido mientras no cambien su tamaño ni su fecha.
+
+    Es solo un atajo: si no se puede escribir, el checksum se recalculará cuando haga falta.
+    """
+    try:
+        stat = os.stat(path)
+        with open(_sidecar(path), "w") as f:
+            f.write(f"{stat.st_size} {stat.st_mtime_ns} {checksum}")
+    except OSError as e:
+        logger.debug(f"Could not remember checksum for {path}: {e}")
+
+
+def forget_checksum(path):
+    """Borra el checksum apuntado junto a ``path``; hay que llamarla al borrar o mover el fichero."""
+    try:
+        os.remove(_sidecar(path))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.debug(f"Could not forget checksum for {path}: {e}")
+
+
+def remove_with_checksum(path):
+    """Borra ``path`` (si existe) junto con su checksum apuntado."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    forget_checksum(path)
+
+
+def _remembered(path, stat, algorithm):
+    try:
+        with open(_sidecar(path)) as f:
+            size, mtime_ns, checksum = f.read().split(" ", 2)
+    except (OSError, ValueError):
+        return None
+    if (int(size), int(mtime_ns)) != (stat.st_size, stat.st_mtime_ns) or checksum_algorithm(checksum) != algorithm:
+        return None
+    return checksum
+
+
+def copy_with_checksum(source, path, algorithm=None):
+    """Escribe el stream ``source`` en ``path`` calculando el checksum a la vez; devuelve ``(checksum, size)``."""
+    algorithm, digest = new_digest(algorithm)
+    size = 0
+    with open(path, "wb") as target:
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+            target.write(chunk)
+            size += len(chunk)
+    checksum = format_checksum(algorithm, digest)
+    remember_checksum(path, checksum)
+    return checksum, size
+
+
+def file_checksum(path, algorithm=None):
+    """``(checksum, size)`` de ``path`` leído por bloques; reutiliza el calculado al subirlo si sigue valiendo."""
+    algorithm, digest = new_digest(algorithm)
+    stat = os.stat(path)
+    checksum = _remembered(path, stat, algorithm)
+    if checksum is not None:
+        return checksum, stat.st_size
+
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return format_checksum(algorithm, digest), stat.st_size
+
+
+def file_checksums(paths, algorithm=None, max_workers=None):
+    """``{ruta: (checksum, size)}`` calculados en paralelo (``hashlib`` suelta el GIL con bloques grandes)."""
+    paths = list(dict.fromkeys(paths))
+    algorithm, _ = new_digest(algorithm)
+    max_workers = max_workers or _config("HUBFILE_CHECKSUM_WORKERS", 4)
+    if len(paths) <= 1 or max_workers <= 1:
+        return {path: file_checksum(path, algorithm) for path in paths}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+        return dict(zip(paths, pool.map(lambda path: file_checksum(path, algorithm), paths)))
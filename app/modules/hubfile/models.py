@@ -8,8 +8,9 @@ class Hubfile(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    checksum = db.Column(db.String(120), nullable=False)
-    size = db.Column(db.Integer, nullable=False)
+    # active_history: el valor anterior hace falta para descontar la referencia en file_blob
+    checksum = db.column_property(db.Column(db.String(120), nullable=False), active_history=True)
+    size = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
 
     food_model_id = db.Column(db.Integer, db.ForeignKey("food_model.id"), nullable=True)
 
@@ -43,3 +44,16 @@ class HubfileViewRecord(db.Model):
 
     def __repr__(self):
         return f"<HubfileViewRecord id={self.id} " f"file_id={self.file_id} date={self.view_date}>"
+
+
+class HubfileBlob(db.Model):
+    """Contenido guardado una sola vez en el almacén de blobs y cuántos ``Hubfile`` lo usan."""
+
+    __tablename__ = "file_blob"
+
+    checksum = db.Column(db.String(120), primary_key=True)
+    size = db.Column(db.Integer, primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+
+    def __repr__(self):
+        return f"<HubfileBlob {self.checksum} refs={self.ref_count}>"
@@ -1,16 +1,75 @@
 import os
 import uuid
 from datetime import datetime, timezone
+from itertools import islice
 
-from flask import current_app, jsonify, make_response, request, send_from_directory
+from flask import Response, current_app, jsonify, make_response, request
 from flask_login import current_user
+from werkzeug.http import is_resource_modified
 
 from app import db
 from app.modules.hubfile import hubfile_bp
 from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
+from app.modules.hubfile.sendfile import send_upload
 from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
 
 
+def file_validators(file, representation=None):
+    """ETag fuerte (el checksum, más la representación si no es el fichero tal cual) y mtime del fichero en disco."""
+    etag = file.checksum if representation is None else f"{file.checksum}-{representation}"
+    try:
+        mtime = os.stat(HubfileService().get_path_by_hubfile(file)).st_mtime
+    except (OSError, TypeError):
+        # Sin fichero no hay fecha: basta con el ETag y la ruta responde 404 más adelante
+        return etag, None
+    return etag, datetime.fromtimestamp(mtime, timezone.utc)
+
+
+def not_modified(etag, last_modified):
+    """Respuesta 304 si el cliente ya tiene esta versión; se comprueba antes de leer el disco o registrar nada."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    return resp
+
+
+def with_validators(resp, etag, last_modified):
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    # El navegador puede guardarla, pero revalida siempre para que las visitas nuevas se registren
+    resp.cache_control.no_cache = True
+    return resp
+
+
+def record_view(file_id, resp):
+    user_cookie = request.cookies.get("view_cookie")
+    if not user_cookie:
+        user_cookie = str(uuid.uuid4())
+
+    existing_record = HubfileViewRecord.query.filter_by(
+        user_id=current_user.id if current_user.is_authenticated else None,
+        file_id=file_id,
+        view_cookie=user_cookie,
+    ).first()
+
+    if not existing_record:
+        new_view_record = HubfileViewRecord(
+            user_id=current_user.id if current_user.is_authenticated else None,
+            file_id=file_id,
+            view_date=datetime.now(),
+            view_cookie=user_cookie,
+        )
+        db.session.add(new_view_record)
+        db.session.commit()
+
+    if not request.cookies.get("view_cookie"):
+        resp.set_cookie("view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2)
+
+    return resp
+
+
 @hubfile_bp.route("/download/<int:file_id>", methods=["GET"])
 def download_file(file_id):
     file = HubfileService().get_or_404(file_id)
@@ -19,6 +78,11 @@ def download_file(file_id):
     if not file.food_model or not file.food_model.dataset:
         return jsonify({"error": "File path not found (orphaned file)"}), 404
 
+    etag, last_modified = file_validators(file)
+    resp = not_modified(etag, last_modified)
+    if resp is not None:
+        return resp
+
     user_id = file.food_model.dataset.user_id
     dataset_id = file.food_model.dataset.id
 
@@ -29,19 +93,24 @@ def download_file(file_id):
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
 
-    existing_record = HubfileDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None, file_id=file_id, download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        HubfileDownloadRecordService().create(
+    # Los trozos de una descarga ya empezada (Range) no cuentan como descargas nuevas
+    if request.range is None:
+        existing_record = HubfileDownloadRecord.query.filter_by(
             user_id=current_user.id if current_user.is_authenticated else None,
             file_id=file_id,
-            download_date=datetime.now(timezone.utc),
             download_cookie=user_cookie,
-        )
+        ).first()
 
-    resp = make_response(send_from_directory(directory=file_path, path=filename, as_attachment=True))
+        if not existing_record:
+            HubfileDownloadRecordService().create(
+                user_id=current_user.id if current_user.is_authenticated else None,
+                file_id=file_id,
+                download_date=datetime.now(timezone.utc),
+                download_cookie=user_cookie,
+            )
+
+    # send_file responde a Range con 206 e If-Range con el ETag
+    resp = make_response(send_upload(os.path.join(file_path, filename), etag=etag, last_modified=last_modified))
     resp.set_cookie("file_download_cookie", user_cookie)
 
     return resp
@@ -55,6 +124,11 @@ def view_file(file_id):
     if not file.food_model or not file.food_model.dataset:
         return jsonify({"success": False, "error": "File orphaned"}), 404
 
+    etag, last_modified = file_validators(file, "json")
+    resp = not_modified(etag, last_modified)
+    if resp is not None:
+        return resp
+
     user_id = file.food_model.dataset.user_id
     dataset_id = file.food_model.dataset.id
 
@@ -67,33 +141,65 @@ def view_file(file_id):
             with open(file_path, "r") as f:
                 content = f.read()
 
-            user_cookie = request.cookies.get("view_cookie")
-            if not user_cookie:
-                user_cookie = str(uuid.uuid4())
-
-            existing_record = HubfileViewRecord.query.filter_by(
-                user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
-                view_cookie=user_cookie,
-            ).first()
-
-            if not existing_record:
-                new_view_record = HubfileViewRecord(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie,
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
-            response = jsonify({"success": True, "content": content})
-
-            if not request.cookies.get("view_cookie"):
-                response = make_response(response)
-                response.set_cookie("view_cookie", user_cookie, max_age=60 * 60 * 24 * 365 * 2)
-
-            return response
+            response = make_response(jsonify({"success": True, "content": content}))
+            return record_view(file_id, with_validators(response, etag, last_modified))
         else:
             return jsonify({"success": False, "error": "File not found on disk"}), 404
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+
+@hubfile_bp.route("/preview/<int:file_id>", methods=["GET"])
+def preview_file(file_id):
+    """Contenido en texto plano de una ventana del fichero: ``?start=&count=`` en líneas, o en bytes con ``unit=bytes``.
+
+    Solo lee del disco la ventana pedida (más una línea para saber si hay más); las cabeceras
+    ``X-Preview-Start``/``X-Preview-End`` dan la ventana devuelta y ``X-Preview-Truncated`` si queda contenido.
+    """
+    file = HubfileService().get_or_404(file_id)
+
+    if not file.food_model or not file.food_model.dataset:
+        return jsonify({"success": False, "error": "File orphaned"}), 404
+
+    unit = request.args.get("unit", "lines")
+    if unit == "lines":
+        default_count = current_app.config["HUBFILE_PREVIEW_LINES"]
+        max_count = current_app.config["HUBFILE_PREVIEW_MAX_LINES"]
+    elif unit == "bytes":
+        default_count = max_count = current_app.config["HUBFILE_PREVIEW_MAX_BYTES"]
+    else:
+        return jsonify({"success": False, "error": "unit must be 'lines' or 'bytes'"}), 400
+
+    start = request.args.get("start", 0, type=int)
+    count = request.args.get("count", default_count, type=int)
+    if start < 0 or count < 1:
+        return jsonify({"success": False, "error": "start must be >= 0 and count >= 1"}), 400
+    count = min(count, max_count)
+
+    etag, last_modified = file_validators(file, f"{unit}-{start}-{count}")
+    resp = not_modified(etag, last_modified)
+    if resp is not None:
+        return resp
+
+    file_path = HubfileService().get_path_by_hubfile(file)
+    try:
+        with open(file_path, "rb") as f:
+            if unit == "lines":
+                lines = list(islice(f, start, start + count))
+                content = b"".join(lines)
+                end = start + len(lines)
+                truncated = f.readline() != b""
+            else:
+                f.seek(start)
+                content = f.read(count)
+                end = start + len(content)
+                truncated = end < os.fstat(f.fileno()).st_size
+    except FileNotFoundError:
+        return jsonify({"success": False, "error": "File not found on disk"}), 404
+
+    resp = Response(content, mimetype="text/plain")
+    resp.headers["X-Preview-Unit"] = unit
+    resp.headers["X-Preview-Start"] = str(start)
+    resp.headers["X-Preview-End"] = str(end)
+    resp.headers["X-Preview-Truncated"] = "true" if truncated else "false"
+    return record_view(file_id, with_validators(resp, etag, last_modified))
@@ -0,0 +1,44 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, current_app, send_from_directory
+
+
+def accel_redirect_uri(path):
+    """URI interna de nginx para ``path``; None si está fuera de ``ACCEL_REDIRECT_ROOT``."""
+    root = os.path.abspath(current_app.config["ACCEL_REDIRECT_ROOT"])
+    relative = os.path.relpath(os.path.abspath(path), root)
+    if relative == os.curdir or relative.split(os.sep, 1)[0] == os.pardir:
+        return None
+    return current_app.config["ACCEL_REDIRECT_LOCATION"].rstrip("/") + "/" + quote(relative.replace(os.sep, "/"))
+
+
+def send_upload(path, download_name=None, mimetype=None, etag=None, last_modified=None):
+    """Envía como adjunto un fichero de ``uploads``.
+
+    Con ``ACCEL_REDIRECT`` la respuesta va vacía con una cabecera ``X-Accel-Redirect`` y es nginx
+    quien lee el fichero y lo envía, así que el worker queda libre aunque el cliente sea lento; los
+    permisos y los registros de descarga ya los ha hecho la vista. Sin nginx delante (desarrollo
+    local) se sirve desde Flask, que también atiende ``Range`` e ``If-Range``; con nginx lo hace él.
+    """
+    download_name = download_name or os.path.basename(path)
+    uri = accel_redirect_uri(path) if current_app.config.get("ACCEL_REDIRECT") else None
+
+    if uri is None:
+        return send_from_directory(
+            os.path.dirname(os.path.abspath(path)),
+            os.path.basename(path),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            etag=etag if etag is not None else True,
+            last_modified=last_modified,
+        )
+
+    resp = Response(mimetype=mimetype or mimetypes.guess_type(download_name)[0] or "application/octet-stream")
+    resp.headers["X-Accel-Redirect"] = uri
+    resp.headers.set("Content-Disposition", "attachment", filename=download_name)
+    if etag:
+        resp.set_etag(etag)
+    return resp
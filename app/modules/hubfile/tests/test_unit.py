@@ -1,3 +1,5 @@
+import os
+
 import pytest
 
 pytestmark = pytest.mark.unit
@@ -24,3 +26,292 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+@pytest.fixture
+def accel_redirect(test_client, tmp_path, monkeypatch):
+    config = test_client.application.config
+    monkeypatch.setitem(config, "ACCEL_REDIRECT", True)
+    monkeypatch.setitem(config, "ACCEL_REDIRECT_ROOT", str(tmp_path / "uploads"))
+    monkeypatch.setitem(config, "ACCEL_REDIRECT_LOCATION", "/protected/uploads/")
+    return tmp_path
+
+
+def test_send_upload_uses_accel_redirect(test_client, accel_redirect):
+    from app.modules.hubfile.sendfile import send_upload
+
+    inside = accel_redirect / "uploads" / "user_1" / "dataset_2" / "apple pie.food"
+    outside = accel_redirect / "other.food"
+    inside.parent.mkdir(parents=True)
+    inside.write_bytes(b"name: Apple pie")
+    outside.write_bytes(b"name: Other")
+
+    with test_client.application.test_request_context():
+        offloaded = send_upload(str(inside))
+        assert offloaded.headers["X-Accel-Redirect"] == "/protected/uploads/user_1/dataset_2/apple%20pie.food"
+        assert "apple pie.food" in offloaded.headers["Content-Disposition"]
+        assert offloaded.get_data() == b""
+
+        # Fuera de la carpeta que ve nginx se sirve directamente
+        direct = send_upload(str(outside))
+        direct.direct_passthrough = False
+        assert "X-Accel-Redirect" not in direct.headers
+        assert direct.get_data() == b"name: Other"
+
+        test_client.application.config["ACCEL_REDIRECT"] = False
+        direct = send_upload(str(inside))
+        direct.direct_passthrough = False
+        assert "X-Accel-Redirect" not in direct.headers
+        assert direct.get_data() == b"name: Apple pie"
+
+
+@pytest.fixture
+def food_file(test_client, tmp_path, monkeypatch):
+    """Hubfile de un dataset nuevo con su fichero escrito en ``tmp_path/uploads``."""
+    from app import db
+    from app.modules.basedataset.models import BasePublicationType
+    from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+    from app.modules.foodmodel.models import FoodMetaData, FoodModel
+    from app.modules.hubfile.models import Hubfile
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(test_client.application, "root_path", str(tmp_path / "app"))
+    content = b"".join(f"line {number}\n".encode() for number in range(10))
+
+    with test_client.application.app_context():
+        dataset = FoodDataset(
+            user_id=1,
+            ds_meta_data=FoodDSMetaData(
+                title="Pear", description="Pear", publication_type=BasePublicationType.JOURNAL_ARTICLE
+            ),
+        )
+        food_model = FoodModel(
+            dataset=dataset, food_meta_data=FoodMetaData(food_filename="pear.food", title="Pear", description="P")
+        )
+        hubfile = Hubfile(name="pear.food", checksum="abc123", size=len(content))
+        food_model.files.append(hubfile)
+        db.session.add(dataset)
+        db.session.commit()
+        file_id, ds_id = hubfile.id, dataset.id
+
+    folder = tmp_path / "uploads" / "user_1" / f"dataset_{ds_id}"
+    folder.mkdir(parents=True)
+    (folder / "pear.food").write_bytes(content)
+    return file_id, ds_id, content
+
+
+def test_download_file_records_and_offloads(test_client, food_file, accel_redirect):
+    from app.modules.hubfile.models import HubfileDownloadRecord
+
+    file_id, ds_id, _ = food_file
+    response = test_client.application.test_client().get(f"/hubfile/download/{file_id}")
+
+    assert response.status_code == 200 and response.data == b""
+    assert response.headers["X-Accel-Redirect"] == f"/protected/uploads/user_1/dataset_{ds_id}/pear.food"
+    with test_client.application.app_context():
+        assert HubfileDownloadRecord.query.filter_by(file_id=file_id).count() == 1
+
+
+def test_download_file_conditional_and_range(test_client, food_file):
+    from email.utils import parsedate_to_datetime
+
+    from app import db
+    from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord
+    from app.modules.hubfile.services import HubfileService
+
+    file_id, _, content = food_file
+    client = test_client.application.test_client()
+
+    full = client.get(f"/hubfile/download/{file_id}")
+    assert full.status_code == 200 and full.data == content
+    assert full.headers["ETag"] == '"abc123"' and full.headers["Last-Modified"]
+
+    # Last-Modified es el mtime del fichero, no la fecha de creación del dataset
+    with test_client.application.app_context():
+        mtime = int(os.stat(HubfileService().get_path_by_hubfile(db.session.get(Hubfile, file_id))).st_mtime)
+    assert int(parsedate_to_datetime(full.headers["Last-Modified"]).timestamp()) == mtime
+    since = client.get(f"/hubfile/download/{file_id}", headers={"If-Modified-Since": full.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    partial = client.get(f"/hubfile/download/{file_id}", headers={"Range": "bytes=7-13"})
+    assert partial.status_code == 206 and partial.data == content[7:14]
+
+    not_modified = client.get(f"/hubfile/download/{file_id}", headers={"If-None-Match": '"abc123"'})
+    assert not_modified.status_code == 304 and not_modified.data == b""
+
+    with test_client.application.app_context():
+        assert HubfileDownloadRecord.query.filter_by(file_id=file_id).count() == 1
+
+
+def test_view_file_not_modified_skips_view_record(test_client, food_file):
+    from app.modules.hubfile.models import HubfileViewRecord
+
+    file_id, _, content = food_file
+    client = test_client.application.test_client()
+
+    first = client.get(f"/hubfile/view/{file_id}")
+    assert first.json["content"] == content.decode()
+
+    # Otra cookie, pero el navegador ya tiene la respuesta: ni se lee el fichero ni se registra la visita
+    client.delete_cookie("view_cookie")
+    second = client.get(f"/hubfile/view/{file_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+
+    with test_client.application.app_context():
+        assert HubfileViewRecord.query.filter_by(file_id=file_id).count() == 1
+
+
+def test_preview_file_returns_window(test_client, food_file):
+    file_id, _, content = food_file
+    client = test_client.application.test_client()
+
+    lines = client.get(f"/hubfile/preview/{file_id}?start=2&count=3")
+    assert lines.status_code == 200 and lines.mimetype == "text/plain"
+    assert lines.data == b"line 2\nline 3\nline 4\n"
+    assert (lines.headers["X-Preview-End"], lines.headers["X-Preview-Truncated"]) == ("5", "true")
+
+    tail = client.get(f"/hubfile/preview/{file_id}?start=8&count=5")
+    assert tail.data == b"line 8\nline 9\n" and tail.headers["X-Preview-Truncated"] == "false"
+
+    window = client.get(f"/hubfile/preview/{file_id}?unit=bytes&start=7&count=7")
+    assert window.data == content[7:14] and window.headers["X-Preview-Truncated"] == "true"
+
+    assert client.get(f"/hubfile/preview/{file_id}?unit=pages").status_code == 400
+    assert client.get(f"/hubfile/preview/{file_id}?count=0").status_code == 400
+
+
+def test_checksums_stream_and_reuse_upload_digest(tmp_path, monkeypatch):
+    import hashlib
+    import io
+
+    from app.modules.hubfile import checksums
+
+    monkeypatch.setattr(checksums, "CHUNK_SIZE", 4)
+    content = b"name: Apple\ncalories: 52\n"
+    path = tmp_path / "apple.food"
+
+    assert checksums.copy_with_checksum(io.BytesIO(content), str(path)) == (
+        hashlib.md5(content).hexdigest(),
+        len(content),
+    )
+    assert checksums.file_checksum(str(path), "sha256") == (f"sha256:{hashlib.sha256(content).hexdigest()}", 25)
+    assert checksums.file_checksum(str(path), "blake2b")[0].startswith("blake2b:")
+
+    # El checksum apuntado al subir se reutiliza sin leer el fichero
+    monkeypatch.setattr("builtins.open", _fail_on_read(open, str(path)))
+    assert checksums.file_checksum(str(path))[0] == hashlib.md5(content).hexdigest()
+
+
+def _fail_on_read(real_open, forbidden):
+    def guarded_open(file, mode="r", *args, **kwargs):
+        if file == forbidden and "r" in mode:
+            raise AssertionError(f"{file} should not be read")
+        return real_open(file, mode, *args, **kwargs)
+
+    return guarded_open
+
+
+def test_checksums_ignore_stale_sidecar_and_run_in_parallel(tmp_path):
+    import hashlib
+
+    from app.modules.hubfile import checksums
+
+    paths = []
+    for number in range(6):
+        path = tmp_path / f"food_{number}.food"
+        path.write_bytes(f"name: Food {number}\n".encode() * 1000)
+        paths.append(str(path))
+    checksums.remember_checksum(paths[0], "stale")
+    with open(paths[0], "ab") as f:
+        f.write(b"more\n")
+
+    parallel = checksums.file_checksums(paths, "md5", max_workers=3)
+
+    assert parallel == {path: checksums.file_checksum(path, "md5") for path in paths}
+    assert parallel[paths[0]][0] == hashlib.md5(open(paths[0], "rb").read()).hexdigest()
+
+
+def test_blob_store_places_each_content_once(tmp_path):
+    import hashlib
+
+    from app.modules.hubfile.blobs import BlobStore
+
+    store = BlobStore(folder=str(tmp_path / "blobs"))
+    content = b"name: Pear\n"
+    checksum = hashlib.md5(content).hexdigest()
+    first, second = tmp_path / "first.food", tmp_path / "second.food"
+    first.write_bytes(content)
+    second.write_bytes(content)
+    first_dest, second_dest = tmp_path / "dataset_1.food", tmp_path / "dataset_2.food"
+
+    blob = store.place(str(first), checksum, len(content), str(first_dest))
+    # Con el contenido ya en el almacén la segunda copia no se usa
+    second.write_bytes(b"not read")
+    store.place(str(second), checksum, len(content), str(second_dest))
+
+    assert blob == str(tmp_path / "blobs" / "md5" / checksum[:2] / f"{checksum}-{len(content)}")
+    assert first_dest.read_bytes() == second_dest.read_bytes() == content
+    assert first_dest.stat().st_ino == second_dest.stat().st_ino == tmp_path.joinpath(blob).stat().st_ino
+
+
+def test_blob_store_adopt_verifies_and_collects_garbage(test_client, tmp_path):
+    import hashlib
+
+    from app import db
+    from app.modules.hubfile.blobs import BlobStore
+    from app.modules.hubfile.models import HubfileBlob
+
+    store = BlobStore(folder=str(tmp_path / "blobs"))
+    content = b"name: Plum\n"
+    checksum = hashlib.md5(content).hexdigest()
+    path = tmp_path / "plum.food"
+    path.write_bytes(content)
+
+    assert not store.adopt(str(path), "0" * 32, len(content))
+    assert store.adopt(str(path), checksum, len(content))
+    blob = store.path(checksum, len(content))
+    assert path.stat().st_ino == os.stat(blob).st_ino
+
+    with test_client.application.app_context():
+        db.session.add(HubfileBlob(checksum=checksum, size=len(content), ref_count=0))
+        db.session.commit()
+
+        # Aún enlazado desde un dataset: se conserva
+        assert store.collect_garbage(db.session) == 0
+        path.unlink()
+        assert store.collect_garbage(db.session) == 1
+        assert not os.path.exists(blob)
+        assert db.session.get(HubfileBlob, (checksum, len(content))) is None
+
+
+def test_blob_references_follow_hubfiles(test_client, food_file):
+    from app import db
+    from app.modules.hubfile.models import Hubfile, HubfileBlob
+
+    file_id, _, content = food_file
+
+    def refs(checksum):
+        blob = db.session.get(HubfileBlob, (checksum, len(content)))
+        db.session.expire_all()
+        return blob.ref_count if blob else 0
+
+    with test_client.application.app_context():
+        # La base de datos del módulo la comparten todos los food_file
+        before = refs("abc123")
+        assert before >= 1
+
+        copy = Hubfile(name="pear (1).food", checksum="abc123", size=len(content))
+        db.session.add(copy)
+        db.session.commit()
+        assert refs("abc123") == before + 1
+
+        copy.checksum = "def456"
+        db.session.commit()
+        assert refs("abc123") == before
+        assert refs("def456") == 1
+
+        db.session.delete(copy)
+        db.session.delete(db.session.get(Hubfile, file_id))
+        db.session.commit()
+        assert refs("abc123") == before - 1
+        assert refs("def456") == 0
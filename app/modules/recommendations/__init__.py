@@ -1,3 +1,5 @@
-# from core.blueprints.base_blueprint import BaseBlueprint
+from core.blueprints.base_blueprint import BaseBlueprint
 
-# recommendations_bp = BaseBlueprint("recommendations", __name__, template_folder="templates")
+recommendations_bp = BaseBlueprint(
+    "recommendations", __name__, template_folder="templates", url_prefix="/api/recommendations"
+)
@@ -0,0 +1,337 @@
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import String, and_, cast, func, or_, select
+
+from app import db
+from app.modules.basedataset.models import BaseDSDownloadRecord
+from app.modules.fooddataset.models import FoodDataset
+from core.events.session_events import session_events
+from core.events.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+def basket_key():
+    """Quién descarga: el usuario si hay sesión, si no la cookie de descarga."""
+    return func.coalesce(cast(BaseDSDownloadRecord.user_id, String), BaseDSDownloadRecord.download_cookie)
+
+
+def _grouped(rows):
+    """Agrupa ``(clave, dataset_id)`` ya ordenadas por clave en conjuntos de datasets."""
+    current_key, basket = None, set()
+    for key, dataset_id in rows:
+        if key != current_key:
+            if len(basket) > 1:
+                yield basket
+            current_key, basket = key, set()
+        basket.add(dataset_id)
+    if len(basket) > 1:
+        yield basket
+
+
+class CoDownloadIndex:
+    """Matriz dispersa dataset x dataset de co-descargas ("quien descargó esto también descargó").
+
+    Cada fila es un diccionario ``{otro_dataset: veces}`` construido en una sola pasada por los
+    registros de descarga (agrupados por usuario o cookie) y por los carritos. Al superar
+    ``2 * top_n`` entradas una fila se poda a las ``top_n`` mayores, así que la memoria queda
+    acotada aunque los recuentos de la cola sean aproximados. Los commits solo apuntan los ids de
+    las descargas nuevas; un hilo las suma por lotes cada ``RECOMMENDATIONS_CODOWNLOAD_FLUSH_INTERVAL``
+    segundos y guarda una vez por lote. La reconstrucción completa la hace
+    ``rosemary recommendations:codownloads`` o el mismo hilo con ``RECOMMENDATIONS_CODOWNLOAD_INTERVAL``.
+    """
+
+    FILE = "co_downloads.npz"
+    LOCK_FILE = "co_downloads.lock"
+
+    def __init__(self, folder=None, top_n=50, interval=0, flush_interval=30, batch_size=1000):
+        self.folder = folder
+        self.top_n = top_n
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.app = None
+
+        self.neighbors = {}
+        self.built = False
+        self._loaded_mtime = None
+        self._queued = set()
+
+        self._lock = threading.RLock()
+        self._last_rebuild = time.monotonic()
+        self._worker = BackgroundWorker(
+            "co-downloads", self._tick, interval=lambda: self.flush_interval or self.interval
+        )
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.get("RECOMMENDATIONS_MODEL_DIR", self.folder)
+        self.top_n = app.config.get("RECOMMENDATIONS_CODOWNLOAD_TOP_N", self.top_n)
+        self.interval = app.config.get("RECOMMENDATIONS_CODOWNLOAD_INTERVAL", self.interval)
+        self.flush_interval = app.config.get("RECOMMENDATIONS_CODOWNLOAD_FLUSH_INTERVAL", self.flush_interval)
+
+        self.load()
+        register_events()
+
+        if self.flush_interval or self.interval:
+            self._worker.app = app
+            self._worker.start()
+
+    def _path(self):
+        return os.path.join(self.folder, self.FILE)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializa entre procesos recargar, sumar y guardar para que ningún lote pise a otro."""
+        if not self.folder:
+            yield
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, self.LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _prune(self, row):
+        if len(row) > self.top_n:
+            kept = sorted(row.items(), key=lambda item: (-item[1], item[0]))[: self.top_n]
+            row.clear()
+            row.update(kept)
+
+    def _add(self, neighbors, dataset_id, others):
+        row = neighbors.setdefault(dataset_id, {})
+        for other_id in others:
+            if other_id != dataset_id:
+                row[other_id] = row.get(other_id, 0) + 1
+        if len(row) > 2 * self.top_n:
+            self._prune(row)
+
+    def _baskets(self):
+        """Conjuntos de datasets descargados juntos, leídos por lotes y ordenados por cesta."""
+        key = basket_key().label("basket")
+        downloads = (
+            db.session.query(key, BaseDSDownloadRecord.dataset_id)
+            .filter(BaseDSDownloadRecord.dataset_id.isnot(None))
+            .order_by(key)
+            .yield_per(self.batch_size)
+        )
+        yield from _grouped(downloads)
+
+        carts = (
+            db.session.query(FoodDataset.shoppingcart_id, FoodDataset.id)
+            .filter(FoodDataset.shoppingcart_id.isnot(None))
+            .order_by(FoodDataset.shoppingcart_id)
+            .yield_per(self.batch_size)
+        )
+        yield from _grouped(carts)
+
+    def rebuild(self) -> int:
+        """Recalcula la matriz desde cero y la guarda. Devuelve el número de datasets con vecinos."""
+        last_id = db.session.query(func.max(BaseDSDownloadRecord.id)).scalar() or 0
+        neighbors = {}
+        for basket in self._baskets():
+            for dataset_id in basket:
+                self._add(neighbors, dataset_id, basket)
+        for row in neighbors.values():
+            self._prune(row)
+
+        with self._lock:
+            self.neighbors = neighbors
+            self.built = True
+            # Las descargas apuntadas que ya ha leído la reconstrucción no se vuelven a sumar
+            self._queued = {record_id for record_id in self._queued if record_id > last_id}
+        with self._file_lock(), self._lock:
+            self.save()
+        return len(neighbors)
+
+    def queue(self, record_ids):
+        """Apunta descargas recién confirmadas para el siguiente ``apply_queued``; no toca la BD ni el disco."""
+        if not self.built:
+            return
+        with self._lock:
+            self._queued.update(record_ids)
+
+    def _new_pairs(self, record_ids):
+        """``(dataset_id, otros)`` de cada primera descarga de un dataset en su cesta entre ``record_ids``.
+
+        Una sola consulta agrupada por cesta y dataset con el primer id de cada par: un dataset es nuevo
+        en la cesta si su primera descarga está en el lote, y se junta con los que se descargaron antes.
+        """
+        table = BaseDSDownloadRecord.__table__
+        queued = select(table.c.user_id, table.c.download_cookie).where(table.c.id.in_(record_ids)).subquery()
+        key = basket_key().label("basket")
+        rows = (
+            db.session.query(key, BaseDSDownloadRecord.dataset_id, func.min(BaseDSDownloadRecord.id))
+            .filter(
+                BaseDSDownloadRecord.dataset_id.isnot(None),
+                or_(
+                    BaseDSDownloadRecord.user_id.in_(select(queued.c.user_id).where(queued.c.user_id.isnot(None))),
+                    and_(
+                        BaseDSDownloadRecord.user_id.is_(None),
+                        BaseDSDownloadRecord.download_cookie.in_(
+                            select(queued.c.download_cookie).where(queued.c.user_id.is_(None))
+                        ),
+                    ),
+                ),
+            )
+            .group_by(key, BaseDSDownloadRecord.dataset_id)
+            .all()
+        )
+
+        baskets = {}
+        for basket, dataset_id, first_id in rows:
+            baskets.setdefault(basket, []).append((first_id, dataset_id))
+        for downloads in baskets.values():
+            downloads.sort()
+            for position, (first_id, dataset_id) in enumerate(downloads):
+                if first_id in record_ids and position:
+                    yield dataset_id, [other_id for _, other_id in downloads[:position]]
+
+    def apply_queued(self) -> int:
+        """Suma las descargas apuntadas y guarda la matriz una sola vez. Devuelve cuántas había."""
+        with self._lock:
+            queued, self._queued = self._queued, set()
+        if not queued:
+            return 0
+
+        ids = sorted(queued)
+        pairs = []
+        for start in range(0, len(ids), self.batch_size):
+            pairs.extend(self._new_pairs(set(ids[start : start + self.batch_size])))
+
+        if pairs:
+            with self._file_lock(), self._lock:
+                self._reload_if_changed()
+                for dataset_id, others in pairs:
+                    self._add(self.neighbors, dataset_id, others)
+                    for other_id in others:
+                        self._add(self.neighbors, other_id, (dataset_id,))
+                self.save()
+        return len(queued)
+
+    def _tick(self):
+        if self.interval and time.monotonic() - self._last_rebuild >= self.interval:
+            self.rebuild()
+            self._last_rebuild = time.monotonic()
+        else:
+            self.apply_queued()
+
+    def save(self):
+        """Guarda la matriz como tripletas ``(dataset, otro, veces)`` y la sustituye de forma atómica."""
+        with self._lock:
+            if not self.folder:
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            triplets = [
+                (row_id, other_id, count) for row_id, row in self.neighbors.items() for other_id, count in row.items()
+            ]
+            data = np.array(triplets, dtype=np.int64).reshape(-1, 3)
+
+            fd, tmp = tempfile.mkstemp(dir=self.folder, prefix=f"{self.FILE}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, dataset_id=data[:, 0], other_id=data[:, 1], count=data[:, 2])
+                os.replace(tmp, self._path())
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            self._loaded_mtime = os.path.getmtime(self._path())
+
+    def load(self) -> bool:
+        """Carga la matriz guardada. Devuelve False si todavía no se ha construido nunca."""
+        if not self.folder or not os.path.exists(self._path()):
+            return False
+
+        try:
+            with self._lock:
+                mtime = os.path.getmtime(self._path())
+                with np.load(self._path()) as data:
+                    neighbors = {}
+                    for row_id, other_id, count in zip(
+                        data["dataset_id"].tolist(), data["other_id"].tolist(), data["count"].tolist()
+                    ):
+                        neighbors.setdefault(row_id, {})[other_id] = count
+                self.neighbors = neighbors
+                self.built = True
+                self._loaded_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading co-download matrix from {self.folder}: {e}")
+            return False
+
+        logger.info(f"Loaded co-download matrix with {len(self.neighbors)} datasets")
+        return True
+
+    def _reload_if_changed(self):
+        """Otro proceso (el comando o un worker) puede haber guardado una versión más nueva."""
+        try:
+            mtime = os.path.getmtime(self._path())
+        except (OSError, TypeError):
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def also_downloaded(self, dataset_id, limit=5):
+        """``[(dataset_id, veces), ...]`` de los más descargados junto a ``dataset_id``."""
+        with self._lock:
+            self._reload_if_changed()
+            row = self.neighbors.get(dataset_id, {})
+            return sorted(row.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def scores(self, dataset_id, candidate_ids):
+        """Co-descargas de cada candidato con ``dataset_id``, divididas por el máximo de la fila."""
+        with self._lock:
+            self._reload_if_changed()
+            row = self.neighbors.get(dataset_id)
+            if not row:
+                return np.zeros(len(candidate_ids))
+            counts = np.array([row.get(candidate_id, 0) for candidate_id in candidate_ids], dtype=float)
+            return counts / max(row.values())
+
+    def matrix(self, position):
+        """Matriz dispersa ``n x n`` de ``scores`` para los datasets de ``{dataset_id: posición}``."""
+        rows, columns, values = [], [], []
+        with self._lock:
+            self._reload_if_changed()
+            for dataset_id, row in self.neighbors.items():
+                if dataset_id not in position or not row:
+                    continue
+                top = max(row.values())
+                for other_id, count in row.items():
+                    if other_id in position:
+                        rows.append(position[dataset_id])
+                        columns.append(position[other_id])
+                        values.append(count / top)
+        return sparse.csr_matrix(
+            (np.array(values, dtype=np.float32), (rows, columns)), shape=(len(position), len(position))
+        )
+
+
+co_download_index = CoDownloadIndex()
+
+
+def collect_new_downloads(session, changes):
+    return {record.id for record in changes.new if record.dataset_id}
+
+
+def queue_new_downloads(record_ids):
+    co_download_index.queue(record_ids)
+
+
+def register_events():
+    session_events.subscribe(
+        "co_downloads",
+        models=(BaseDSDownloadRecord,),
+        fields=(),
+        on_flush=collect_new_downloads,
+        on_commit=queue_new_downloads,
+    )
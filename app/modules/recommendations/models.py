@@ -0,0 +1,21 @@
+from app import db
+
+
+class RelatedDataset(db.Model):
+    """Top-k de datasets relacionados, precalculado por ``rosemary recommendations:related``.
+
+    La página de un dataset lee sus filas por clave primaria ``(dataset_id, rank)`` en lugar de
+    puntuar candidatos en cada visita.
+    """
+
+    __tablename__ = "related_dataset"
+
+    dataset_id = db.Column(db.Integer, db.ForeignKey("food_dataset.id", ondelete="CASCADE"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    related_dataset_id = db.Column(
+        db.Integer, db.ForeignKey("food_dataset.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<RelatedDataset {self.dataset_id} #{self.rank} -> {self.related_dataset_id}>"
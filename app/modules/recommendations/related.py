@@ -0,0 +1,363 @@
+import logging
+import time
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import insert
+
+from app import db
+from app.modules.basedataset.models import BaseAuthor, BaseDSMetrics
+from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData, dataset_tag
+from app.modules.recommendations.co_downloads import co_download_index
+from app.modules.recommendations.models import RelatedDataset
+from app.modules.recommendations.similarities import metric_value, score_weights
+from app.modules.recommendations.text_model import tfidf_model
+from core.events.session_events import session_events
+from core.events.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value) -> str:
+    return (value or "").strip().lower()
+
+
+def _incidence(rows_of_keys, columns):
+    """Matriz dispersa binaria filas x claves (tags o autores); ``columns`` asigna y recuerda cada clave."""
+    indices, indptr = [], [0]
+    for keys in rows_of_keys:
+        indices.extend(columns.setdefault(key, len(columns)) for key in keys)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(rows_of_keys), max(len(columns), 1)))
+
+
+def _stack(top, bottom):
+    """Une dos matrices dispersas por filas, ensanchando la de menos columnas (claves nuevas)."""
+    width = max(top.shape[1], bottom.shape[1])
+    top = top.copy()
+    top.resize((top.shape[0], width))
+    bottom.resize((bottom.shape[0], width))
+    return sparse.vstack([top, bottom], format="csr")
+
+
+class Catalog:
+    """Todo lo necesario para puntuar el catálogo completo, cargado con cuatro consultas.
+
+    Las co-descargas se leen de ``co_download_index``, que ya está en memoria. ``append`` añade
+    datasets nuevos sin volver a leer los que ya están; los cambios de estos se ven al reconstruirlo.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.position = {}
+        self._tag_columns, self._author_columns, self._types = {}, {}, {}
+        self.tags = sparse.csr_matrix((0, 1), dtype=np.float32)
+        self.authors = sparse.csr_matrix((0, 1), dtype=np.float32)
+        self.has_keys = np.zeros(0, dtype=bool)
+        self.publication_types = np.zeros(0, dtype=np.int64)
+        self.metrics = np.zeros(0, dtype=np.float32)
+        self.text = sparse.csr_matrix((0, 1), dtype=np.float32)
+        self.co_downloads = sparse.csr_matrix((0, 0), dtype=np.float32)
+
+        if not tfidf_model.fitted:
+            tfidf_model.refit()
+        self.vectorizer = tfidf_model.vectorizer
+        self.append()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, dataset_ids=None) -> int:
+        """Carga los datasets dados (todos si es ``None``) al final del catálogo. Devuelve cuántos."""
+        query = (
+            db.session.query(
+                FoodDataset.id,
+                FoodDSMetaData.id.label("metadata_id"),
+                FoodDSMetaData.title,
+                FoodDSMetaData.description,
+                FoodDSMetaData.tags,
+                FoodDSMetaData.publication_type,
+                BaseDSMetrics.number_of_models,
+                BaseDSMetrics.number_of_features,
+            )
+            .join(FoodDSMetaData, FoodDataset.ds_meta_data)
+            .outerjoin(BaseDSMetrics, BaseDSMetrics.id == FoodDSMetaData.ds_metrics_id)
+        )
+        tag_query = db.session.query(dataset_tag.c.dataset_id, dataset_tag.c.tag_id)
+        if dataset_ids is not None:
+            query = query.filter(FoodDataset.id.in_(dataset_ids))
+            tag_query = tag_query.filter(dataset_tag.c.dataset_id.in_(dataset_ids))
+        rows = query.order_by(FoodDataset.id).all()
+        if not rows:
+            return 0
+
+        author_query = db.session.query(BaseAuthor.food_ds_meta_data_id, BaseAuthor.name).filter(
+            BaseAuthor.food_ds_meta_data_id.isnot(None)
+        )
+        if dataset_ids is not None:
+            author_query = author_query.filter(BaseAuthor.food_ds_meta_data_id.in_([row.metadata_id for row in rows]))
+        authors = {}
+        for metadata_id, name in author_query:
+            # Cada metadato tiene sus propias filas de autor: la misma persona se reconoce por el nombre
+            authors.setdefault(metadata_id, set()).add(_normalize(name))
+
+        dataset_tags = {}
+        for dataset_id, tag_id in tag_query:
+            dataset_tags.setdefault(dataset_id, set()).add(tag_id)
+
+        start = len(self.ids)
+        self.ids = np.concatenate([self.ids, np.array([row.id for row in rows], dtype=np.int64)])
+        self.position.update((row.id, start + offset) for offset, row in enumerate(rows))
+
+        tags = [dataset_tags.get(row.id, set()) for row in rows]
+        author_sets = [authors.get(row.metadata_id, set()) for row in rows]
+        self.tags = _stack(self.tags, _incidence(tags, self._tag_columns))
+        self.authors = _stack(self.authors, _incidence(author_sets, self._author_columns))
+        self.has_keys = np.concatenate([self.has_keys, [bool(t or a) for t, a in zip(tags, author_sets)]])
+
+        self.publication_types = np.concatenate(
+            [
+                self.publication_types,
+                np.array([self._types.setdefault(row.publication_type, len(self._types)) for row in rows]),
+            ]
+        ).astype(np.int64)
+        self.metrics = np.concatenate(
+            [
+                self.metrics,
+                np.array([metric_value(row.number_of_models, row.number_of_features) for row in rows], np.float32),
+            ]
+        )
+
+        text = tfidf_model.vectors([_TextRow(row) for row in rows]) if self.vectorizer is not None else None
+        text = (
+            text.astype(np.float32).tocsr() if text is not None else sparse.csr_matrix((len(rows), 1), dtype=np.float32)
+        )
+        self.text = _stack(self.text, text) if start else text
+        self.co_downloads = co_download_index.matrix(self.position)
+        return len(rows)
+
+    @property
+    def current(self) -> bool:
+        """False si el modelo TF-IDF se ha reajustado: las filas de texto ya no son comparables."""
+        return self.vectorizer is tfidf_model.vectorizer
+
+    def row_scores(self, row, columns=None):
+        """``(columnas, puntuaciones)`` de los candidatos de una fila, con los pesos de ``SimilarityService``.
+
+        Solo son candidatos los que comparten tag o autor o se han descargado juntos, salvo para
+        datasets sin tags ni autores; el propio dataset nunca lo es. Todo son productos dispersos de
+        una fila: nada ocupa más que el número de candidatos.
+        """
+        shared_authors = (self.authors[row] @ self.authors.T).indices
+        co_downloads = self.co_downloads[row]
+        if self.has_keys[row]:
+            candidates = np.union1d(
+                np.union1d(shared_authors, (self.tags[row] @ self.tags.T).indices), co_downloads.indices
+            )
+        else:
+            candidates = np.arange(len(self))
+        if columns is not None:
+            candidates = np.intersect1d(candidates, columns)
+        candidates = candidates[candidates != row].astype(np.int64)
+
+        # Las filas TF-IDF ya están normalizadas: el producto escalar es el coseno
+        text = (self.text[row] @ self.text[candidates].T).toarray().ravel()
+        weights = score_weights()
+        scores = (
+            weights["author"] * np.isin(candidates, shared_authors)
+            + weights["publication_type"] * (self.publication_types[candidates] == self.publication_types[row])
+            + weights["text"] * text
+            + weights["metric"] * self.metrics[candidates]
+            + weights["codownload"] * co_downloads[:, candidates].toarray().ravel()
+        ).astype(np.float32)
+        return candidates, scores
+
+    def top_k(self, rows, k):
+        """``[(dataset_id, [(related_id, score), ...]), ...]`` para las filas dadas, fila a fila."""
+        result = []
+        for row in rows:
+            columns, scores = self.row_scores(row)
+            if len(scores) > k:
+                best = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+                columns, scores = columns[best], scores[best]
+            ranked = np.argsort(-scores, kind="stable")
+            result.append((int(self.ids[row]), [(int(self.ids[columns[i]]), float(scores[i])) for i in ranked]))
+        return result
+
+    def touching(self, positions):
+        """Filas que pueden tener de candidato a alguno de ``positions``.
+
+        Son las que comparten tag, autor o co-descarga con ellos y las que no tienen tags ni autores.
+        """
+        touched = np.union1d(
+            (self.authors[positions] @ self.authors.T).indices, (self.tags[positions] @ self.tags.T).indices
+        )
+        touched = np.union1d(touched, self.co_downloads[:, positions].tocoo().row)
+        return np.union1d(touched, np.flatnonzero(~self.has_keys)).astype(np.int64)
+
+
+class _TextRow:
+    """Adaptador para ``tfidf_model.vectors``: id de metadatos y campos de texto."""
+
+    def __init__(self, row):
+        self.id = row.metadata_id
+        self.title = row.title
+        self.description = row.description
+        self.tags = row.tags
+
+
+class RelatedDatasetsJob:
+    """Calcula y guarda en ``related_dataset`` el top-k de relacionados de cada dataset.
+
+    ``rebuild`` recarga el catálogo y recalcula todas las filas; ``update_new`` añade al catálogo
+    ya cargado los datasets nuevos, calcula los que aún no tienen filas y corrige el top-k de los que
+    ahora deberían incluirlos. En la app, un hilo lanza ``update_new`` tras cada commit que crea
+    datasets y, si se configura ``RECOMMENDATIONS_RELATED_INTERVAL``, un ``rebuild`` periódico.
+    """
+
+    def __init__(self, k=10, interval=0):
+        self.k = k
+        self.interval = interval
+        self.in_process = False
+        self.app = None
+
+        self._catalog = None
+        self._last_rebuild = time.monotonic()
+        self._worker = BackgroundWorker("related-datasets", self._tick, interval=lambda: self.interval)
+
+    def init_app(self, app):
+        self.app = app
+        self.k = app.config.get("RECOMMENDATIONS_RELATED_K", self.k)
+        self.interval = app.config.get("RECOMMENDATIONS_RELATED_INTERVAL", self.interval)
+
+        # La última app configurada manda: un hilo arrancado por otra app se queda parado
+        self.in_process = app.config.get("RECOMMENDATIONS_RELATED_IN_PROCESS", False)
+
+        register_events()
+        if self.in_process:
+            self._worker.app = app
+            self._worker.start()
+
+    def notify(self):
+        if self.in_process and self._worker.running:
+            self._worker.wake()
+
+    def _write(self, ranked, replace_all=False):
+        if replace_all:
+            db.session.query(RelatedDataset).delete(synchronize_session=False)
+        else:
+            dataset_ids = [dataset_id for dataset_id, _ in ranked]
+            for start in range(0, len(dataset_ids), 500):
+                db.session.query(RelatedDataset).filter(
+                    RelatedDataset.dataset_id.in_(dataset_ids[start : start + 500])
+                ).delete(synchronize_session=False)
+
+        values = [
+            {"dataset_id": dataset_id, "rank": rank, "related_dataset_id": related_id, "score": score}
+            for dataset_id, related in ranked
+            for rank, (related_id, score) in enumerate(related, start=1)
+        ]
+        if values:
+            db.session.execute(insert(RelatedDataset), values)
+
+    def catalog(self):
+        """El catálogo cargado, con los datasets creados desde entonces añadidos al final.
+
+        Se vuelve a leer entero si se ha borrado algún dataset o se ha reajustado el modelo TF-IDF.
+        """
+        dataset_ids = {dataset_id for (dataset_id,) in db.session.query(FoodDataset.id)}
+        catalog = self._catalog
+        if (
+            catalog is None
+            or not catalog.current
+            or any(dataset_id not in dataset_ids for dataset_id in catalog.position)
+        ):
+            catalog = self._catalog = Catalog()
+        elif len(dataset_ids) > len(catalog):
+            catalog.append(sorted(dataset_ids - catalog.position.keys()))
+        return catalog
+
+    def rebuild(self) -> int:
+        """Recalcula el top-k de todo el catálogo. Devuelve el número de datasets procesados."""
+        catalog = self._catalog = Catalog()
+        ranked = catalog.top_k(range(len(catalog)), self.k)
+
+        try:
+            self._write(ranked, replace_all=True)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(ranked)
+
+    def update_new(self) -> int:
+        """Calcula solo los datasets sin relacionados guardados. Devuelve cuántos había."""
+        computed = {dataset_id for (dataset_id,) in db.session.query(RelatedDataset.dataset_id).distinct()}
+        catalog = self.catalog()
+        new_positions = np.array(
+            [position for dataset_id, position in catalog.position.items() if dataset_id not in computed],
+            dtype=np.int64,
+        )
+        if len(new_positions) == 0:
+            return 0
+
+        ranked = catalog.top_k(new_positions, self.k)
+
+        # Datasets ya calculados en cuyo top-k entra alguno de los nuevos: solo se mira a los que
+        # pueden tenerlos como candidatos, y cada uno fila a fila contra los nuevos
+        current = dict(
+            db.session.query(RelatedDataset.dataset_id, db.func.min(RelatedDataset.score))
+            .group_by(RelatedDataset.dataset_id)
+            .having(db.func.count() >= self.k)
+            .all()
+        )
+        affected = []
+        for row in catalog.touching(new_positions).tolist():
+            dataset_id = int(catalog.ids[row])
+            if dataset_id not in computed:
+                continue
+            _, scores = catalog.row_scores(row, new_positions)
+            if len(scores) and scores.max() > current.get(dataset_id, -np.inf):
+                affected.append(row)
+        ranked.extend(catalog.top_k(affected, self.k))
+
+        try:
+            self._write(ranked)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        logger.info(f"Computed related datasets for {len(new_positions)} new and {len(affected)} existing datasets")
+        return len(new_positions)
+
+    def _tick(self):
+        if not self.in_process:
+            return
+        if self.interval and time.monotonic() - self._last_rebuild >= self.interval:
+            self.rebuild()
+            self._last_rebuild = time.monotonic()
+        else:
+            self.update_new()
+
+
+related_datasets_job = RelatedDatasetsJob()
+
+
+def collect_new_datasets(session, changes):
+    return {dataset.id for dataset in changes.new}
+
+
+def notify_new_datasets(dataset_ids):
+    # El hilo calcula todos los datasets que aún no tienen filas, no hace falta pasarle cuáles
+    related_datasets_job.notify()
+
+
+def register_events():
+    session_events.subscribe(
+        "related_datasets",
+        models=(FoodDataset,),
+        fields=(),
+        on_flush=collect_new_datasets,
+        on_commit=notify_new_datasets,
+    )
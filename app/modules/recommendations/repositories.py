@@ -0,0 +1,18 @@
+from app.modules.fooddataset.models import FoodDataset
+from app.modules.recommendations.models import RelatedDataset
+from core.repositories.BaseRepository import BaseRepository
+
+
+class RelatedDatasetRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(RelatedDataset)
+
+    def get_related_datasets(self, dataset_id, limit=10):
+        """Relacionados precalculados, en orden, con una sola consulta sobre la clave primaria."""
+        return (
+            FoodDataset.query.join(RelatedDataset, RelatedDataset.related_dataset_id == FoodDataset.id)
+            .filter(RelatedDataset.dataset_id == dataset_id)
+            .order_by(RelatedDataset.rank)
+            .limit(limit)
+            .all()
+        )
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from flask import abort, current_app, jsonify, request, url_for
+
+from app.modules.fooddataset.models import FoodDataset
+from app.modules.recommendations import recommendations_bp
+from app.modules.recommendations.services import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+def to_related_card(dataset):
+    """Lo que pinta cada enlace de los paneles de relacionados."""
+    meta = dataset.ds_meta_data
+    return {
+        "id": dataset.id,
+        "title": meta.title,
+        "url": url_for("basedataset.subdomain_index", doi=meta.dataset_doi) if meta.dataset_doi else None,
+        "created_at": dataset.created_at.strftime("%B %d, %Y"),
+        "publication_type": dataset.get_cleaned_publication_type(),
+    }
+
+
+@recommendations_bp.route("/dataset/<int:dataset_id>/related", methods=["GET"])
+def related_datasets(dataset_id):
+    """Relacionados y "también descargados" de un dataset, pedidos por la página tras cargarse."""
+    dataset = FoodDataset.query.get(dataset_id)
+    if not dataset:
+        abort(404)
+    limit = min(max(request.args.get("limit", 5, type=int), 1), 20)
+
+    started = time.perf_counter()
+    related = RecommendationService.get_related_food_datasets(dataset, limit=limit)
+    related_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    also_downloaded = RecommendationService.get_also_downloaded(dataset, limit=limit)
+    also_downloaded_ms = (time.perf_counter() - started) * 1000
+
+    logger.info(
+        f"Recommendations for dataset {dataset_id}: {len(related)} related in {related_ms:.1f}ms, "
+        f"{len(also_downloaded)} also downloaded in {also_downloaded_ms:.1f}ms"
+    )
+
+    response = jsonify(
+        {
+            "dataset_id": dataset_id,
+            "related": [to_related_card(ds) for ds in related],
+            "also_downloaded": [to_related_card(ds) for ds in also_downloaded],
+        }
+    )
+    response.headers["Server-Timing"] = f"related;dur={related_ms:.1f}, also_downloaded;dur={also_downloaded_ms:.1f}"
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get("RECOMMENDATIONS_CACHE_MAX_AGE", 60)
+    response.add_etag()
+    return response.make_conditional(request)
@@ -1,10 +1,13 @@
 import logging
 
-from sqlalchemy import func, or_
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
 
 from app import db
 from app.modules.basedataset.models import BaseAuthor
-from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData, dataset_tag, normalize_tags
+from app.modules.recommendations.co_downloads import co_download_index
+from app.modules.recommendations.repositories import RelatedDatasetRepository
 from app.modules.recommendations.similarities import SimilarityService
 
 logger = logging.getLogger(__name__)
@@ -14,60 +17,60 @@ class RecommendationService:
 
     @staticmethod
     def get_related_food_datasets(dataset: FoodDataset, limit: int = 5):
+        """Relacionados precalculados en ``related_dataset``; si aún no los hay, se calculan al vuelo."""
+        related = RelatedDatasetRepository().get_related_datasets(dataset.id, limit=limit)
+        if related:
+            return related
+        return RecommendationService.compute_related_food_datasets(dataset, limit=limit)
 
-        ds_meta = dataset.ds_meta_data
+    @staticmethod
+    def get_also_downloaded(dataset: FoodDataset, limit: int = 5):
+        """Los datasets que más se han descargado (o llevado al carrito) junto a ``dataset``."""
+        ranked = [dataset_id for dataset_id, _ in co_download_index.also_downloaded(dataset.id, limit=limit)]
+        if not ranked:
+            return []
+        datasets = {
+            ds.id: ds
+            for ds in FoodDataset.query.options(joinedload(FoodDataset.ds_meta_data)).filter(FoodDataset.id.in_(ranked))
+        }
+        return [datasets[dataset_id] for dataset_id in ranked if dataset_id in datasets]
 
-        print(f"\n[DEBUG] Base Dataset ID: {dataset.id}")
-        print(f"[DEBUG] Base Dataset Title: {ds_meta.title}")
-        print(f"[DEBUG] Base Dataset Tags: {ds_meta.tags}")
-        print(f"[DEBUG] Base Dataset Authors: {[a.id for a in ds_meta.authors]}")
+    @staticmethod
+    def compute_related_food_datasets(dataset: FoodDataset, limit: int = 5):
 
-        tags = ds_meta.tags.split(",") if ds_meta.tags else []
-        author_ids = [author.id for author in ds_meta.authors] if ds_meta.authors else []
+        ds_meta = dataset.ds_meta_data
 
         query = db.session.query(FoodDataset).filter(FoodDataset.id != dataset.id)
 
-        has_tags = bool(tags)
-        has_authors = bool(author_ids)
+        # Comparten algún tag: igualdad sobre dataset_tag (indexada) en lugar de LIKE '%tag%'
+        tag_condition = None
+        if normalize_tags(ds_meta.tags):
+            base_tag_ids = select(dataset_tag.c.tag_id).where(dataset_tag.c.dataset_id == dataset.id)
+            tag_condition = FoodDataset.id.in_(
+                select(dataset_tag.c.dataset_id).where(dataset_tag.c.tag_id.in_(base_tag_ids))
+            )
+
+        author_names = [author.name.strip() for author in ds_meta.authors] if ds_meta.authors else []
 
-        tag_condition = (
-            or_(*[func.lower(FoodDSMetaData.tags).like(f"%{tag.strip().lower()}%") for tag in tags])
-            if has_tags
+        author_condition = (
+            FoodDataset.ds_meta_data.has(FoodDSMetaData.authors.any(BaseAuthor.name.in_(author_names)))
+            if author_names
             else None
         )
 
-        author_names = [author.name.strip() for author in ds_meta.authors] if ds_meta.authors else []
-
-        author_condition = BaseAuthor.name.in_(author_names) if author_names else None
+        # Descargados junto a este: son candidatos aunque no compartan tags ni autores
+        co_downloaded = [dataset_id for dataset_id, _ in co_download_index.also_downloaded(dataset.id, limit=50)]
+        co_download_condition = FoodDataset.id.in_(co_downloaded) if co_downloaded else None
 
-        if has_tags and has_authors:
-            query = (
-                query.join(FoodDSMetaData, FoodDataset.ds_meta_data)
-                .join(FoodDSMetaData.authors)
-                .filter(or_(tag_condition, author_condition))
-            )
-        elif has_tags:
-            query = query.join(FoodDSMetaData, FoodDataset.ds_meta_data).filter(tag_condition)
-        elif has_authors:
-            query = (
-                query.join(FoodDSMetaData, FoodDataset.ds_meta_data)
-                .join(FoodDSMetaData.authors)
-                .filter(author_condition)
-            )
+        conditions = [
+            condition for condition in (tag_condition, author_condition, co_download_condition) if condition is not None
+        ]
+        if conditions:
+            query = query.filter(or_(*conditions))
         else:
             logger.info("BaseDataset sin tags ni autores para recomendaciones")
 
-        candidates = query.distinct(FoodDataset.id).limit(50).all()
-
-        print(f"[DEBUG] Candidate IDs: {[c.id for c in candidates]}")
-        for c in candidates:
-            meta = c.ds_meta_data
-            print(
-                f"[DEBUG] Candidate ID {c.id}, "
-                f"Title: {meta.title}, "
-                f"Tags: {meta.tags}, "
-                f"Authors: {[a.id for a in meta.authors]}"
-            )
+        candidates = query.options(joinedload(FoodDataset.ds_meta_data)).limit(50).all()
 
         if not candidates:
             return []
@@ -75,7 +78,5 @@ class RecommendationService:
         similarity_service = SimilarityService(dataset, candidates)
         ranked = similarity_service.recommendation(n_top_datasets=limit)
 
-        top_datasets = [ds for ds, score in ranked]
-        for ds, score in ranked:
-            print(f"[DEBUG] Ranked Dataset ID {ds.id}, Score: {score}")
-        return top_datasets
+        logger.debug(f"Dataset {dataset.id}: {len(candidates)} candidates, top {[ds.id for ds, _ in ranked]}")
+        return [ds for ds, _ in ranked]
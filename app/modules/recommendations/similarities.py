@@ -1,30 +1,145 @@
+import numpy as np
+from flask import current_app, has_app_context
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from app import db
+from app.modules.basedataset.models import BaseAuthor, BaseDSMetrics
+from app.modules.fooddataset.models import FoodDSMetaData
+from app.modules.recommendations.co_downloads import co_download_index
+from app.modules.recommendations.text_model import tfidf_model
+
+# Peso de cada componente en la puntuación final (configurable con RECOMMENDATIONS_WEIGHT_<COMPONENTE>).
+# Suman 1 para que la puntuación quede en [0, 1]; las co-descargas se llevan 0.1 y el resto conserva su proporción.
+SCORE_WEIGHTS = {"author": 0.18, "publication_type": 0.135, "text": 0.405, "metric": 0.18, "codownload": 0.1}
+
+
+def score_weights() -> dict:
+    if not has_app_context():
+        return dict(SCORE_WEIGHTS)
+    return {
+        name: float(current_app.config.get(f"RECOMMENDATIONS_WEIGHT_{name.upper()}", default))
+        for name, default in SCORE_WEIGHTS.items()
+    }
+
+
+def metric_value(number_of_models, number_of_features) -> float:
+    return min((int(number_of_models or 0) + int(number_of_features or 0)) / 100.0, 1.0)
 
 
 class SimilarityService:
+    """Puntúa los candidatos frente al dataset base, todos a la vez.
+
+    Cada componente (autor, tipo de publicación, texto, métricas y co-descargas) es un array con
+    una posición por candidato; autores, tipos y métricas salen de dos consultas sobre todos los
+    metadatos y las co-descargas de ``co_download_index``.
+    """
 
-    def __init__(self, base_dataset, candidate_datasets):
+    def __init__(self, base_dataset, candidate_datasets, weights=None, components=None):
         self.base = base_dataset
         self.candidates = candidate_datasets
+        self.weights = weights or score_weights()
+        self.components = components or self.load_components([base_dataset] + candidate_datasets)
         self._build_text_matrix()
+        self._build_scores()
+
+    @staticmethod
+    def load_components(datasets):
+        """Autores, tipo de publicación y métrica de cada metadato: una consulta para autores y otra para el resto."""
+        metadata_ids = [ds.ds_meta_data_id for ds in datasets]
+
+        authors = {}
+        for metadata_id, author_id in db.session.query(BaseAuthor.food_ds_meta_data_id, BaseAuthor.id).filter(
+            BaseAuthor.food_ds_meta_data_id.in_(metadata_ids)
+        ):
+            authors.setdefault(metadata_id, set()).add(author_id)
+
+        publication_types, metrics = {}, {}
+        for metadata_id, publication_type, number_of_models, number_of_features in (
+            db.session.query(
+                FoodDSMetaData.id,
+                FoodDSMetaData.publication_type,
+                BaseDSMetrics.number_of_models,
+                BaseDSMetrics.number_of_features,
+            )
+            .outerjoin(BaseDSMetrics, BaseDSMetrics.id == FoodDSMetaData.ds_metrics_id)
+            .filter(FoodDSMetaData.id.in_(metadata_ids))
+        ):
+            publication_types[metadata_id] = publication_type
+            metrics[metadata_id] = metric_value(number_of_models, number_of_features)
+
+        return {"authors": authors, "publication_types": publication_types, "metrics": metrics}
+
+    @staticmethod
+    def components_from_datasets(datasets):
+        """Los mismos componentes leídos de objetos ya cargados en memoria."""
+        components = {"authors": {}, "publication_types": {}, "metrics": {}}
+        for ds in datasets:
+            meta = ds.ds_meta_data
+            metrics = meta.ds_metrics
+            components["authors"][ds.ds_meta_data_id] = {author.id for author in meta.authors}
+            components["publication_types"][ds.ds_meta_data_id] = meta.publication_type
+            components["metrics"][ds.ds_meta_data_id] = (
+                metric_value(metrics.number_of_models, metrics.number_of_features) if metrics else 0.0
+            )
+        return components
 
     def _build_text_matrix(self):
         self.all_datasets = [self.base] + self.candidates
 
-        text = []
-        for ds in self.all_datasets:
-            meta = ds.ds_meta_data
+        # Con el modelo del catálogo cargado solo se leen filas; si aún no se ha ajustado, se ajusta aquí
+        self.tfidf_matrix = tfidf_model.vectors([ds.ds_meta_data for ds in self.all_datasets])
+        if self.tfidf_matrix is None:
+            text = []
+            for ds in self.all_datasets:
+                meta = ds.ds_meta_data
 
-            title = getattr(meta, "title", "")
-            description = getattr(meta, "description", "")
-            tags = getattr(meta, "tags", "")
+                title = getattr(meta, "title", "")
+                description = getattr(meta, "description", "")
+                tags = getattr(meta, "tags", "")
 
-            text.append(f"{title} {description} {tags}")
+                text.append(f"{title} {description} {tags}")
 
-        self.vectorizer = TfidfVectorizer(max_features=5000)
+            self.tfidf_matrix = TfidfVectorizer(max_features=5000).fit_transform(text)
 
-        self.tfidf_matrix = self.vectorizer.fit_transform(text)
+    def _build_scores(self):
+        base_id = self.base.ds_meta_data_id
+        candidate_ids = [ds.ds_meta_data_id for ds in self.candidates]
+        authors = self.components["authors"]
+        publication_types = self.components["publication_types"]
+        metrics = self.components["metrics"]
+
+        # Autores: pares (candidato, autor) aplanados y comprobados contra los del base de una vez
+        positions = np.array(
+            [position for position, metadata_id in enumerate(candidate_ids) for _ in authors.get(metadata_id, ())],
+            dtype=np.int64,
+        )
+        author_ids = np.array(
+            [author_id for metadata_id in candidate_ids for author_id in authors.get(metadata_id, ())], dtype=np.int64
+        )
+        shared = np.isin(author_ids, list(authors.get(base_id, ())))
+        self.author_scores = (np.bincount(positions[shared], minlength=len(candidate_ids)) > 0).astype(float)
+
+        base_type = publication_types.get(base_id)
+        self.publication_type_scores = np.array(
+            [publication_types.get(metadata_id) == base_type for metadata_id in candidate_ids], dtype=float
+        )
+        self.metric_scores = np.array([metrics.get(metadata_id, 0.0) for metadata_id in candidate_ids], dtype=float)
+
+        # Filas TF-IDF normalizadas: el producto escalar es el coseno
+        if self.candidates:
+            self.text_scores = np.asarray((self.tfidf_matrix[0] @ self.tfidf_matrix[1:].T).todense()).ravel()
+        else:
+            self.text_scores = np.zeros(0)
+
+        self.codownload_scores = co_download_index.scores(self.base.id, [ds.id for ds in self.candidates])
+
+        self.scores = (
+            self.weights["author"] * self.author_scores
+            + self.weights["publication_type"] * self.publication_type_scores
+            + self.weights["text"] * self.text_scores
+            + self.weights["metric"] * self.metric_scores
+            + self.weights.get("codownload", 0.0) * self.codownload_scores
+        )
 
     @staticmethod
     def author_similarity(ds1, ds2):
@@ -43,7 +158,7 @@ class SimilarityService:
         return 1.0 if type_1 == type_2 else 0.0
 
     def text_similarity(self, candidate_dataset_index):
-        return cosine_similarity(self.tfidf_matrix[0], self.tfidf_matrix[candidate_dataset_index + 1])[0][0]
+        return float(self.text_scores[candidate_dataset_index])
 
     @staticmethod
     def metric_score(candidate_dataset):
@@ -51,31 +166,17 @@ class SimilarityService:
         if not metrics:
             return 0.0
 
-        total_models = int(metrics.number_of_models or 0)
-        total_features = int(metrics.number_of_features or 0)
-
-        return min((total_models + total_features) / 100.0, 1.0)
+        return metric_value(metrics.number_of_models, metrics.number_of_features)
 
     def final_score(self, candidate_ds_index):
-        fixed_ds = self.base
-        candidate_ds = self.candidates[candidate_ds_index]
-
-        author_score = self.author_similarity(fixed_ds, candidate_ds)
-        publication_type_score = self.publication_type_similarity(fixed_ds, candidate_ds)
-        text_similarity_score = self.text_similarity(candidate_ds_index)
-        metric_score = self.metric_score(candidate_ds)
-
-        final_score = (
-            0.2 * author_score + 0.15 * publication_type_score + 0.45 * text_similarity_score + 0.2 * metric_score
-        )
-
-        return final_score
+        return float(self.scores[candidate_ds_index])
 
     def recommendation(self, n_top_datasets=5):
-        candidates_scores = []
-        for index, candidate_dataset in enumerate(self.candidates):
-            score = self.final_score(index)
-            candidates_scores.append((candidate_dataset, score))
-
-        candidates_scores.sort(key=lambda x: x[1], reverse=True)
-        return candidates_scores[:n_top_datasets]
+        n_top_datasets = min(n_top_datasets, len(self.candidates))
+        if n_top_datasets <= 0:
+            return []
+
+        # Solo se ordenan los k mejores; el orden entre empates respeta el de los candidatos
+        top = np.argpartition(-self.scores, n_top_datasets - 1)[:n_top_datasets]
+        top = top[np.lexsort((top, -self.scores[top]))]
+        return [(self.candidates[index], float(self.scores[index])) for index in top]
@@ -0,0 +1,88 @@
+"""Micro-benchmark de SimilarityService: bucle por candidato frente a la puntuación vectorizada.
+
+    python -m app.modules.recommendations.tests.benchmark_similarity
+
+Usa datasets sintéticos en memoria, así que no mide las consultas perezosas que hacía el bucle
+por candidato (autores y métricas), solo el cálculo de las puntuaciones.
+"""
+
+import random
+import time
+from types import SimpleNamespace
+
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.modules.basedataset.models import BasePublicationType
+from app.modules.recommendations.similarities import SCORE_WEIGHTS, SimilarityService
+
+WORDS = "pasta rice salad soup vegan protein sugar fiber bread cheese fruit fish meat tomato olive".split()
+SIZES = (50, 500, 5000)
+REPEAT = 5
+
+
+def synthetic_dataset(index, rng):
+    authors = [SimpleNamespace(id=rng.randint(1, 200)) for _ in range(rng.randint(1, 3))]
+    meta = SimpleNamespace(
+        title=" ".join(rng.sample(WORDS, 3)),
+        description=" ".join(rng.choices(WORDS, k=20)),
+        tags=",".join(rng.sample(WORDS, 2)),
+        publication_type=rng.choice(list(BasePublicationType)[:4]),
+        authors=authors,
+        ds_metrics=SimpleNamespace(
+            number_of_models=str(rng.randint(0, 50)), number_of_features=str(rng.randint(0, 50))
+        ),
+    )
+    return SimpleNamespace(id=index, ds_meta_data_id=index, ds_meta_data=meta)
+
+
+def loop_recommendation(service, n_top_datasets=10):
+    """La implementación anterior: una llamada a ``cosine_similarity`` y a cada componente por candidato."""
+    scores = []
+    for index, candidate in enumerate(service.candidates):
+        score = (
+            SCORE_WEIGHTS["author"] * service.author_similarity(service.base, candidate)
+            + SCORE_WEIGHTS["publication_type"] * service.publication_type_similarity(service.base, candidate)
+            + SCORE_WEIGHTS["text"] * cosine_similarity(service.tfidf_matrix[0], service.tfidf_matrix[index + 1])[0][0]
+            + SCORE_WEIGHTS["metric"] * service.metric_score(candidate)
+        )
+        scores.append((candidate, score))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores[:n_top_datasets]
+
+
+def vectorized_recommendation(service, n_top_datasets=10):
+    service._build_scores()
+    return service.recommendation(n_top_datasets)
+
+
+def best_of(function, service):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function(service)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'candidates':>10} {'loop (ms)':>12} {'vectorized (ms)':>16} {'speedup':>9}")
+    for size in SIZES:
+        datasets = [synthetic_dataset(index, rng) for index in range(size + 1)]
+        service = SimilarityService(
+            datasets[0],
+            datasets[1:],
+            weights=dict(SCORE_WEIGHTS),
+            components=SimilarityService.components_from_datasets(datasets),
+        )
+
+        expected = [ds.id for ds, _ in loop_recommendation(service)]
+        assert [ds.id for ds, _ in vectorized_recommendation(service)][:3] == expected[:3]
+
+        loop = best_of(loop_recommendation, service)
+        vectorized = best_of(vectorized_recommendation, service)
+        print(f"{size:>10} {loop * 1000:>12.2f} {vectorized * 1000:>16.2f} {loop / vectorized:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
+import os
 import uuid
 from datetime import datetime, timezone
 
+import numpy as np
 import pytest
 
 from app import db
 from app.modules.auth.models import User
 from app.modules.basedataset.models import BaseAuthor, BaseDSMetrics, BasePublicationType
 from app.modules.fooddataset.models import FoodDataset, FoodDSMetaData
+from app.modules.fooddataset.repositories import FoodDatasetRepository
 from app.modules.recommendations.services import RecommendationService
 from app.modules.recommendations.similarities import SimilarityService
 
@@ -135,6 +138,10 @@ def user_with_datasets(test_client):
         db.session.add(cand3_dataset)
         db.session.flush()
 
+        # Tags normalizados, como hacen los servicios de creación y edición
+        for dataset in (base_dataset, cand1_dataset, cand2_dataset, cand3_dataset):
+            FoodDatasetRepository().sync_tags(dataset)
+
         db.session.commit()
 
         yield user, base_dataset, [cand1_dataset, cand2_dataset, cand3_dataset]
@@ -170,6 +177,28 @@ def test_similarity_service_completo(user_with_datasets):
     assert recs[0][0] == candidates[0]
 
 
+def test_similarity_service_vectorized_matches_per_candidate_scores(user_with_datasets):
+    from app.modules.recommendations.similarities import SCORE_WEIGHTS
+
+    _, base_ds, candidates = user_with_datasets
+    service = SimilarityService(base_ds, candidates)
+
+    for i, cand in enumerate(candidates):
+        expected = (
+            SCORE_WEIGHTS["author"] * service.author_similarity(base_ds, cand)
+            + SCORE_WEIGHTS["publication_type"] * service.publication_type_similarity(base_ds, cand)
+            + SCORE_WEIGHTS["text"] * service.text_similarity(i)
+            + SCORE_WEIGHTS["metric"] * service.metric_score(cand)
+        )
+        assert service.final_score(i) == pytest.approx(expected)
+
+    # Pesos configurables: solo el texto
+    text_only = SimilarityService(
+        base_ds, candidates, weights={"author": 0, "publication_type": 0, "text": 1, "metric": 0}
+    )
+    assert [score for _, score in text_only.recommendation(3)] == sorted(text_only.text_scores, reverse=True)
+
+
 # ---------------------------
 # Test RecommendationService
 # ---------------------------
@@ -192,3 +221,275 @@ def test_recommendation_service(user_with_datasets):
 
     # Al menos el candidato más relevante debería estar en la lista
     assert candidates[0] in related
+
+
+# ---------------------------
+# Test modelo TF-IDF del catálogo
+# ---------------------------
+
+
+@pytest.fixture
+def fitted_tfidf_model(user_with_datasets, tmp_path, monkeypatch):
+    from app.modules.recommendations.text_model import tfidf_model
+
+    monkeypatch.setattr(tfidf_model, "folder", str(tmp_path))
+    monkeypatch.setattr(tfidf_model, "vectorizer", None)
+    monkeypatch.setattr(tfidf_model, "matrix", None)
+    monkeypatch.setattr(tfidf_model, "rows", {})
+    monkeypatch.setattr(tfidf_model, "_loaded_mtime", None)
+    monkeypatch.setattr(tfidf_model, "_queued", set())
+
+    # Mismo contexto (y sesión) que los datasets del fixture
+    yield tfidf_model
+
+
+def test_tfidf_model_persists_and_reloads(user_with_datasets, fitted_tfidf_model, tmp_path):
+    from app.modules.recommendations.text_model import TfidfModel
+
+    _, base_ds, candidates = user_with_datasets
+    assert fitted_tfidf_model.refit() == FoodDSMetaData.query.count()
+
+    loaded = TfidfModel(folder=str(tmp_path))
+    assert loaded.load()
+
+    metadata = [base_ds.ds_meta_data] + [c.ds_meta_data for c in candidates]
+    expected = fitted_tfidf_model.vectors(metadata).toarray()
+    assert (loaded.vectors(metadata).toarray() == expected).all()
+
+
+def test_tfidf_model_updates_only_edited_row(user_with_datasets, fitted_tfidf_model, tmp_path):
+    from app.modules.recommendations.text_model import TfidfModel
+
+    _, base_ds, candidates = user_with_datasets
+    fitted_tfidf_model.refit()
+    vocabulary = dict(fitted_tfidf_model.vectorizer.vocabulary_)
+    before = fitted_tfidf_model.matrix.toarray()
+
+    candidates[1].ds_meta_data.title = "Base Dataset"
+    db.session.commit()
+
+    # El commit solo apunta la fila: el hilo la transforma y guarda en el siguiente lote
+    assert (fitted_tfidf_model.matrix.toarray() == before).all()
+    assert fitted_tfidf_model.apply_queued() == 1
+    assert fitted_tfidf_model.apply_queued() == 0
+
+    after = fitted_tfidf_model.matrix.toarray()
+    edited = fitted_tfidf_model.rows[candidates[1].ds_meta_data.id]
+    assert fitted_tfidf_model.vectorizer.vocabulary_ == vocabulary
+    assert (after[edited] != before[edited]).any()
+    assert (after[:edited] == before[:edited]).all() and (after[edited + 1 :] == before[edited + 1 :]).all()
+
+    loaded = TfidfModel(folder=str(tmp_path))
+    assert loaded.load()
+    assert (loaded.matrix.toarray() == after).all()
+
+    # Las recomendaciones usan las filas del modelo, no un ajuste por petición
+    service = SimilarityService(base_ds, candidates)
+    assert service.text_similarity(1) > 0
+
+
+# ---------------------------
+# Test relacionados precalculados
+# ---------------------------
+
+
+def test_related_datasets_rebuild_stores_top_k(user_with_datasets, fitted_tfidf_model):
+    from app.modules.recommendations.models import RelatedDataset
+    from app.modules.recommendations.related import RelatedDatasetsJob
+
+    _, base_ds, candidates = user_with_datasets
+    job = RelatedDatasetsJob(k=50)
+
+    assert job.rebuild() == FoodDataset.query.count()
+
+    rows = RelatedDataset.query.filter_by(dataset_id=base_ds.id).order_by(RelatedDataset.rank).all()
+    related_ids = [row.related_dataset_id for row in rows]
+    assert [row.rank for row in rows] == list(range(1, len(rows) + 1))
+    assert [row.score for row in rows] == sorted((row.score for row in rows), reverse=True)
+    assert base_ds.id not in related_ids
+    # cand1 (autor, tipo, tag y texto) por delante de cand3 (autor y tag); cand2 no comparte nada
+    assert related_ids.index(candidates[0].id) < related_ids.index(candidates[2].id)
+    assert candidates[1].id not in related_ids
+
+    # La página lee los relacionados guardados
+    assert RecommendationService.get_related_food_datasets(base_ds, limit=2) == [
+        FoodDataset.query.get(related_id) for related_id in related_ids[:2]
+    ]
+
+
+def test_related_datasets_update_new_is_incremental(user_with_datasets, fitted_tfidf_model):
+    from app.modules.recommendations.models import RelatedDataset
+    from app.modules.recommendations.related import RelatedDatasetsJob
+
+    user, base_ds, candidates = user_with_datasets
+    job = RelatedDatasetsJob(k=2)
+    job.rebuild()
+    assert job.update_new() == 0
+    catalog = job._catalog
+
+    stored = {(row.dataset_id, row.rank): row.related_dataset_id for row in RelatedDataset.query}
+
+    new_metrics = BaseDSMetrics(number_of_models=100, number_of_features=0)
+    db.session.add(new_metrics)
+    db.session.commit()
+
+    new_meta = FoodDSMetaData(
+        title="Base Dataset",
+        description="Base dataset description",
+        publication_type=BasePublicationType.JOURNAL_ARTICLE,
+        tags="tag1,tag2",
+        ds_metrics_id=new_metrics.id,
+    )
+    new_meta.authors.append(BaseAuthor(name="Author 1"))
+    new_ds = FoodDataset(user_id=user.id, ds_meta_data=new_meta)
+    db.session.add(new_ds)
+    FoodDatasetRepository().sync_tags(new_ds)
+    db.session.commit()
+
+    assert job.update_new() == 1
+    assert RelatedDataset.query.filter_by(dataset_id=new_ds.id).count() == 2
+
+    # El catálogo cargado se reutiliza: solo se ha leído y añadido la fila del nuevo
+    assert job._catalog is catalog
+    assert len(catalog) == FoodDataset.query.count() and catalog.position[new_ds.id] == len(catalog) - 1
+
+    # El nuevo entra en el top-k del dataset base sin recalcular el resto del catálogo
+    base_related = [ds.id for ds in RecommendationService.get_related_food_datasets(base_ds, limit=2)]
+    assert new_ds.id in base_related
+    unaffected = candidates[1].id
+    assert [stored[(unaffected, rank)] for rank in (1, 2) if (unaffected, rank) in stored] == [
+        row.related_dataset_id
+        for row in RelatedDataset.query.filter_by(dataset_id=unaffected).order_by(RelatedDataset.rank)
+    ]
+
+
+# ---------------------------
+# Test co-descargas
+# ---------------------------
+
+
+@pytest.fixture
+def co_downloads(user_with_datasets, tmp_path, monkeypatch):
+    from app.modules.recommendations.co_downloads import co_download_index
+
+    monkeypatch.setattr(co_download_index, "folder", str(tmp_path))
+    monkeypatch.setattr(co_download_index, "neighbors", {})
+    monkeypatch.setattr(co_download_index, "built", False)
+    monkeypatch.setattr(co_download_index, "_loaded_mtime", None)
+    monkeypatch.setattr(co_download_index, "_queued", set())
+
+    yield co_download_index
+
+
+def add_downloads(cookie, datasets):
+    from app.modules.basedataset.models import BaseDSDownloadRecord
+
+    for dataset in datasets:
+        db.session.add(BaseDSDownloadRecord(dataset_id=dataset.id, download_cookie=cookie))
+    db.session.commit()
+
+
+def test_co_downloads_rebuild_and_incremental_update(user_with_datasets, co_downloads, tmp_path):
+    from app.modules.recommendations.co_downloads import CoDownloadIndex
+    from app.modules.shopping_cart.models import ShoppingCart
+
+    user, base_ds, (cand1, cand2, cand3) = user_with_datasets
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    add_downloads(first, [base_ds, cand2])
+    add_downloads(second, [base_ds, cand2, cand3])
+
+    cart = ShoppingCart(user_id=user.id)
+    db.session.add(cart)
+    db.session.flush()
+    base_ds.shoppingcart_id = cart.id
+    cand1.shoppingcart_id = cart.id
+    db.session.commit()
+
+    co_downloads.rebuild()
+    assert co_downloads.also_downloaded(base_ds.id) == [(cand2.id, 2), (cand1.id, 1), (cand3.id, 1)]
+
+    # El commit solo apunta la descarga: la matriz no cambia hasta que el hilo aplica el lote
+    add_downloads(second, [cand1])
+    assert co_downloads.also_downloaded(cand1.id) == [(base_ds.id, 1)]
+
+    # Una descarga nueva solo suma sus pares con la misma cesta; repetir dataset no cuenta
+    add_downloads(second, [cand1])
+    add_downloads(first, [cand3, cand3])
+    assert co_downloads.apply_queued() == 4
+    assert dict(co_downloads.also_downloaded(cand1.id)) == {base_ds.id: 2, cand2.id: 1, cand3.id: 1}
+    assert dict(co_downloads.also_downloaded(cand3.id)) == {base_ds.id: 2, cand2.id: 2, cand1.id: 1}
+    assert co_downloads.apply_queued() == 0
+
+    loaded = CoDownloadIndex(folder=str(tmp_path))
+    assert loaded.load()
+    assert loaded.neighbors == co_downloads.neighbors
+    assert sorted(os.listdir(tmp_path)) == ["co_downloads.lock", "co_downloads.npz"]
+
+
+def test_default_score_weights_sum_to_one(test_client):
+    from app.modules.recommendations.similarities import SCORE_WEIGHTS, score_weights
+
+    assert sum(SCORE_WEIGHTS.values()) == pytest.approx(1.0)
+    assert sum(score_weights().values()) == pytest.approx(1.0)
+
+
+def test_co_downloads_prune_rows_to_top_n():
+    from app.modules.recommendations.co_downloads import CoDownloadIndex
+
+    index = CoDownloadIndex(top_n=2)
+    neighbors = {}
+    for others in ([2, 3], [2, 3], [2, 4], [5], [6], [7]):
+        index._add(neighbors, 1, others)
+
+    assert len(neighbors[1]) <= 4
+    index._prune(neighbors[1])
+    assert neighbors[1] == {2: 3, 3: 2}
+
+
+def test_co_downloads_blend_into_recommendations(user_with_datasets, fitted_tfidf_model, co_downloads):
+    from app.modules.recommendations.related import Catalog
+
+    _, base_ds, (cand1, cand2, cand3) = user_with_datasets
+    add_downloads(str(uuid.uuid4()), [base_ds, cand2])
+    co_downloads.rebuild()
+
+    # cand2 no comparte tags ni autores: solo es candidato por haberse descargado junto al base
+    assert RecommendationService.get_also_downloaded(base_ds) == [cand2]
+    catalog = Catalog()
+    base_row, cand2_column = catalog.position[base_ds.id], catalog.position[cand2.id]
+    columns, scores = catalog.row_scores(base_row)
+    assert cand2_column in columns and np.isfinite(scores[list(columns).index(cand2_column)])
+
+    service = SimilarityService(base_ds, [cand1, cand2, cand3])
+    assert list(service.codownload_scores) == [0.0, 1.0, 0.0]
+    without = SimilarityService(base_ds, [cand1, cand2, cand3], weights={**service.weights, "codownload": 0.0})
+    assert service.final_score(1) == pytest.approx(without.final_score(1) + service.weights["codownload"])
+
+
+# ---------------------------
+# Test endpoint de relacionados
+# ---------------------------
+
+
+def test_related_endpoint_is_cacheable(test_client, user_with_datasets, fitted_tfidf_model):
+    from app.modules.recommendations.related import RelatedDatasetsJob
+
+    _, base_ds, candidates = user_with_datasets
+    RelatedDatasetsJob(k=50).rebuild()
+    expected = [ds.id for ds in RecommendationService.get_related_food_datasets(base_ds, limit=3)]
+
+    # Cliente sin "with": no deja abierto el contexto de la petición dentro del del fixture
+    client = test_client.application.test_client()
+    response = client.get(f"/api/recommendations/dataset/{base_ds.id}/related?limit=3")
+    assert response.status_code == 200
+    assert [ds["id"] for ds in response.json["related"]] == expected
+    assert response.json["related"][0]["title"]
+    assert response.json["also_downloaded"] == []
+    assert response.cache_control.public and response.cache_control.max_age == 60
+    assert response.headers["Server-Timing"].startswith("related;dur=")
+
+    etag = response.headers["ETag"]
+    cached = client.get(f"/api/recommendations/dataset/{base_ds.id}/related?limit=3", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    assert client.get("/api/recommendations/dataset/999999/related").status_code == 404
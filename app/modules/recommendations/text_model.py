@@ -0,0 +1,296 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.modules.fooddataset.models import FoodDSMetaData
+from core.events.session_events import session_events
+from core.events.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+# Campos de los metadatos que forman el texto del modelo
+TEXT_FIELDS = ("title", "description", "tags")
+
+
+def document_text(title, description, tags) -> str:
+    return f"{title or ''} {description or ''} {tags or ''}"
+
+
+class TfidfModel:
+    """Modelo TF-IDF de todo el catálogo, guardado en disco y cargado al arrancar.
+
+    El vocabulario y los pesos IDF salen de todos los ``FoodDSMetaData`` y solo cambian al
+    reajustar (``rosemary recommendations:refit`` o cada ``RECOMMENDATIONS_REFIT_INTERVAL``
+    segundos). Al editar título, descripción o tags el commit solo apunta el id; un hilo vuelve a
+    transformar esas filas por lotes cada ``RECOMMENDATIONS_TFIDF_FLUSH_INTERVAL`` segundos. Las
+    recomendaciones se limitan a leer filas de la matriz dispersa.
+    """
+
+    MATRIX_FILE = "tfidf_matrix.npz"
+    VOCABULARY_FILE = "tfidf_vocabulary.json"
+    LOCK_FILE = "tfidf.lock"
+
+    def __init__(self, folder=None, max_features=5000, refit_interval=0, flush_interval=30):
+        self.folder = folder
+        self.max_features = max_features
+        self.refit_interval = refit_interval
+        self.flush_interval = flush_interval
+        self.app = None
+
+        self.vectorizer = None
+        self.matrix = None
+        self.rows = {}
+        self._loaded_mtime = None
+        self._queued = set()
+
+        self._lock = threading.RLock()
+        self._last_refit = time.monotonic()
+        self._worker = BackgroundWorker(
+            "tfidf-model", self._tick, interval=lambda: self.flush_interval or self.refit_interval
+        )
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.get("RECOMMENDATIONS_MODEL_DIR", self.folder)
+        self.max_features = app.config.get("RECOMMENDATIONS_MAX_FEATURES", self.max_features)
+        self.refit_interval = app.config.get("RECOMMENDATIONS_REFIT_INTERVAL", self.refit_interval)
+        self.flush_interval = app.config.get("RECOMMENDATIONS_TFIDF_FLUSH_INTERVAL", self.flush_interval)
+
+        self.load()
+        register_events()
+
+        if self.flush_interval or self.refit_interval:
+            self._worker.app = app
+            self._worker.start()
+
+    @property
+    def fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    def _path(self, filename):
+        return os.path.join(self.folder, filename)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializa entre procesos las escrituras del modelo para que ninguna pise a otra."""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self._path(self.LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def fit(self, documents):
+        """Ajusta el modelo con ``(metadata_id, texto)`` de todo el catálogo."""
+        ids, texts = [], []
+        for metadata_id, text in documents:
+            ids.append(metadata_id)
+            texts.append(text)
+
+        vectorizer = TfidfVectorizer(max_features=self.max_features)
+        matrix = vectorizer.fit_transform(texts).tocsr() if texts else None
+
+        with self._lock:
+            self.vectorizer = vectorizer if texts else None
+            self.matrix = matrix
+            self.rows = {metadata_id: row for row, metadata_id in enumerate(ids)}
+
+    def _documents(self, metadata_ids=None):
+        query = FoodDSMetaData.query.with_entities(
+            FoodDSMetaData.id, FoodDSMetaData.title, FoodDSMetaData.description, FoodDSMetaData.tags
+        )
+        if metadata_ids is not None:
+            query = query.filter(FoodDSMetaData.id.in_(metadata_ids))
+        return [
+            (metadata_id, document_text(title, description, tags))
+            for metadata_id, title, description, tags in query.order_by(FoodDSMetaData.id)
+        ]
+
+    def refit(self) -> int:
+        """Reajusta con todos los metadatos de la base de datos y lo guarda. Devuelve el número de filas."""
+        with self._lock:
+            # El ajuste lee el texto actual de todas las filas apuntadas hasta ahora
+            self._queued = set()
+        documents = self._documents()
+        self.fit(documents)
+        if self.fitted:
+            with self._file_lock():
+                self.save()
+        return len(documents)
+
+    def save(self):
+        """Escribe matriz y vocabulario en ficheros temporales y los sustituye de forma atómica."""
+        with self._lock:
+            if not self.fitted:
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            ids = sorted(self.rows, key=self.rows.get)
+
+            matrix_tmp = self._path(f"{self.MATRIX_FILE}.tmp.npz")
+            sparse.save_npz(matrix_tmp, self.matrix, compressed=False)
+            os.replace(matrix_tmp, self._path(self.MATRIX_FILE))
+
+            vocabulary_tmp = self._path(f"{self.VOCABULARY_FILE}.tmp")
+            with open(vocabulary_tmp, "w") as f:
+                json.dump(
+                    {
+                        "vocabulary": {term: int(column) for term, column in self.vectorizer.vocabulary_.items()},
+                        "idf": self.vectorizer.idf_.tolist(),
+                        "ids": ids,
+                    },
+                    f,
+                )
+            os.replace(vocabulary_tmp, self._path(self.VOCABULARY_FILE))
+            self._loaded_mtime = os.path.getmtime(self._path(self.VOCABULARY_FILE))
+
+    def load(self) -> bool:
+        """Carga el modelo guardado. Devuelve False si todavía no se ha ajustado nunca."""
+        vocabulary_path = self._path(self.VOCABULARY_FILE)
+        if not self.folder or not os.path.exists(vocabulary_path):
+            return False
+
+        try:
+            with self._lock:
+                mtime = os.path.getmtime(vocabulary_path)
+                with open(vocabulary_path) as f:
+                    data = json.load(f)
+                matrix = sparse.load_npz(self._path(self.MATRIX_FILE)).tocsr()
+                if matrix.shape[0] != len(data["ids"]):
+                    # La matriz es de otro ajuste a medio escribir: se recarga en la siguiente consulta
+                    return False
+
+                vectorizer = TfidfVectorizer(vocabulary=data["vocabulary"])
+                vectorizer.idf_ = np.asarray(data["idf"])
+
+                self.vectorizer = vectorizer
+                self.matrix = matrix
+                self.rows = {metadata_id: row for row, metadata_id in enumerate(data["ids"])}
+                self._loaded_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading TF-IDF model from {self.folder}: {e}")
+            return False
+
+        logger.info(f"Loaded TF-IDF model with {len(self.rows)} documents")
+        return True
+
+    def _reload_if_changed(self):
+        """Otro proceso (el comando o un worker) puede haber reajustado o actualizado el modelo."""
+        try:
+            mtime = os.path.getmtime(self._path(self.VOCABULARY_FILE))
+        except (OSError, TypeError):
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def update_rows(self, documents):
+        """Vuelve a transformar solo las filas de ``{metadata_id: texto}``, sin tocar vocabulario ni IDF."""
+        if not documents or not self.fitted:
+            return
+
+        with self._lock:
+            ids = list(documents)
+            vectors = self.vectorizer.transform([documents[metadata_id] for metadata_id in ids]).tocsr()
+
+            new_ids = [metadata_id for metadata_id in ids if metadata_id not in self.rows]
+            if new_ids:
+                for metadata_id in new_ids:
+                    self.rows[metadata_id] = len(self.rows)
+                self.matrix = sparse.vstack(
+                    [self.matrix, sparse.csr_matrix((len(new_ids), self.matrix.shape[1]))], format="csr"
+                )
+
+            # Se anulan las filas editadas y se suman las nuevas colocadas en su sitio, todo en CSR
+            n = self.matrix.shape[0]
+            positions = np.array([self.rows[metadata_id] for metadata_id in ids])
+            keep = np.ones(n)
+            keep[positions] = 0
+            placement = sparse.csr_matrix((np.ones(len(ids)), (positions, np.arange(len(ids)))), shape=(n, len(ids)))
+            matrix = (sparse.diags(keep) @ self.matrix + placement @ vectors).tocsr()
+            matrix.eliminate_zeros()
+            self.matrix = matrix
+
+    def queue(self, metadata_ids):
+        """Apunta metadatos creados o editados para el siguiente ``apply_queued``; no toca la BD ni el disco."""
+        if not self.fitted:
+            return
+        with self._lock:
+            self._queued.update(metadata_ids)
+
+    def apply_queued(self) -> int:
+        """Transforma de una vez las filas apuntadas y guarda el modelo. Devuelve cuántas había.
+
+        El texto se lee de la base de datos al aplicar y la recarga, el cambio y el guardado van
+        bajo el cerrojo de fichero, así que los lotes de varios procesos se suman en vez de pisarse.
+        """
+        with self._lock:
+            queued, self._queued = self._queued, set()
+        if not queued:
+            return 0
+
+        documents = dict(self._documents(sorted(queued)))
+        with self._file_lock(), self._lock:
+            self._reload_if_changed()
+            self.update_rows(documents)
+            self.save()
+        return len(queued)
+
+    def _tick(self):
+        if self.refit_interval and time.monotonic() - self._last_refit >= self.refit_interval:
+            self.refit()
+            self._last_refit = time.monotonic()
+        else:
+            self.apply_queued()
+
+    def vectors(self, metadata):
+        """Filas TF-IDF de los metadatos dados, en el mismo orden.
+
+        Las que ya están en la matriz se leen tal cual; las que falten (p. ej. creadas después del
+        último guardado en otro proceso) se transforman con el vocabulario actual.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if not self.fitted:
+                return None
+
+            known = [meta.id in self.rows for meta in metadata]
+            if all(known):
+                return self.matrix[[self.rows[meta.id] for meta in metadata]]
+
+            vectors = self.vectorizer.transform(
+                [document_text(*(getattr(meta, field, "") for field in TEXT_FIELDS)) for meta in metadata]
+            ).tolil()
+            for position, meta in enumerate(metadata):
+                if known[position]:
+                    vectors[position] = self.matrix[self.rows[meta.id]]
+            return vectors.tocsr()
+
+
+tfidf_model = TfidfModel()
+
+
+def collect_changed_rows(session, changes):
+    """Ids de los metadatos creados o con título, descripción o tags cambiados."""
+    return {instance.id for instance in changes.new + changes.dirty if instance.id is not None}
+
+
+def queue_changed_rows(metadata_ids):
+    tfidf_model.queue(metadata_ids)
+
+
+def register_events():
+    session_events.subscribe(
+        "tfidf_rows",
+        models=(FoodDSMetaData,),
+        fields=TEXT_FIELDS,
+        on_flush=collect_changed_rows,
+        on_commit=queue_changed_rows,
+    )
@@ -0,0 +1,158 @@
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "session_events_pending"
+
+STATES = ("new", "dirty", "deleted")
+
+
+class Changes:
+    """Instancias de los modelos de una suscripción creadas, modificadas o borradas en un flush."""
+
+    def __init__(self):
+        self.new = []
+        self.dirty = []
+        self.deleted = []
+
+    def __iter__(self):
+        yield from self.new
+        yield from self.dirty
+        yield from self.deleted
+
+    def ids(self):
+        return {instance.id for instance in self if getattr(instance, "id", None) is not None}
+
+
+class Subscription:
+    def __init__(self, name, models, fields=None, on_before_flush=None, on_flush=None, on_commit=None):
+        self.name = name
+        self.models = tuple(models)
+        self.fields = fields
+        self.on_before_flush = on_before_flush
+        self.on_flush = on_flush
+        self.on_commit = on_commit
+
+    def _fields_for(self, instance):
+        if isinstance(self.fields, dict):
+            for model, fields in self.fields.items():
+                if isinstance(instance, model):
+                    return fields
+            return None
+        return self.fields
+
+    def changed(self, instance) -> bool:
+        """Si una instancia de ``session.dirty`` cuenta: sin ``fields`` siempre, con ``()`` nunca."""
+        fields = self._fields_for(instance)
+        if fields is None:
+            return True
+        state = inspect(instance)
+        return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+class SessionEvents:
+    """Un único juego de listeners de ``Session`` para todos los módulos.
+
+    Cada módulo se suscribe con los modelos que le interesan y, opcionalmente, los campos cuyo
+    cambio cuenta. En cada flush se recorren una sola vez ``new``/``dirty``/``deleted`` y cada
+    suscripción recibe solo sus instancias, y solo si hay alguna. Lo que devuelve ``on_flush`` (o
+    los ids de las instancias, si no hay ``on_flush``) queda pendiente en ``session.info`` y se
+    entrega a ``on_commit`` tras el commit; un rollback de la transacción principal lo descarta.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._by_class = {}
+
+    def subscribe(self, name, models=(), fields=None, on_before_flush=None, on_flush=None, on_commit=None):
+        """Registra (o sustituye, si ya existe ``name``) una suscripción.
+
+        - ``fields``: tupla de campos, o ``{modelo: campos}``, que deben cambiar para que una
+          instancia modificada cuente; ``()`` ignora las modificadas.
+        - ``on_before_flush(session, changes)``: antes del flush, con las filas aún sin tocar.
+        - ``on_flush(session, changes)``: tras el flush, dentro de la transacción (puede usar
+          ``session.connection()``); devuelve las claves que quedan pendientes o None.
+        - ``on_commit(keys)``: tras el commit, con el conjunto de claves pendientes.
+        """
+        self._subscriptions[name] = Subscription(name, models, fields, on_before_flush, on_flush, on_commit)
+        self._by_class.clear()
+        self.register()
+
+    def unsubscribe(self, name):
+        self._subscriptions.pop(name, None)
+        self._by_class.clear()
+
+    def register(self):
+        for identifier, listener in self.LISTENERS:
+            if not event.contains(Session, identifier, getattr(self, listener)):
+                event.listen(Session, identifier, getattr(self, listener))
+
+    def pend(self, session, name, keys):
+        """Deja ``keys`` pendientes para el ``on_commit`` de ``name`` (p. ej. desde un evento de mapper)."""
+        session.info.setdefault(PENDING_KEY, {}).setdefault(name, set()).update(keys)
+
+    def pending(self, session, name):
+        return session.info.get(PENDING_KEY, {}).get(name, set())
+
+    def _for_class(self, cls):
+        subscriptions = self._by_class.get(cls)
+        if subscriptions is None:
+            subscriptions = [
+                subscription
+                for subscription in self._subscriptions.values()
+                if subscription.models and issubclass(cls, subscription.models)
+            ]
+            self._by_class[cls] = subscriptions
+        return subscriptions
+
+    def _changes(self, session, wanted):
+        """``{suscripción: Changes}`` con una sola pasada por las instancias de la sesión."""
+        changes = {}
+        for state in STATES:
+            for instance in getattr(session, state):
+                for subscription in self._for_class(type(instance)):
+                    if not wanted(subscription):
+                        continue
+                    if state == "dirty" and not subscription.changed(instance):
+                        continue
+                    getattr(changes.setdefault(subscription, Changes()), state).append(instance)
+        return changes
+
+    def before_flush(self, session, flush_context, instances):
+        for subscription, changes in self._changes(session, lambda s: s.on_before_flush).items():
+            subscription.on_before_flush(session, changes)
+
+    def after_flush(self, session, flush_context):
+        for subscription, changes in self._changes(session, lambda s: s.on_flush or s.on_commit).items():
+            keys = subscription.on_flush(session, changes) if subscription.on_flush else changes.ids()
+            if subscription.on_commit and keys:
+                self.pend(session, subscription.name, keys)
+
+    def after_commit(self, session):
+        pending = session.info.pop(PENDING_KEY, None)
+        for name, keys in (pending or {}).items():
+            subscription = self._subscriptions.get(name)
+            if subscription is None or subscription.on_commit is None:
+                continue
+            try:
+                subscription.on_commit(keys)
+            except Exception as e:
+                logger.error(f"Error applying {name} after commit: {e}")
+
+    def after_soft_rollback(self, session, previous_transaction):
+        # Un savepoint deshecho no descarta lo pendiente de la transacción principal
+        if not previous_transaction.nested:
+            session.info.pop(PENDING_KEY, None)
+
+    LISTENERS = (
+        ("before_flush", "before_flush"),
+        ("after_flush", "after_flush"),
+        ("after_commit", "after_commit"),
+        ("after_soft_rollback", "after_soft_rollback"),
+    )
+
+
+session_events = SessionEvents()
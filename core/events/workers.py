@@ -0,0 +1,56 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Hilo daemon que ejecuta ``target`` cada ``interval`` segundos o en cuanto se llama a ``wake``.
+
+    ``interval`` puede ser un número o una función que lo devuelva, para leer la configuración del
+    dueño en cada vuelta; sin intervalo el hilo solo se despierta con ``wake``. Con ``app`` cada
+    ejecución va dentro de su contexto. Los errores se registran y el hilo sigue vivo.
+    """
+
+    def __init__(self, name, target, interval=None, app=None):
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self.app = app
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _timeout(self):
+        interval = self.interval() if callable(self.interval) else self.interval
+        return interval or None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._timeout())
+            self._wakeup.clear()
+            try:
+                if self.app is None:
+                    self.target()
+                else:
+                    with self.app.app_context():
+                        self.target()
+            except Exception as e:
+                logger.error(f"Error in background worker {self.name}: {e}")
@@ -33,6 +33,59 @@ class Config:
     TIMEZONE = "Europe/Madrid"
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = "uploads"
+    ACTIVITY_COUNTERS_SYNC = os.getenv("ACTIVITY_COUNTERS_SYNC", "false").lower() == "true"
+    ACTIVITY_COUNTERS_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_COUNTERS_FLUSH_INTERVAL", "5"))
+    ACTIVITY_COUNTERS_MAX_PENDING = int(os.getenv("ACTIVITY_COUNTERS_MAX_PENDING", "200"))
+    ACTIVITY_COUNTERS_MAX_BUFFERED = int(os.getenv("ACTIVITY_COUNTERS_MAX_BUFFERED", "10000"))
+    SEARCH_OUTBOX_IN_PROCESS = os.getenv("SEARCH_OUTBOX_IN_PROCESS", "true").lower() == "true"
+    SEARCH_OUTBOX_BATCH_SIZE = int(os.getenv("SEARCH_OUTBOX_BATCH_SIZE", "100"))
+    SEARCH_OUTBOX_MAX_ATTEMPTS = int(os.getenv("SEARCH_OUTBOX_MAX_ATTEMPTS", "5"))
+    SEARCH_OUTBOX_RETRY_DELAY = int(os.getenv("SEARCH_OUTBOX_RETRY_DELAY", "30"))
+    SEARCH_OUTBOX_POLL_INTERVAL = float(os.getenv("SEARCH_OUTBOX_POLL_INTERVAL", "5"))
+    RECOMMENDATIONS_MODEL_DIR = os.getenv(
+        "RECOMMENDATIONS_MODEL_DIR", os.path.join(os.getenv("UPLOADS_DIR", "uploads"), "recommendations")
+    )
+    RECOMMENDATIONS_MAX_FEATURES = int(os.getenv("RECOMMENDATIONS_MAX_FEATURES", "5000"))
+    RECOMMENDATIONS_REFIT_INTERVAL = int(os.getenv("RECOMMENDATIONS_REFIT_INTERVAL", "0"))
+    RECOMMENDATIONS_TFIDF_FLUSH_INTERVAL = int(os.getenv("RECOMMENDATIONS_TFIDF_FLUSH_INTERVAL", "30"))
+    RECOMMENDATIONS_WEIGHT_AUTHOR = float(os.getenv("RECOMMENDATIONS_WEIGHT_AUTHOR", "0.18"))
+    RECOMMENDATIONS_WEIGHT_PUBLICATION_TYPE = float(os.getenv("RECOMMENDATIONS_WEIGHT_PUBLICATION_TYPE", "0.135"))
+    RECOMMENDATIONS_WEIGHT_TEXT = float(os.getenv("RECOMMENDATIONS_WEIGHT_TEXT", "0.405"))
+    RECOMMENDATIONS_WEIGHT_METRIC = float(os.getenv("RECOMMENDATIONS_WEIGHT_METRIC", "0.18"))
+    RECOMMENDATIONS_WEIGHT_CODOWNLOAD = float(os.getenv("RECOMMENDATIONS_WEIGHT_CODOWNLOAD", "0.1"))
+    RECOMMENDATIONS_RELATED_K = int(os.getenv("RECOMMENDATIONS_RELATED_K", "10"))
+    RECOMMENDATIONS_RELATED_IN_PROCESS = os.getenv("RECOMMENDATIONS_RELATED_IN_PROCESS", "true").lower() == "true"
+    RECOMMENDATIONS_RELATED_INTERVAL = int(os.getenv("RECOMMENDATIONS_RELATED_INTERVAL", "0"))
+    RECOMMENDATIONS_CODOWNLOAD_TOP_N = int(os.getenv("RECOMMENDATIONS_CODOWNLOAD_TOP_N", "50"))
+    RECOMMENDATIONS_CODOWNLOAD_INTERVAL = int(os.getenv("RECOMMENDATIONS_CODOWNLOAD_INTERVAL", "0"))
+    RECOMMENDATIONS_CODOWNLOAD_FLUSH_INTERVAL = int(os.getenv("RECOMMENDATIONS_CODOWNLOAD_FLUSH_INTERVAL", "30"))
+    RECOMMENDATIONS_CACHE_MAX_AGE = int(os.getenv("RECOMMENDATIONS_CACHE_MAX_AGE", "60"))
+    FOOD_CHECKER_INDEX_DIR = os.getenv(
+        "FOOD_CHECKER_INDEX_DIR", os.path.join(os.getenv("UPLOADS_DIR", "uploads"), "food_checker")
+    )
+    FOOD_CHECKER_BRUTE_FORCE_LIMIT = int(os.getenv("FOOD_CHECKER_BRUTE_FORCE_LIMIT", "2048"))
+    DATASET_ARCHIVE_CACHE_DIR = os.getenv(
+        "DATASET_ARCHIVE_CACHE_DIR", os.path.join(os.getenv("UPLOADS_DIR", "uploads"), "archive_cache")
+    )
+    DATASET_ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("DATASET_ARCHIVE_CACHE_MAX_BYTES", str(1024**3)))
+    ACCEL_REDIRECT = os.getenv("ACCEL_REDIRECT", "false").lower() == "true"
+    ACCEL_REDIRECT_ROOT = os.getenv("UPLOADS_DIR", "uploads")
+    ACCEL_REDIRECT_LOCATION = os.getenv("ACCEL_REDIRECT_LOCATION", "/protected/uploads/")
+    HUBFILE_PREVIEW_LINES = int(os.getenv("HUBFILE_PREVIEW_LINES", "200"))
+    HUBFILE_PREVIEW_MAX_LINES = int(os.getenv("HUBFILE_PREVIEW_MAX_LINES", "2000"))
+    HUBFILE_PREVIEW_MAX_BYTES = int(os.getenv("HUBFILE_PREVIEW_MAX_BYTES", str(1024 * 1024)))
+    HUBFILE_CHECKSUM_ALGORITHM = os.getenv("HUBFILE_CHECKSUM_ALGORITHM", "md5")
+    HUBFILE_CHECKSUM_WORKERS = int(os.getenv("HUBFILE_CHECKSUM_WORKERS", "4"))
+    HUBFILE_BLOB_STORE = os.getenv("HUBFILE_BLOB_STORE", "true").lower() == "true"
+    HUBFILE_BLOB_DIR = os.getenv("HUBFILE_BLOB_DIR", os.path.join(os.getenv("UPLOADS_DIR", "uploads"), "blobs"))
+    UPLOAD_CHUNK_DIR = os.getenv("UPLOAD_CHUNK_DIR", os.path.join(os.getenv("UPLOADS_DIR", "uploads"), "chunked"))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+    UPLOAD_CHUNK_THRESHOLD = int(os.getenv("UPLOAD_CHUNK_THRESHOLD", str(8 * 1024 * 1024)))
+    UPLOAD_CHUNK_MAX_SIZE = int(os.getenv("UPLOAD_CHUNK_MAX_SIZE", str(2 * 1024**3)))
+    UPLOAD_CHUNK_SESSION_TTL = int(os.getenv("UPLOAD_CHUNK_SESSION_TTL", str(24 * 3600)))
+    ZIP_IMPORT_MAX_SIZE = int(os.getenv("ZIP_IMPORT_MAX_SIZE", str(2 * 1024**3)))
+    ZIP_IMPORT_MAX_MEMBERS = int(os.getenv("ZIP_IMPORT_MAX_MEMBERS", "10000"))
+    ZIP_IMPORT_MAX_RATIO = int(os.getenv("ZIP_IMPORT_MAX_RATIO", "100"))
 
 
 class DevelopmentConfig(Config):
@@ -49,6 +102,13 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    ACTIVITY_COUNTERS_SYNC = True
+    SEARCH_OUTBOX_IN_PROCESS = False
+    RECOMMENDATIONS_RELATED_IN_PROCESS = False
+    RECOMMENDATIONS_TFIDF_FLUSH_INTERVAL = 0
+    RECOMMENDATIONS_CODOWNLOAD_FLUSH_INTERVAL = 0
+    DATASET_ARCHIVE_CACHE_MAX_BYTES = 0
+    HUBFILE_BLOB_STORE = False
 
 
 class ProductionConfig(Config):
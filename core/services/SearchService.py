@@ -1,107 +1,428 @@
 import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
 
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
+from elastic_transport import ConnectionError as ESConnectionError
+from elastic_transport import ConnectionTimeout
+from elasticsearch import Elasticsearch, NotFoundError, helpers
 
 load_dotenv()
 
+INDEX_SETTINGS = {
+    "analysis": {
+        "normalizer": {
+            "folded": {"type": "custom", "filter": ["lowercase", "asciifolding"]},
+        }
+    }
+}
+
+# Mapeo explícito: los campos que no aparecen aquí se guardan en _source pero no se indexan
+INDEX_MAPPINGS = {
+    "dynamic": False,
+    "properties": {
+        "id": {"type": "integer"},
+        "title": {"type": "text", "fields": {"raw": {"type": "keyword", "normalizer": "folded"}}},
+        "description": {"type": "text"},
+        "publication_type": {"type": "keyword"},
+        "tags": {"type": "keyword", "normalizer": "folded"},
+        "calories": {"type": "integer"},
+        "created_at": {"type": "date"},
+        "authors": {
+            "properties": {
+                "name": {"type": "text"},
+                "affiliation": {"type": "text"},
+                "orcid": {"type": "keyword"},
+            }
+        },
+        "size_in_bytes": {"type": "long"},
+    },
+}
+
+
+@lru_cache(maxsize=1)
+def get_elastic_settings():
+    """Lee una sola vez la configuración de Elastic del entorno."""
+    url = os.getenv("ELASTICSEARCH_URL")
+    password = os.getenv("ELASTICSEARCH_PASSWORD")
+    enabled = os.getenv("ELASTICSEARCH_ENABLED")
+
+    if not url or not password:
+        print("❌ ERROR: Faltan ELASTICSEARCH_URL o ELASTICSEARCH_PASSWORD en el archivo .env")
+        return {"enabled": False}
+
+    if enabled and enabled.lower() == "false":
+        print("ElasticSearch deshabilitado en el archivo .env")
+        return {"enabled": False}
+
+    return {
+        "enabled": True,
+        "url": url,
+        "user": os.getenv("ELASTICSEARCH_USER", "elastic"),
+        "password": password,
+        "connections_per_node": int(os.getenv("ELASTICSEARCH_POOL_SIZE", "10")),
+        "request_timeout": float(os.getenv("ELASTICSEARCH_TIMEOUT", "5")),
+        "max_retries": int(os.getenv("ELASTICSEARCH_MAX_RETRIES", "2")),
+        "retry_on_timeout": os.getenv("ELASTICSEARCH_RETRY_ON_TIMEOUT", "true").lower() == "true",
+        "retry_after": float(os.getenv("ELASTICSEARCH_RETRY_AFTER", "30")),
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_es_client():
+    """Cliente Elasticsearch compartido por todo el proceso, creado la primera vez que se usa."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = get_elastic_settings()
+                if not settings["enabled"]:
+                    return None
+                _client = Elasticsearch(
+                    settings["url"],
+                    basic_auth=(settings["user"], settings["password"]),
+                    connections_per_node=settings["connections_per_node"],
+                    request_timeout=settings["request_timeout"],
+                    max_retries=settings["max_retries"],
+                    retry_on_timeout=settings["retry_on_timeout"],
+                )
+    return _client
+
+
+class ClusterHealth:
+    """Marca de salud compartida: tras un fallo de conexión Elastic se da por caído durante
+    ``retry_after`` segundos y las búsquedas van a SQL sin esperar otro timeout."""
+
+    def __init__(self, retry_after=30.0):
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    def is_up(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self, error=None):
+        self._down_until = time.monotonic() + self.retry_after
+        print(f"❌ Elastic no disponible, usando SQL durante {self.retry_after:.0f}s: {error}")
+
+    def mark_up(self):
+        self._down_until = 0.0
+
+    def track(self, error):
+        """Marca el clúster como caído si el error es de conexión."""
+        if isinstance(error, (ESConnectionError, ConnectionTimeout)):
+            self.mark_down(error)
+
+
+cluster_health = ClusterHealth(retry_after=get_elastic_settings().get("retry_after", 30.0))
+
 
 class SearchService:
-    def __init__(self):
-        self.enabled = True
+    # Alias estable: apunta a la versión de índice activa (datasets-<timestamp>)
+    index_name = "datasets"
+
+    def __init__(self, es_client=None):
+        # Objeto ligero: el cliente (y su pool de conexiones) es único por proceso
+        self._es = es_client
+        self.enabled = es_client is not None or get_elastic_settings()["enabled"]
+
+    @property
+    def es(self):
+        return self._es if self._es is not None else get_es_client()
 
-        elastic_url = os.getenv("ELASTICSEARCH_URL")
-        elastic_password = os.getenv("ELASTICSEARCH_PASSWORD")
-        elastic_enabled = os.getenv("ELASTICSEARCH_ENABLED")
+    @es.setter
+    def es(self, client):
+        self._es = client
 
-        if not elastic_url or not elastic_password:
-            print("❌ ERROR: Faltan ELASTICSEARCH_URL o ELASTICSEARCH_PASSWORD en el archivo .env")
-            self.enabled = False
-            return
+    @property
+    def healthy(self) -> bool:
+        """Falso durante un rato tras un fallo de conexión, para ir directamente a SQL."""
+        return cluster_health.is_up()
 
-        if elastic_enabled and elastic_enabled.lower() == "false":
-            print("ElasticSearch deshabilitado en el archivo .env")
-            self.enabled = False
-            return
+    def build_document(self, dataset):
+        metadata = dataset.ds_meta_data
 
-        self.es = Elasticsearch(elastic_url, basic_auth=("elastic", elastic_password))
+        if metadata is None:
+            return None
+
+        pub_type = metadata.publication_type
+        if hasattr(pub_type, "name"):
+            pub_type = pub_type.name
+
+        return {
+            "id": dataset.id,
+            "title": metadata.title,
+            "description": metadata.description,
+            "publication_type": pub_type,
+            "tags": [tag.strip() for tag in metadata.tags.split(",") if tag.strip()] if metadata.tags else [],
+            "calories": int(metadata.calories) if metadata.calories and metadata.calories.isdigit() else 0,
+            "created_at": dataset.created_at.isoformat(),
+            # Lo que necesita la tarjeta de /explore, para no volver a la base de datos
+            "publication_type_label": dataset.get_cleaned_publication_type(),
+            "authors": [
+                {"name": author.name, "affiliation": author.affiliation or "", "orcid": author.orcid or ""}
+                for author in metadata.authors
+            ],
+            "size_in_bytes": dataset.get_file_total_size(),
+            "total_size_in_human_format": dataset.get_file_total_size_for_human(),
+            "url": f"/dataset/{dataset.id}",
+        }
 
     def index_dataset(self, dataset):
         try:
-            metadata = dataset.ds_meta_data
+            document = self.build_document(dataset)
 
-            if metadata is None:
+            if document is None:
                 print(f"⚠️ El dataset {dataset.id} no tiene metadatos vinculados todavía.")
                 return
 
-            pub_type = metadata.publication_type
-            if hasattr(pub_type, "name"):
-                pub_type = pub_type.name
-
-            document = {
-                "id": dataset.id,
-                "title": metadata.title,
-                "description": metadata.description,
-                "publication_type": pub_type,
-                "tags": metadata.tags,
-                "calories": int(metadata.calories) if metadata.calories and metadata.calories.isdigit() else 0,
-                "created_at": dataset.created_at.isoformat(),
-            }
-
-            self.es.index(index="datasets", id=dataset.id, document=document)
-            print(f"✅ Dataset {dataset.id} ('{metadata.title}') indexado correctamente en Elastic.")
+            self.es.index(index=self.index_name, id=dataset.id, document=document)
+            print(f"✅ Dataset {dataset.id} ('{document['title']}') indexado correctamente en Elastic.")
 
         except Exception as e:
             print(f"❌ Error indexing dataset: {e}")
+            cluster_health.track(e)
+
+    def bulk(self, operations):
+        """Envía en una sola petición ``_bulk`` una lista de ``(operation, dataset_id, document)``.
+
+        ``index`` sobrescribe el documento por id y un ``delete`` de algo que no existe
+        cuenta como hecho, así que reintentar es seguro. Devuelve ``{dataset_id: error}``
+        con las operaciones que han fallado.
+        """
+        body = []
+        for operation, dataset_id, document in operations:
+            body.append({operation: {"_index": self.index_name, "_id": str(dataset_id)}})
+            if operation == "index":
+                body.append(document)
+
+        if not body:
+            return {}
 
-    def search_datasets(self, query, sorting=None, publication_type=None, tags=None, **kwargs):
         try:
-            must_clauses = []
-            filter_clauses = []
-
-            if not query or query.strip() == "":
-                must_clauses.append({"match_all": {}})
-            else:
-                search_query = f"*{query}*"
-                must_clauses.append(
-                    {
-                        "query_string": {
-                            "query": search_query,
-                            "fields": ["title", "description", "tags"],
-                            "default_operator": "AND",
-                        }
+            response = self.es.bulk(operations=body)
+        except Exception as e:
+            cluster_health.track(e)
+            raise
+
+        failed = {}
+        for item in response["items"]:
+            operation, result = next(iter(item.items()))
+            status = result.get("status", 500)
+            if status >= 300 and not (operation == "delete" and status == 404):
+                failed[int(result["_id"])] = str(result.get("error", status))
+        return failed
+
+    def reindex(self, datasets, chunk_size=500, keep_old=False):
+        """Construye un índice versionado nuevo con ``helpers.bulk`` y mueve el alias de forma atómica.
+
+        ``datasets`` es un iterable (idealmente un generador por lotes) de ``FoodDataset`` con los
+        metadatos ya cargados. Las búsquedas siguen usando el índice anterior hasta el cambio de alias.
+        Devuelve un resumen con el índice creado, los documentos indexados y los docs/s.
+        """
+        new_index = f"{self.index_name}-{datetime.now():%Y%m%d%H%M%S}"
+        self.es.indices.create(
+            index=new_index,
+            settings={**INDEX_SETTINGS, "refresh_interval": "-1", "number_of_replicas": 0},
+            mappings=INDEX_MAPPINGS,
+        )
+
+        def actions():
+            for dataset in datasets:
+                document = self.build_document(dataset)
+                if document is not None:
+                    yield {"_index": new_index, "_id": str(dataset.id), "_source": document}
+
+        started = time.perf_counter()
+        try:
+            indexed, _ = helpers.bulk(self.es, actions(), chunk_size=chunk_size)
+            self.es.indices.put_settings(index=new_index, settings={"refresh_interval": "1s"})
+            self.es.indices.refresh(index=new_index)
+        except Exception:
+            self.es.indices.delete(index=new_index, ignore_unavailable=True)
+            raise
+        elapsed = time.perf_counter() - started
+
+        old_indices = self.swap_alias(new_index)
+        if not keep_old:
+            for old_index in old_indices:
+                self.es.indices.delete(index=old_index, ignore_unavailable=True)
+
+        return {
+            "index": new_index,
+            "indexed": indexed,
+            "seconds": elapsed,
+            "docs_per_second": indexed / elapsed if elapsed > 0 else float(indexed),
+            "old_indices": old_indices,
+        }
+
+    def swap_alias(self, new_index):
+        """Apunta el alias a ``new_index`` en una única llamada. Devuelve los índices que tenía antes."""
+        actions = []
+        try:
+            old_indices = list(self.es.indices.get_alias(name=self.index_name).keys())
+        except NotFoundError:
+            old_indices = []
+            if self.es.indices.exists(index=self.index_name):
+                # Índice antiguo creado por mapeo dinámico con el nombre del alias: se sustituye
+                actions.append({"remove_index": {"index": self.index_name}})
+
+        actions += [{"remove": {"index": index, "alias": self.index_name}} for index in old_indices]
+        actions.append({"add": {"index": new_index, "alias": self.index_name}})
+        self.es.indices.update_aliases(actions=actions)
+        return old_indices
+
+    def build_query(self, query="", publication_type="any", tags=None, author_query="", tag_query="", **kwargs):
+        must_clauses = []
+        filter_clauses = []
+
+        if not query or query.strip() == "":
+            must_clauses.append({"match_all": {}})
+        else:
+            search_query = f"*{query}*"
+            must_clauses.append(
+                {
+                    "query_string": {
+                        "query": search_query,
+                        "fields": ["title", "description", "tags", "authors.name", "authors.affiliation"],
+                        "default_operator": "AND",
                     }
-                )
+                }
+            )
+
+        if author_query:
+            must_clauses.append({"match": {"authors.name": {"query": author_query, "operator": "and"}}})
 
-            # Filter by calories
-            calories_min = kwargs.get("calories_min")
-            calories_max = kwargs.get("calories_max")
+        # Filter by calories
+        calories_min = kwargs.get("calories_min")
+        calories_max = kwargs.get("calories_max")
 
-            if calories_min or calories_max:
-                range_query = {"calories": {}}
-                if calories_min:
-                    range_query["calories"]["gte"] = int(calories_min)
-                if calories_max:
-                    range_query["calories"]["lte"] = int(calories_max)
-                filter_clauses.append({"range": range_query})
+        if calories_min or calories_max:
+            range_query = {"calories": {}}
+            if calories_min:
+                range_query["calories"]["gte"] = int(calories_min)
+            if calories_max:
+                range_query["calories"]["lte"] = int(calories_max)
+            filter_clauses.append({"range": range_query})
 
-            search_body = {"query": {"bool": {"must": must_clauses, "filter": filter_clauses}}}
+        # Filter by creation date
+        date_from = kwargs.get("date_from")
+        date_to = kwargs.get("date_to")
+
+        if date_from or date_to:
+            range_query = {"created_at": {}}
+            if date_from:
+                range_query["created_at"]["gte"] = date_from
+            if date_to:
+                range_query["created_at"]["lte"] = date_to
+            filter_clauses.append({"range": range_query})
+
+        # Filter by publication type (mismo criterio que la búsqueda SQL: por valor del enum)
+        if publication_type and publication_type != "any":
+            from app.modules.basedataset.models import BasePublicationType
+
+            for member in BasePublicationType:
+                if member.value.lower() == publication_type:
+                    filter_clauses.append({"term": {"publication_type": member.name}})
+                    break
+
+        # Filter by tags (el normalizador "folded" del campo iguala mayúsculas y acentos)
+        tags = list(tags or []) + [tag.strip() for tag in (tag_query or "").split(",") if tag.strip()]
+        if tags:
+            filter_clauses.append({"terms": {"tags": tags}})
+
+        return {"bool": {"must": must_clauses, "filter": filter_clauses}}
+
+    def search_documents(
+        self,
+        query="",
+        sorting="newest",
+        publication_type="any",
+        tags=None,
+        size=20,
+        page=1,
+        search_after=None,
+        facets=False,
+        **kwargs,
+    ):
+        """Devuelve una página de documentos (``_source``) junto al total de coincidencias.
+
+        Con ``facets`` añade los tags más frecuentes entre todas las coincidencias.
+
+        Pagina con ``from``/``size`` a partir de ``page`` o, si se pasa ``search_after`` (el cursor
+        devuelto en la página anterior), con ``search_after``, que no se degrada en páginas profundas.
+        """
+        size, page = min(int(size), 100), int(page)
+        order = "asc" if sorting == "oldest" else "desc"
+        sort = (
+            [{"_score": "desc"}, {"id": "desc"}] if sorting == "relevance" else [{"created_at": order}, {"id": order}]
+        )
+        search_kwargs = {
+            "index": self.index_name,
+            "query": self.build_query(query, publication_type, tags, **kwargs),
+            "sort": sort,
+            "size": size,
+            "track_total_hits": True,
+        }
+        if search_after:
+            search_kwargs["search_after"] = search_after
+        else:
+            search_kwargs["from_"] = max(page - 1, 0) * size
+        if facets:
+            search_kwargs["aggs"] = {"tags": {"terms": {"field": "tags", "size": 20}}}
+
+        try:
+            response = self.es.search(**search_kwargs)
+        except Exception as e:
+            print(f"❌ Error searching in Elastic: {e}")
+            cluster_health.track(e)
+            raise
+        cluster_health.mark_up()
+
+        hits = response["hits"]["hits"]
+        return {
+            "results": [hit["_source"] for hit in hits],
+            "total": response["hits"]["total"]["value"],
+            "search_after": hits[-1]["sort"] if len(hits) == size else None,
+            "facets": (
+                {
+                    "tags": [
+                        {"name": bucket["key"], "count": bucket["doc_count"]}
+                        for bucket in response["aggregations"]["tags"]["buckets"]
+                    ]
+                }
+                if facets
+                else None
+            ),
+        }
+
+    def search_datasets(self, query, sorting=None, publication_type=None, tags=None, **kwargs):
+        try:
+            search_body = {"query": self.build_query(query, publication_type or "any", tags, **kwargs)}
 
-            response = self.es.search(index="datasets", body=search_body)
+            response = self.es.search(index=self.index_name, body=search_body)
 
             hits = response["hits"]["hits"]
             ids = [int(hit["_id"]) for hit in hits]
 
             print(f"🔍 Búsqueda Elastic para '{query}': Encontrados IDs {ids}")
+            cluster_health.mark_up()
             return ids
 
         except Exception as e:
             print(f"❌ Error searching in Elastic: {e}")
+            cluster_health.track(e)
             return []
 
     def delete_dataset(self, dataset_id):
         try:
-            self.es.delete(index="datasets", id=dataset_id)
+            self.es.delete(index=self.index_name, id=dataset_id)
             print(f"✅ Dataset {dataset_id} eliminado de Elastic.")
         except Exception as e:
             print(f"❌ Error deleting dataset from Elastic: {e}")
+            cluster_health.track(e)
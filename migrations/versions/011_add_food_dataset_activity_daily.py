@@ -0,0 +1,54 @@
+"""Add daily rollup table for food dataset activity
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "011"
+down_revision = "010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "food_dataset_activity_daily",
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("views", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("downloads", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["dataset_id"],
+            ["food_dataset.id"],
+        ),
+        sa.PrimaryKeyConstraint("dataset_id", "day"),
+    )
+    with op.batch_alter_table("food_dataset_activity_daily", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_food_dataset_activity_daily_day"), ["day"], unique=False)
+
+    # Backfill from the existing activity log
+    op.execute(
+        """
+        INSERT INTO food_dataset_activity_daily (dataset_id, day, views, downloads)
+        SELECT dataset_id,
+               DATE(timestamp),
+               SUM(CASE WHEN activity_type = 'view' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN activity_type = 'download' THEN 1 ELSE 0 END)
+        FROM food_dataset_activity
+        GROUP BY dataset_id, DATE(timestamp)
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("food_dataset_activity_daily", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_food_dataset_activity_daily_day"))
+
+    op.drop_table("food_dataset_activity_daily")
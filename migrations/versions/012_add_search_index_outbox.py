@@ -0,0 +1,42 @@
+"""Add outbox table for search index synchronization
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "012"
+down_revision = "011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "search_index_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("operation", sa.String(length=10), nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("search_index_outbox", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_search_index_outbox_dataset_id"), ["dataset_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_search_index_outbox_available_at"), ["available_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("search_index_outbox", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_search_index_outbox_available_at"))
+        batch_op.drop_index(batch_op.f("ix_search_index_outbox_dataset_id"))
+
+    op.drop_table("search_index_outbox")
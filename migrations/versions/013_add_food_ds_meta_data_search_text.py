@@ -0,0 +1,62 @@
+"""Add accent-folded search column with FULLTEXT index to food_ds_meta_data
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = "013"
+down_revision = "012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("food_ds_meta_data", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("search_text", sa.Text(), nullable=True))
+
+    # Backfill: same folding as app.modules.fooddataset.models.fold_search_text
+    bind = op.get_bind()
+    parts = defaultdict(list)
+    for metadata_id, title, description, tags in bind.execute(
+        sa.text(
+            "SELECT d.id, d.title, d.description, d.tags "
+            "FROM food_ds_meta_data f JOIN ds_meta_data d ON d.id = f.id"
+        )
+    ):
+        parts[metadata_id] += [title, description, tags]
+    for metadata_id, name, affiliation, orcid in bind.execute(
+        sa.text(
+            "SELECT food_ds_meta_data_id, name, affiliation, orcid FROM base_author "
+            "WHERE food_ds_meta_data_id IS NOT NULL"
+        )
+    ):
+        if metadata_id in parts:
+            parts[metadata_id] += [name, affiliation, orcid]
+
+    if parts:
+        bind.execute(
+            sa.text("UPDATE food_ds_meta_data SET search_text = :search_text WHERE id = :id"),
+            [
+                {"id": metadata_id, "search_text": unidecode.unidecode(" ".join(v for v in values if v)).lower()}
+                for metadata_id, values in parts.items()
+            ],
+        )
+
+    with op.batch_alter_table("food_ds_meta_data", schema=None) as batch_op:
+        batch_op.create_index("ix_food_ds_meta_data_search_text", ["search_text"], unique=False, mysql_prefix="FULLTEXT")
+
+
+def downgrade():
+    with op.batch_alter_table("food_ds_meta_data", schema=None) as batch_op:
+        batch_op.drop_index("ix_food_ds_meta_data_search_text")
+        batch_op.drop_column("search_text")
@@ -0,0 +1,39 @@
+"""Add related_dataset table with precomputed recommendations
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "014"
+down_revision = "013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "related_dataset",
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("rank", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("related_dataset_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["dataset_id"], ["food_dataset.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["related_dataset_id"], ["food_dataset.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("dataset_id", "rank"),
+    )
+    with op.batch_alter_table("related_dataset", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_related_dataset_related_dataset_id"), ["related_dataset_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("related_dataset", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_related_dataset_related_dataset_id"))
+
+    op.drop_table("related_dataset")
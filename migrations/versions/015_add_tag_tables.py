@@ -0,0 +1,75 @@
+"""Add normalized tag and dataset_tag tables
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision = "015"
+down_revision = "014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "tag",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "dataset_tag",
+        sa.Column("dataset_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["dataset_id"], ["food_dataset.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tag_id"], ["tag.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("dataset_id", "tag_id"),
+    )
+    with op.batch_alter_table("dataset_tag", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_dataset_tag_tag_id"), ["tag_id"], unique=False)
+
+    # Backfill: misma normalización que app.modules.fooddataset.models.normalize_tags
+    bind = op.get_bind()
+    tag_ids = {}
+    links = []
+    for dataset_id, tags in bind.execute(
+        sa.text(
+            "SELECT f.id, d.tags FROM food_dataset f "
+            "JOIN food_ds_meta_data m ON m.id = f.ds_meta_data_id "
+            "JOIN ds_meta_data d ON d.id = m.id"
+        )
+    ):
+        names = []
+        for tag in (tags or "").split(","):
+            name = unidecode.unidecode(tag.strip()).lower()
+            if name and name not in names:
+                names.append(name)
+        for name in names:
+            if name not in tag_ids:
+                tag_ids[name] = len(tag_ids) + 1
+            links.append({"dataset_id": dataset_id, "tag_id": tag_ids[name]})
+
+    if tag_ids:
+        bind.execute(
+            sa.text("INSERT INTO tag (id, name) VALUES (:id, :name)"),
+            [{"id": tag_id, "name": name} for name, tag_id in tag_ids.items()],
+        )
+    if links:
+        bind.execute(sa.text("INSERT INTO dataset_tag (dataset_id, tag_id) VALUES (:dataset_id, :tag_id)"), links)
+
+
+def downgrade():
+    with op.batch_alter_table("dataset_tag", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_dataset_tag_tag_id"))
+
+    op.drop_table("dataset_tag")
+    op.drop_table("tag")
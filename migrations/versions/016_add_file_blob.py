@@ -0,0 +1,37 @@
+"""Add file_blob table with hubfile reference counts
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "016"
+down_revision = "015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "file_blob",
+        sa.Column("checksum", sa.String(length=120), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.PrimaryKeyConstraint("checksum", "size"),
+    )
+
+    # Backfill de los contadores; los ficheros se pasan al almacén con `rosemary hubfile:dedup`
+    op.execute(
+        "INSERT INTO file_blob (checksum, size, ref_count) "
+        "SELECT checksum, size, COUNT(*) FROM file GROUP BY checksum, size"
+    )
+
+
+def downgrade():
+    op.drop_table("file_blob")
@@ -0,0 +1,35 @@
+"""Add food_dataset_activity_batch table to apply buffered activity once
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "017"
+down_revision = "016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "food_dataset_activity_batch",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("applied_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("food_dataset_activity_batch", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_food_dataset_activity_batch_applied_at"), ["applied_at"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("food_dataset_activity_batch", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_food_dataset_activity_batch_applied_at"))
+
+    op.drop_table("food_dataset_activity_batch")
@@ -0,0 +1,23 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "food_checker:index",
+    help="Rebuilds the nutrient nearest-neighbour index from every food model's .food file.",
+)
+@with_appcontext
+def food_checker_index():
+    from app.modules.food_checker.nutrients import nutrient_index
+
+    click.echo(click.style("Rebuilding nutrient index...", fg="yellow"))
+    start = time.perf_counter()
+    try:
+        indexed = nutrient_index.rebuild()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding nutrient index: {e}", fg="red"))
+        return
+
+    click.echo(click.style(f"Indexed {indexed} food models in {time.perf_counter() - start:.2f}s.", fg="green"))
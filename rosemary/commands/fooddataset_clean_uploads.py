@@ -0,0 +1,14 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "fooddataset:clean_uploads",
+    help="Removes chunked uploads that have been inactive for longer than UPLOAD_CHUNK_SESSION_TTL.",
+)
+@with_appcontext
+def fooddataset_clean_uploads():
+    from app.modules.fooddataset.chunked_upload import chunked_uploads
+
+    removed = chunked_uploads.collect_garbage(force=True)
+    click.echo(click.style(f"Removed {removed} abandoned chunked uploads.", fg="green"))
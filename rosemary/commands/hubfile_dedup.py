@@ -0,0 +1,36 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "hubfile:dedup",
+    help="Moves existing uploads into the content-addressed blob store and removes unreferenced blobs.",
+)
+@click.option("--gc-only", is_flag=True, help="Only remove blobs that no hubfile references.")
+@with_appcontext
+def hubfile_dedup(gc_only):
+    import os
+
+    from app import db
+    from app.modules.hubfile.blobs import blob_store
+    from app.modules.hubfile.models import Hubfile
+    from app.modules.hubfile.services import HubfileService
+
+    if not blob_store.enabled:
+        click.echo(click.style("The blob store is disabled (HUBFILE_BLOB_STORE=false).", fg="red"))
+        return
+
+    if not gc_only:
+        click.echo(click.style("Moving uploads into the blob store...", fg="yellow"))
+        service = HubfileService()
+        adopted = skipped = 0
+        for hubfile in Hubfile.query.yield_per(500):
+            path = service.get_path_by_hubfile(hubfile)
+            if path and os.path.exists(path) and blob_store.adopt(path, hubfile.checksum, hubfile.size):
+                adopted += 1
+            else:
+                skipped += 1
+        click.echo(click.style(f"Linked {adopted} files into the blob store, skipped {skipped}.", fg="green"))
+
+    removed = blob_store.collect_garbage(db.session)
+    click.echo(click.style(f"Removed {removed} unreferenced blobs.", fg="green"))
@@ -0,0 +1,29 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "recommendations:codownloads",
+    help="Rebuilds the co-download matrix from download records and shopping carts.",
+)
+@with_appcontext
+def recommendations_codownloads():
+    from app.modules.recommendations.co_downloads import co_download_index
+
+    click.echo(click.style("Rebuilding co-download matrix...", fg="yellow"))
+    start = time.perf_counter()
+    try:
+        datasets = co_download_index.rebuild()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding co-download matrix: {e}", fg="red"))
+        return
+
+    click.echo(
+        click.style(
+            f"Co-downloads stored for {datasets} datasets (top {co_download_index.top_n} each) "
+            f"in {time.perf_counter() - start:.2f}s.",
+            fg="green",
+        )
+    )
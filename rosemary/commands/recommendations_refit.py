@@ -0,0 +1,30 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "recommendations:refit",
+    help="Refits the catalog-wide TF-IDF model used by recommendations and saves it to disk.",
+)
+@with_appcontext
+def recommendations_refit():
+    from app.modules.recommendations.text_model import tfidf_model
+
+    click.echo(click.style("Refitting TF-IDF model...", fg="yellow"))
+    start = time.perf_counter()
+    try:
+        documents = tfidf_model.refit()
+    except Exception as e:
+        click.echo(click.style(f"Error refitting TF-IDF model: {e}", fg="red"))
+        return
+
+    vocabulary = len(tfidf_model.vectorizer.vocabulary_) if tfidf_model.fitted else 0
+    click.echo(
+        click.style(
+            f"TF-IDF model fitted on {documents} datasets ({vocabulary} terms) in "
+            f"{time.perf_counter() - start:.2f}s, saved to {tfidf_model.folder}.",
+            fg="green",
+        )
+    )
@@ -0,0 +1,30 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "recommendations:related",
+    help="Precomputes the top-k related datasets of every dataset into the related_dataset table.",
+)
+@click.option("--incremental", is_flag=True, help="Only compute datasets that have no related datasets stored yet.")
+@with_appcontext
+def recommendations_related(incremental):
+    from app.modules.recommendations.related import related_datasets_job
+
+    click.echo(click.style("Computing related datasets...", fg="yellow"))
+    start = time.perf_counter()
+    try:
+        computed = related_datasets_job.update_new() if incremental else related_datasets_job.rebuild()
+    except Exception as e:
+        click.echo(click.style(f"Error computing related datasets: {e}", fg="red"))
+        return
+
+    click.echo(
+        click.style(
+            f"Top {related_datasets_job.k} related datasets stored for {computed} datasets "
+            f"in {time.perf_counter() - start:.2f}s.",
+            fg="green",
+        )
+    )
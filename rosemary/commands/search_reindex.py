@@ -0,0 +1,36 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "search:reindex",
+    help="Rebuilds the Elasticsearch datasets index into a new versioned index and swaps the alias.",
+)
+@click.option("--chunk-size", default=500, show_default=True, help="Datasets loaded and sent per bulk request.")
+@click.option("--keep-old", is_flag=True, help="Keep the previous index instead of deleting it after the swap.")
+@with_appcontext
+def search_reindex(chunk_size, keep_old):
+    from app.modules.fooddataset.repositories import FoodDatasetRepository
+    from core.services.SearchService import SearchService
+
+    search_service = SearchService()
+    if not search_service.enabled:
+        click.echo(click.style("Elasticsearch is disabled, nothing to reindex.", fg="yellow"))
+        return
+
+    click.echo(click.style("Reindexing datasets...", fg="yellow"))
+    try:
+        result = search_service.reindex(
+            FoodDatasetRepository().iter_for_indexing(chunk_size), chunk_size=chunk_size, keep_old=keep_old
+        )
+    except Exception as e:
+        click.echo(click.style(f"Error reindexing datasets: {e}", fg="red"))
+        return
+
+    click.echo(
+        click.style(
+            f"{result['indexed']} datasets indexed into {result['index']} in {result['seconds']:.2f}s "
+            f"({result['docs_per_second']:.0f} docs/sec). Alias '{search_service.index_name}' swapped.",
+            fg="green",
+        )
+    )
@@ -0,0 +1,30 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "search:sync",
+    help="Pushes pending dataset changes from the search index outbox to Elasticsearch.",
+)
+@click.option("--watch", is_flag=True, help="Keep polling the outbox instead of exiting when it is empty.")
+@with_appcontext
+def search_sync(watch):
+    from app.modules.fooddataset.outbox import search_outbox_worker
+
+    if not search_outbox_worker.search_service.enabled:
+        click.echo(click.style("Elasticsearch is disabled, nothing to sync.", fg="yellow"))
+        return
+
+    while True:
+        try:
+            synced = search_outbox_worker.drain()
+        except Exception as e:
+            click.echo(click.style(f"Error syncing the search index: {e}", fg="red"))
+            synced = 0
+        if synced or not watch:
+            click.echo(click.style(f"{synced} outbox entries synced.", fg="green"))
+        if not watch:
+            break
+        time.sleep(search_outbox_worker.poll_interval)
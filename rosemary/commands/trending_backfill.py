@@ -0,0 +1,20 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command(
+    "trending:backfill",
+    help="Rebuilds the daily view/download rollups used by trending from the raw activity log.",
+)
+@with_appcontext
+def trending_backfill():
+    from app.modules.fooddataset.services import FoodDatasetService
+
+    click.echo(click.style("Rebuilding daily activity rollups...", fg="yellow"))
+    try:
+        rows = FoodDatasetService().rebuild_daily_rollups()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding daily activity rollups: {e}", fg="red"))
+        return
+
+    click.echo(click.style(f"{rows} daily rollup rows written.", fg="green"))